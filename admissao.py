@@ -0,0 +1,75 @@
+# admissao.py / Controle de admissão: quanto cada conexão e cada conta pode pedir, e quanto o servidor aceita de uma vez.
+# Cada conexão tem um balde de tokens (taxa por segundo + rajada) e cada conta logada outro, dividido entre todas as
+# conexões dela; um comando acima do limite é recusado na hora, sem passar pelo pool de comandos. Além disso, quando já
+# há comandos demais esperando/executando (uma tempestade de repetições durante um incidente, por exemplo), os novos
+# são recusados com "ocupado" em vez de ficarem na fila até o cliente desistir. Quem usa é o banco.py (admitir_comando).
+import threading
+import time
+from collections import OrderedDict
+
+class BaldeTokens:
+    #taxa: tokens por segundo (0 = sem limite); rajada: quantos podem ser gastos de uma vez com o balde cheio
+    def __init__(self, taxa, rajada):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.tokens = rajada
+        self.instante = time.monotonic()
+        self._lock = threading.Lock()
+
+    #Gasta um token se houver: True = pode executar, False = acima do limite
+    def consumir(self, quantidade=1):
+        if not self.taxa:
+            return True
+        with self._lock:
+            agora = time.monotonic()
+            self.tokens = min(self.rajada, self.tokens + (agora - self.instante) * self.taxa)
+            self.instante = agora
+            if self.tokens < quantidade:
+                return False
+            self.tokens -= quantidade
+            return True
+
+#Um balde por conta, criado no primeiro comando dela. Guarda no máximo `maximo` contas: sai a que pediu há mais tempo
+#(ela volta com o balde cheio, o que só acontece depois de muito tempo parada).
+class LimitesContas:
+    def __init__(self, taxa, rajada, maximo=100000):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.maximo = maximo
+        self._baldes = OrderedDict() # conta -> BaldeTokens, da que pediu há mais tempo para a mais recente
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def consumir(self, conta):
+        if not self.taxa:
+            return True
+        with self._lock:
+            balde = self._baldes.get(conta)
+            if balde is None:
+                balde = self._baldes[conta] = BaldeTokens(self.taxa, self.rajada)
+                while len(self._baldes) > self.maximo:
+                    self._baldes.popitem(last=False)
+            else:
+                self._baldes.move_to_end(conta)
+        return balde.consumir()
+
+#Comandos admitidos e ainda não respondidos (na fila do pool de comandos ou executando). Passando do limite, entrar()
+#recusa o comando; cada entrar() que devolveu True precisa do seu sair().
+class CargaComandos:
+    def __init__(self, limite):
+        self.limite = limite # 0 = sem limite
+        self.em_andamento = 0
+        self._lock = threading.Lock()
+
+    def entrar(self):
+        with self._lock:
+            if self.limite and self.em_andamento >= self.limite:
+                return False
+            self.em_andamento += 1
+            return True
+
+    def sair(self):
+        with self._lock:
+            self.em_andamento -= 1
@@ -0,0 +1,270 @@
+# armazem.py / Armazenamento das contas em colunas: um dict por conta custa centenas de bytes e o saldo em float acumula erro.
+# Aqui cada campo é uma coluna (listas para os textos, array de int64 para o saldo em centavos) e a linha de uma conta
+# é o próprio número menos PRIMEIRA_CONTA, então não existe índice número -> linha para guardar. No modo particionado
+# (particoes.py) cada processo numera só as suas contas: a partição i de N tem os números PRIMEIRA_CONTA + linha*N + i.
+# Quando o servidor sobe de um checkpoint binário (snapshot_binario.py), as contas do arquivo ficam no mmap como base:
+# só os saldos são copiados para a memória, e nomes, CPFs e senhas são lidos do arquivo quando alguém pede.
+import threading
+from array import array
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from snapshot_binario import NOME, CPF, SENHA
+
+PRIMEIRA_CONTA = 100
+# Quantidade de travas: a conta usa a trava (linha % LISTRAS); contas diferentes quase sempre caem em travas diferentes
+LISTRAS = 1024
+# Maior saldo (e maior valor de uma operação) em centavos que cabe no array('q'); ajustar_saldo/mover recusam passar dele
+SALDO_MAXIMO = 2 ** 63 - 1
+
+#Converte o valor digitado ("50", "10.5", "0,25") para centavos sem passar por float.
+#Mais de duas casas decimais, NaN, infinito ou mais que SALDO_MAXIMO são recusados com ValueError (como o float() fazia
+#com texto inválido).
+def para_centavos(texto):
+    try:
+        valor = Decimal(str(texto).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {texto}")
+    if not valor.is_finite():
+        raise ValueError(f"valor inválido: {texto}")
+    centavos = valor * 100
+    if centavos != centavos.to_integral_value():
+        raise ValueError(f"valor com mais de duas casas decimais: {texto}")
+    if abs(centavos) > SALDO_MAXIMO:
+        raise ValueError(f"valor acima do limite: {texto}")
+    return int(centavos)
+
+#Centavos -> "1234.56", no mesmo formato que f"{valor:.2f}" gerava
+def formatar_centavos(centavos):
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(centavos), 100)
+    return f"{sinal}{reais}.{resto:02d}"
+
+#Coluna de textos (nome, CPF ou senha): as linhas do snapshot binário são lidas do mmap no acesso, sem decodificar
+#nada na inicialização, e as contas criadas depois ficam numa lista.
+class ColunaTexto:
+    def __init__(self, base=None, campo=0, novos=None):
+        self.base = base
+        self.campo = campo
+        self.tamanho_base = base.quantidade if base is not None else 0
+        self.novos = [] if novos is None else novos
+
+    def __len__(self):
+        return self.tamanho_base + len(self.novos)
+
+    def __getitem__(self, linha):
+        if isinstance(linha, slice): # só coluna[:n] (cópia para o checkpoint); as linhas da base não mudam
+            return ColunaTexto(self.base, self.campo, self.novos[:max(linha.stop - self.tamanho_base, 0)])
+        if linha < self.tamanho_base:
+            return self.base.texto(self.campo, linha)
+        return self.novos[linha - self.tamanho_base]
+
+    def append(self, texto):
+        self.novos.append(texto)
+
+    def pop(self):
+        return self.novos.pop()
+
+    #Textos de todas as linhas em UTF-8, na ordem (para gravar o checkpoint binário sem decodificar a base)
+    def brutos(self):
+        for linha in range(self.tamanho_base):
+            yield self.base.bruto(self.campo, linha)
+        for texto in self.novos:
+            yield texto.encode('utf-8')
+
+class ArmazemContas:
+    def __init__(self, listras=LISTRAS, particao=0, particoes=1):
+        self.particao = particao
+        self.particoes = particoes
+        self.travas = [threading.Lock() for _ in range(listras)]
+        # Versão de cada trava (seqlock): ímpar enquanto alguém escreve com ela pega, par quando o estado está publicado
+        self.versoes = array('Q', bytes(8 * listras))
+        self.limpar()
+
+    #Esvazia o armazém ou, com base (um SnapshotBinario aberto), começa com as contas do snapshot
+    def limpar(self, base=None):
+        self.base = base
+        self.nomes = ColunaTexto(base, NOME)
+        self.cpfs = ColunaTexto(base, CPF)
+        self.senhas = ColunaTexto(base, SENHA)
+        self.saldos = base.saldos() if base is not None else array('q')
+        self.cpf_para_linha = {} # só as contas criadas depois da base; as da base estão no índice do snapshot
+
+    def __len__(self):
+        return len(self.saldos)
+
+    def __contains__(self, num):
+        return self.linha(num) is not None
+
+    #Linha da conta ou None se o número não existe ("0100", " 100" etc. não são números de conta)
+    def linha(self, num):
+        if not (num.isascii() and num.isdigit()) or num[0] == "0":
+            return None
+        linha, resto = divmod(int(num) - PRIMEIRA_CONTA - self.particao, self.particoes)
+        if resto == 0 and 0 <= linha < len(self.saldos):
+            return linha
+        return None
+
+    def _linha(self, num):
+        linha = self.linha(num)
+        if linha is None:
+            raise KeyError(num)
+        return linha
+
+    def numero(self, linha):
+        return str(PRIMEIRA_CONTA + linha * self.particoes + self.particao)
+
+    def proximo_numero(self):
+        return self.numero(len(self.saldos))
+
+    def conta_por_cpf(self, cpf):
+        linha = self.cpf_para_linha.get(cpf)
+        if linha is None and self.base is not None:
+            linha = self.base.linha_por_cpf(cpf)
+        return None if linha is None else self.numero(linha)
+
+    def nome(self, num):
+        return self.nomes[self._linha(num)]
+
+    def senha(self, num):
+        return self.senhas[self._linha(num)]
+
+    def saldo(self, num):
+        return self.saldos[self._linha(num)]
+
+    #Saldo sem pegar a trava da conta (SALDO e outras consultas). Lê entre duas versões pares iguais da trava, então
+    #nunca vê um lote pela metade; se pegar uma escrita em andamento, espera a trava ser solta (sem girar) e lê de novo.
+    #Quem acabou de escrever já soltou a trava com a versão par antes de responder, então a própria sessão sempre
+    #lê o que escreveu.
+    def ler_saldo(self, num):
+        linha = self._linha(num)
+        indice = linha % len(self.travas)
+        versoes, saldos = self.versoes, self.saldos
+        while True:
+            versao = versoes[indice]
+            if not versao & 1:
+                saldo = saldos[linha]
+                if versoes[indice] == versao:
+                    return saldo
+            with self.travas[indice]:
+                pass
+
+    #O saldo da conta continua no array('q') depois de somar centavos (negativos para subtrair)?
+    def cabe(self, num, centavos):
+        return -SALDO_MAXIMO - 1 <= self.saldos[self._linha(num)] + centavos <= SALDO_MAXIMO
+
+    #Soma (ou subtrai, com centavos negativos) no saldo - chamar com a trava da conta. Devolve False, sem mexer no
+    #saldo, se o resultado sair do array('q'); quem chama recusa a operação.
+    def ajustar_saldo(self, num, centavos):
+        linha = self._linha(num)
+        novo = self.saldos[linha] + centavos
+        if not -SALDO_MAXIMO - 1 <= novo <= SALDO_MAXIMO:
+            return False
+        self.saldos[linha] = novo
+        return True
+
+    #Passa centavos de uma conta para outra se a origem tiver saldo e o destino couber no array('q'); devolve False
+    #(sem mexer em nada) se não der - quem chama usa cabe() para saber qual dos dois. Chamar com as travas das duas contas.
+    def mover(self, origem, destino, centavos):
+        linha_origem, linha_destino = self._linha(origem), self._linha(destino)
+        saldos = self.saldos
+        if saldos[linha_origem] < centavos or saldos[linha_destino] + centavos > SALDO_MAXIMO:
+            return False
+        saldos[linha_origem] -= centavos
+        saldos[linha_destino] += centavos
+        return True
+
+    #Desfaz o adicionar() da última conta (a criação não chegou ao diário) - com a mesma trava do adicionar
+    def remover_ultima(self):
+        linha = len(self.saldos) - 1
+        self.saldos.pop() # a conta deixa de existir antes de as outras colunas encolherem
+        del self.cpf_para_linha[self.cpfs[linha]]
+        for coluna in (self.nomes, self.cpfs, self.senhas):
+            coluna.pop()
+
+    #Volta o saldo de uma conta a um valor anterior (o registro da operação não chegou ao diário) - com a trava da conta
+    def definir_saldo(self, num, centavos):
+        self.saldos[self._linha(num)] = centavos
+
+    #Acrescenta uma conta nova e devolve o número dela - quem chama garante que o CPF é novo e que só uma criação
+    #acontece por vez. A conta só passa a existir (linha < len) depois que todas as colunas foram preenchidas.
+    def adicionar(self, nome, cpf, senha, centavos=0):
+        linha = len(self.saldos)
+        self.nomes.append(nome)
+        self.cpfs.append(cpf)
+        self.senhas.append(senha)
+        self.cpf_para_linha[cpf] = linha
+        self.saldos.append(centavos)
+        return self.numero(linha)
+
+    #Trava as contas pela ordem das travas (sem repetir), assim duas transferências cruzadas não travam uma à outra.
+    #A versão de cada trava fica ímpar durante o bloco, para ler_saldo saber que há uma escrita em andamento.
+    @contextmanager
+    def travar(self, *nums):
+        indices = sorted({(int(num) - PRIMEIRA_CONTA) // self.particoes % len(self.travas) for num in nums})
+        travas = [self.travas[i] for i in indices]
+        versoes = self.versoes
+        for trava in travas:
+            trava.acquire()
+        for i in indices:
+            versoes[i] += 1
+        try:
+            yield
+        finally:
+            for i in indices:
+                versoes[i] += 1
+            for trava in reversed(travas):
+                trava.release()
+
+    #Trava todas as faixas, na mesma ordem de travar() - para o checkpoint copiar um estado em que nenhuma operação
+    #está no meio. As versões não mudam (nada é escrito), então ler_saldo continua sem esperar.
+    @contextmanager
+    def travar_todas(self):
+        for trava in self.travas:
+            trava.acquire()
+        try:
+            yield
+        finally:
+            for trava in reversed(self.travas):
+                trava.release()
+
+    # Formato de uma conta no diário e no contas.json: o saldo vai em centavos inteiros ("centavos"); os arquivos
+    # gravados antes disso têm o saldo em reais ("saldo", float) e continuam sendo lidos por aplicar()
+    def registro(self, num):
+        linha = self._linha(num)
+        return {"nome": self.nomes[linha], "cpf": self.cpfs[linha], "senha": self.senhas[linha],
+                "centavos": self.saldos[linha]}
+
+    #Aplica o estado de uma conta vindo do checkpoint ou do diário (cria a conta se for a próxima da sequência)
+    def aplicar(self, num, dados):
+        centavos = int(dados["centavos"]) if "centavos" in dados else round(dados["saldo"] * 100)
+        linha, resto = divmod(int(num) - PRIMEIRA_CONTA - self.particao, self.particoes)
+        if resto:
+            raise ValueError(f"conta {num} não é da partição {self.particao}")
+        if linha == len(self.saldos):
+            self.adicionar(dados["nome"], dados["cpf"], dados["senha"], centavos)
+        elif 0 <= linha < len(self.saldos):
+            self.saldos[linha] = centavos
+        else:
+            raise ValueError(f"conta {num} fora da sequência (próxima seria {self.proximo_numero()})")
+
+    def carregar(self, contas):
+        self.limpar()
+        for num in sorted(contas, key=int):
+            self.aplicar(num, contas[num])
+
+    #Cópia das colunas para o checkpoint - chamar com travar_todas(), assim nenhum saldo sai no meio de uma operação
+    #(origem debitada e destino ainda sem o crédito, ou alteração que o diário ainda pode recusar e desfazer).
+    #Os textos não mudam depois da criação; a cópia do array é um memcpy, então as travas ficam pegas por pouco tempo.
+    def copiar(self):
+        quantidade = len(self.saldos)
+        return self.nomes[:quantidade], self.cpfs[:quantidade], self.senhas[:quantidade], self.saldos[:quantidade]
+
+    #Monta os dicts do contas.json a partir de uma cópia feita com copiar()
+    def exportar(self, copia):
+        nomes, cpfs, senhas, saldos = copia
+        contas, cpf_salvos = {}, {}
+        for linha, saldo in enumerate(saldos):
+            num = self.numero(linha)
+            contas[num] = {"nome": nomes[linha], "cpf": cpfs[linha], "senha": senhas[linha], "centavos": saldo}
+            cpf_salvos[cpfs[linha]] = num
+        return contas, cpf_salvos
@@ -0,0 +1,125 @@
+# autenticacao.py / Senhas guardadas com PBKDF2 e sessões com token. O hash forte custa dezenas de milissegundos de
+# propósito, então é pago só no LOGIN: o servidor devolve um token de sessão, e com ele o cliente volta numa conexão
+# nova (RETOMAR|token) sem mandar a senha. Depois do LOGIN a senha também não precisa ir em cada SACAR/TRANSFERIR;
+# quando vai (confirmação no menu do telnet, BATCH), é conferida com um HMAC guardado no login, sem refazer o PBKDF2.
+# As sessões ficam só em memória: reiniciar o servidor pede LOGIN de novo.
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+ALGORITMO = "pbkdf2_sha256"
+ITERACOES_SENHA = 200000
+TAMANHO_SAL = 16
+
+#Hash da senha para guardar: "pbkdf2_sha256$iterações$sal$hash" (sal e hash em hexadecimal)
+def gerar_hash_senha(senha, iteracoes=ITERACOES_SENHA):
+    sal = os.urandom(TAMANHO_SAL)
+    resumo = hashlib.pbkdf2_hmac("sha256", senha.encode('utf-8'), sal, iteracoes)
+    return f"{ALGORITMO}${iteracoes}${sal.hex()}${resumo.hex()}"
+
+#Confere a senha digitada com a guardada. Contas criadas antes do hash têm a senha em texto e continuam entrando.
+def verificar_senha(guardada, senha):
+    if not guardada.startswith(ALGORITMO + "$"):
+        return hmac.compare_digest(guardada.encode('utf-8'), senha.encode('utf-8'))
+    try:
+        _, iteracoes, sal, resumo = guardada.split("$")
+        calculado = hashlib.pbkdf2_hmac("sha256", senha.encode('utf-8'), bytes.fromhex(sal), int(iteracoes))
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculado.hex(), resumo)
+
+class Sessao:
+    __slots__ = ("conta", "nome", "expira")
+
+    def __init__(self, conta, nome, expira):
+        self.conta = conta
+        self.nome = nome
+        self.expira = expira
+
+class TabelaSessoes:
+    def __init__(self, validade=60 * 60, maximo_por_conta=8):
+        self.validade = validade
+        self.maximo_por_conta = maximo_por_conta
+        self._sessoes = {}          # token -> Sessao
+        self._por_conta = {}        # conta -> [tokens], do mais antigo para o mais novo
+        self._verificadores = {}    # conta -> (HMAC da senha conferida no login, validade)
+        self._segredo = secrets.token_bytes(32) # chave dos HMACs, nova a cada vez que o servidor sobe
+        self.prefixo = ""           # no modo particionado, "i." (o RETOMAR vai para a partição que criou o token)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessoes)
+
+    def _verificador(self, conta, senha):
+        return hmac.new(self._segredo, f"{conta}|{senha}".encode('utf-8'), hashlib.sha256).digest()
+
+    #Chamar com self._lock
+    def _remover(self, token):
+        sessao = self._sessoes.pop(token, None)
+        if sessao is not None:
+            tokens = self._por_conta.get(sessao.conta, [])
+            if token in tokens:
+                tokens.remove(token)
+            if not tokens:
+                self._por_conta.pop(sessao.conta, None)
+
+    #Depois do LOGIN (senha já conferida): cria o token da sessão e guarda o verificador da senha
+    def criar(self, conta, nome, senha):
+        token = self.prefixo + secrets.token_urlsafe(24)
+        expira = time.time() + self.validade
+        with self._lock:
+            self._sessoes[token] = Sessao(conta, nome, expira)
+            tokens = self._por_conta.setdefault(conta, [])
+            tokens.append(token)
+            while len(tokens) > self.maximo_por_conta:
+                self._remover(tokens[0])
+            self._verificadores[conta] = (self._verificador(conta, senha), expira)
+        return token
+
+    #Sessão do token (renovando a validade) ou None se não existe ou expirou
+    def retomar(self, token):
+        agora = time.time()
+        with self._lock:
+            sessao = self._sessoes.get(token)
+            if sessao is None:
+                return None
+            if sessao.expira < agora:
+                self._remover(token)
+                return None
+            sessao.expira = agora + self.validade
+            verificador = self._verificadores.get(sessao.conta)
+            if verificador is not None:
+                self._verificadores[sessao.conta] = (verificador[0], max(verificador[1], sessao.expira))
+            return sessao
+
+    #A conexão da conta caiu ou saiu: a validade dos tokens dela passa a contar a partir de agora
+    def renovar_conta(self, conta):
+        expira = time.time() + self.validade
+        with self._lock:
+            for token in self._por_conta.get(conta, ()):
+                self._sessoes[token].expira = expira
+            verificador = self._verificadores.get(conta)
+            if verificador is not None:
+                self._verificadores[conta] = (verificador[0], expira)
+
+    def revogar(self, token):
+        with self._lock:
+            self._remover(token)
+
+    #LOGOUT: nenhum token da conta vale mais e a próxima senha é conferida com o hash de novo
+    def encerrar_conta(self, conta):
+        with self._lock:
+            for token in list(self._por_conta.get(conta, ())):
+                self._remover(token)
+            self._verificadores.pop(conta, None)
+
+    #Confere a senha pelo verificador do login: True/False, ou None se não há verificador válido (conferir com o hash)
+    def senha_confere(self, conta, senha):
+        with self._lock:
+            verificador = self._verificadores.get(conta)
+        if verificador is None or verificador[1] < time.time():
+            return None
+        return hmac.compare_digest(verificador[0], self._verificador(conta, senha))
@@ -0,0 +1,1043 @@
+# banco.py / Motor do banco compartilhado por todos os protocolos do servidor (texto/binário em servidor.py, menu em
+# telnet.py): contas em memória, diário e checkpoints, log de transações e extrato, métricas e o registro das sessões
+# logadas. As operações recebem valores já convertidos e devolvem (status, dados); cada protocolo monta as próprias
+# mensagens. Como existe um só motor por processo, um alerta de transferência chega ao destinatário em qualquer
+# protocolo, e não há duas cópias das contas gravando por cima uma da outra. No modo particionado (particoes.py) cada
+# processo tem o motor só das suas contas: executar_operacao repassa o comando de uma conta de outra partição para a
+# dona, e uma transferência para outra partição passa pelas duas fases de transferir_entre_particoes.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from persistencia import Diario, DiarioIndisponivel, Checkpoints, gravar_snapshot, carregar_snapshot
+from snapshot_binario import gravar_snapshot_binario, carregar_snapshot_binario
+from registro_transacoes import RegistroTransacoes
+from extrato import Extrato, movimento, DEPOSITO, SAQUE, TRANSFERENCIA_ENVIADA, TRANSFERENCIA_RECEBIDA
+from armazem import ArmazemContas, formatar_centavos, SALDO_MAXIMO
+from metricas import Metricas
+from idempotencia import CacheIdempotencia, chave_valida, resumo_pedido
+from admissao import BaldeTokens, LimitesContas, CargaComandos
+from ociosidade import RodaTempo
+from autenticacao import TabelaSessoes, gerar_hash_senha, verificar_senha
+from particoes import (Particoes, ServidorParticao, TransacoesDistribuidas, ParticaoIndisponivel, particao_da_conta,
+                       particao_do_cpf, particao_do_token, ARQUIVO_SOCKET)
+from fila_saida import FilaSaida, ENFILEIRADO, AGRUPADO, DESCONECTADO
+from protocolo_binario import (ST_OK, ST_NAO_LOGADO, ST_LOGIN_INVALIDO, ST_CPF_DUPLICADO, ST_SENHA_INCORRETA,
+                               ST_VALOR_INVALIDO, ST_SALDO_INSUFICIENTE, ST_CONTA_INEXISTENTE, ST_MESMA_CONTA,
+                               ST_LOTE_VAZIO, ST_LOTE_GRANDE, ST_MAL_FORMATADO, ST_DESCONHECIDO, ST_ERRO, ST_CHAVE_REUTILIZADA,
+                               ST_SESSAO_INVALIDA, ST_LIMITE_PEDIDOS, ST_OCUPADO, ST_SESSAO_ATIVA)
+
+PASTA_DADOS = "dados"
+PASTA_LOGS = "logs"
+ARQUIVO_CONTAS = os.path.join(PASTA_DADOS, "contas.bin")
+# Checkpoint no formato antigo, lido só quando ainda não existe o binário (a primeira subida depois da troca converte)
+ARQUIVO_CONTAS_JSON = os.path.join(PASTA_DADOS, "contas.json")
+# Respostas guardadas pelas chaves de idempotência, gravadas junto com cada checkpoint (veja idempotencia.py)
+ARQUIVO_IDEMPOTENCIA = os.path.join(PASTA_DADOS, "idempotencia.json")
+# Transferências entre partições ainda sem o crédito confirmado e créditos já recebidos, gravados junto com cada checkpoint
+ARQUIVO_DISTRIBUIDAS = os.path.join(PASTA_DADOS, "distribuidas.json")
+PASTA_DIARIO = os.path.join(PASTA_DADOS, "diario")
+ARQUIVO_LOG = os.path.join(PASTA_LOGS, "transacoes.log")
+ARQUIVO_EXTRATO = os.path.join(PASTA_LOGS, "extrato.jsonl")
+# Quantidade de operações no diário antes de gravar um novo checkpoint em contas.bin
+CHECKPOINT_A_CADA = 1000
+# Intervalo máximo (segundos) entre checkpoints enquanto houver operações novas
+INTERVALO_CHECKPOINT = 60
+# Log de transações: intervalo máximo (segundos) e número de linhas por gravação, e o modo de durabilidade
+# ("buffer", "flush" ou "fsync" - veja registro_transacoes.py)
+INTERVALO_LOG = 0.2
+LOTE_LOG = 512
+MODO_LOG = "flush"
+# Rotação do log: o arquivo ativo vira um segmento compactado ao passar deste tamanho (bytes) ou idade (segundos)
+TAMANHO_SEGMENTO_LOG = 64 * 1024 * 1024
+IDADE_SEGMENTO_LOG = 24 * 60 * 60
+# Limite de conexões abertas (somando todos os protocolos; no modo com threads também é o máximo de threads de
+# atendimento) e, no modo asyncio, threads que executam os comandos (o event loop não pode esperar disco/travas)
+MAX_CONEXOES = 20000
+THREADS_COMANDOS = 8
+# Admissão (veja admissao.py): comandos por segundo e rajada de cada conexão e de cada conta (0 = sem limite) e
+# quantos comandos podem estar na fila/executando antes de os novos serem recusados com "ocupado"
+TAXA_COMANDOS_CONEXAO = 1000
+RAJADA_COMANDOS_CONEXAO = 2000
+TAXA_COMANDOS_CONTA = 2000
+RAJADA_COMANDOS_CONTA = 4000
+LIMITE_FILA_COMANDOS = 1024
+# Conexões paradas (veja ociosidade.py): segundos sem mandar nada estando logada e segundos para entrar numa conta
+# depois de conectar (0 = sem limite)
+TEMPO_OCIOSO = 15 * 60
+TEMPO_LOGIN = 2 * 60
+# Quantidade máxima de operações em um único BATCH
+MAX_ITENS_BATCH = 5000
+# EXTRATO: movimentos por página quando o cliente não diz, e o máximo por página
+ITENS_EXTRATO = 10
+MAX_ITENS_EXTRATO = 100
+# Alertas esperando envio em cada conexão e o que fazer com um cliente que não lê (veja fila_saida.py)
+LIMITE_FILA_SAIDA = 256
+POLITICA_CLIENTE_LENTO = "agrupar"
+# Chaves de idempotência: quantas respostas guardar e por quanto tempo (segundos) um pedido repetido é reconhecido
+MAX_CHAVES_IDEMPOTENCIA = 100000
+VALIDADE_IDEMPOTENCIA = 24 * 60 * 60
+# Sessões (veja autenticacao.py): segundos que um token vale depois da última conexão com ele cair
+VALIDADE_SESSAO = 60 * 60
+# Modo particionado (veja particoes.py): esta partição e o total (1 = um processo só com todas as contas), threads que
+# atendem os pedidos das outras partições e segundos até reenviar o crédito de uma transferência entre partições
+PARTICAO = 0
+PARTICOES = 1
+THREADS_PARTICAO = 32
+INTERVALO_PENDENTES = 1.0
+
+# # Estruturas
+contas = ArmazemContas() # Colunas com nome/CPF/senha e saldo em centavos; travas por faixa de contas (veja armazem.py)
+conexoes_ativas = {} # conta -> FilaSaida da conexão logada nela
+diario = Diario(PASTA_DIARIO)
+checkpoints = Checkpoints(diario, lambda: salvar_contas(), INTERVALO_CHECKPOINT, CHECKPOINT_A_CADA)
+seq_checkpoint = 0
+extrato = Extrato(ARQUIVO_EXTRATO) # Movimentos de cada conta, gravados pela thread do registro_log
+registro_log = RegistroTransacoes(ARQUIVO_LOG, INTERVALO_LOG, LOTE_LOG, MODO_LOG, extrato=extrato,
+                                  tamanho_segmento=TAMANHO_SEGMENTO_LOG, idade_segmento=IDADE_SEGMENTO_LOG)
+executor_comandos = ThreadPoolExecutor(max_workers=THREADS_COMANDOS, thread_name_prefix="comandos")
+metricas = Metricas()
+idempotencia = CacheIdempotencia(MAX_CHAVES_IDEMPOTENCIA, VALIDADE_IDEMPOTENCIA)
+sessoes = TabelaSessoes(VALIDADE_SESSAO) # token -> conta; também confere a senha das operações sem refazer o hash
+limites_contas = LimitesContas(TAXA_COMANDOS_CONTA, RAJADA_COMANDOS_CONTA) # balde de tokens de cada conta
+carga = CargaComandos(LIMITE_FILA_COMANDOS) # comandos admitidos e ainda não respondidos, de todas as conexões
+ociosas = RodaTempo(TEMPO_OCIOSO, TEMPO_LOGIN) # prazo de cada conexão aberta, olhado por uma thread só
+# Modo particionado: conexões com as outras partições (configurar_particoes), transferências entre partições e pools
+# dos pedidos delas - os comandos repassados num, o resto (que nunca espera outra partição) no outro, sem deadlock
+pares = None
+distribuidas = TransacoesDistribuidas()
+executor_repassados = ThreadPoolExecutor(max_workers=THREADS_PARTICAO, thread_name_prefix="repassados")
+executor_particoes = ThreadPoolExecutor(max_workers=THREADS_PARTICAO, thread_name_prefix="particoes")
+parar_pendentes = threading.Event()
+
+# Aloca as threads no sistema - contas_lock só protege a criação de contas e o índice de CPF
+# (contas_lock e conexoes_lock medem o tempo de espera e de posse, veja metricas.py)
+contas_lock = metricas.trava("contas_lock")
+conexoes_lock = metricas.trava("conexoes_lock")
+checkpoint_lock = threading.Lock()
+
+# # Métricas usadas em vários pontos do servidor
+espera_travas_contas = metricas.histograma("trava_espera_segundos", "Tempo esperando para pegar a trava", trava="contas")
+posse_travas_contas = metricas.histograma("trava_posse_segundos", "Tempo com a trava pega", trava="contas")
+tempo_salvar_contas = metricas.histograma("salvar_contas_segundos", "Tempo gravando um checkpoint em contas.bin")
+tempo_log_transacao = metricas.histograma("log_transacao_segundos", "Tempo para colocar linhas na fila do log de transações")
+conexoes_abertas_metrica = metricas.medidor("conexoes_abertas", "Conexões abertas no momento")
+notificacoes_enviadas = metricas.contador("notificacoes_enviadas_total", "Alertas de transferência enviados")
+notificacoes_falhas = metricas.contador("notificacoes_falhas_total", "Alertas de transferência que falharam no envio")
+notificacoes_agrupadas = metricas.contador("notificacoes_agrupadas_total", "Alertas somados a outro pendente (cliente lento)")
+desconexoes_lentos = metricas.contador("desconexoes_cliente_lento_total", "Conexões derrubadas por não lerem os alertas")
+pedidos_repetidos = metricas.contador("pedidos_repetidos_total", "Pedidos com chave de idempotência respondidos do cache")
+conexoes_recusadas = metricas.contador("conexoes_recusadas_total", "Conexões recusadas com o limite de conexões atingido")
+comandos_limitados = metricas.contador("comandos_limitados_total", "Comandos recusados pelo limite por conexão/conta")
+comandos_descartados = metricas.contador("comandos_descartados_total", "Comandos recusados com o servidor ocupado")
+comandos_repassados = metricas.contador("comandos_repassados_total", "Comandos repassados para a partição dona da conta")
+transferencias_particoes = metricas.contador("transferencias_particoes_total", "Transferências/lotes com crédito em outra partição")
+
+#Valores que já são contados em outro lugar, lidos só quando alguém pede as métricas
+def metricas_coletadas():
+    estatisticas = registro_log.estatisticas()
+    return [("sessoes_logadas", "Contas com uma conexão logada", len(conexoes_ativas)),
+            ("contas_total", "Contas cadastradas", len(contas)),
+            ("chaves_idempotencia", "Respostas guardadas por chave de idempotência", len(idempotencia)),
+            ("sessoes_token", "Tokens de sessão válidos", len(sessoes)),
+            ("comandos_em_andamento", "Comandos na fila do pool ou executando", carga.em_andamento),
+            ("sessoes_recuperadas_total", "Conexões encerradas por inatividade ou sem login no prazo", ociosas.recuperadas),
+            ("transferencias_pendentes", "Transferências entre partições esperando o crédito ser confirmado", len(distribuidas)),
+            ("log_fila", "Linhas esperando na fila do log de transações", estatisticas["fila"]),
+            ("log_gravados_total", "Linhas gravadas no log de transações", estatisticas["gravados"]),
+            ("log_descartados_total", "Linhas descartadas com a fila do log cheia", estatisticas["descartados"]),
+            ("extrato_fila", "Movimentos do extrato esperando gravação", estatisticas["movimentos_fila"]),
+            ("log_erros_gravacao_total", "Lotes do log de transações/extrato com falha na escrita", estatisticas["erros_gravacao"]),
+            ("log_rotacoes_total", "Segmentos do log de transações rotacionados", estatisticas["rotacoes"])]
+
+metricas.coletor(metricas_coletadas)
+
+# Trava as contas em ordem, assim duas transferências cruzadas não travam uma à outra.
+# Se o diário recusar o registro da operação (DiarioIndisponivel, depois de uma falha de gravação), os saldos voltam ao
+# que eram quando a trava foi pega: nada que não foi para o diário fica na memória.
+@contextmanager
+def travar_contas(*nums):
+    inicio = time.perf_counter()
+    with contas.travar(*nums):
+        adquirida = time.perf_counter()
+        espera_travas_contas.observar(adquirida - inicio)
+        saldos = [(num, contas.saldo(num)) for num in nums if num in contas]
+        try:
+            yield
+        except DiarioIndisponivel:
+            for num, saldo in saldos:
+                contas.definir_saldo(num, saldo)
+            raise
+        finally:
+            posse_travas_contas.observar(time.perf_counter() - adquirida)
+
+# Fila de saída dos alertas para uma conexão nova, com o limite e a política configurados (veja fila_saida.py).
+# "codificar" transforma o alerta nos bytes do protocolo da conexão.
+def nova_fila(codificar):
+    return FilaSaida(codificar, LIMITE_FILA_SAIDA, POLITICA_CLIENTE_LENTO)
+
+# Funções para carregar e salvar contas
+def carregar_contas():
+    global seq_checkpoint
+    with contas_lock:
+        inicio = time.perf_counter()
+        binario = carregar_snapshot_binario(ARQUIVO_CONTAS)
+        antigo = None if binario else carregar_snapshot(ARQUIVO_CONTAS_JSON)
+        if binario:
+            caminho, base = binario
+            contas.limpar(base)
+            seq_checkpoint = base.seq
+        elif antigo:
+            caminho, dados = antigo
+            contas.carregar(dados.get("contas", {}))
+            seq_checkpoint = dados.get("seq", 0)
+        if binario or antigo:
+            print(f"[INFO] {len(contas)} contas carregadas de {caminho} em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+        else:
+            print("[INFO] Arquivo de contas não encontrado. Começando do zero.")
+            contas.limpar()
+            seq_checkpoint = 0
+
+        # Respostas das chaves de idempotência: as do arquivo e as registradas no diário depois dele
+        idempotencia.limpar()
+        seq_idempotencia = 0
+        guardadas = carregar_snapshot(ARQUIVO_IDEMPOTENCIA, "chaves")
+        if guardadas:
+            seq_idempotencia = guardadas[1].get("seq", 0)
+            for conta, chave, resumo, instante, status, dados, seq in guardadas[1].get("chaves", []):
+                idempotencia.restaurar((conta, chave), resumo, instante, status, dados, seq)
+
+        # Transferências entre partições (só no modo particionado), do mesmo jeito
+        distribuidas.limpar()
+        seq_distribuidas = seq_checkpoint
+        if PARTICOES > 1:
+            guardadas = carregar_snapshot(ARQUIVO_DISTRIBUIDAS, "proximo")
+            if guardadas:
+                seq_distribuidas = guardadas[1].get("seq", 0)
+                distribuidas.restaurar(guardadas[1])
+
+        # Reaplica só o que ficou no diário depois do checkpoint carregado
+        ultimo_seq = seq_checkpoint
+        for registro in diario.ler(min(seq_checkpoint, seq_idempotencia, seq_distribuidas)):
+            if registro["seq"] > seq_checkpoint:
+                for num, dados_conta in sorted(registro.get("contas", {}).items(), key=lambda item: int(item[0])):
+                    contas.aplicar(num, dados_conta)
+            pedido = registro.get("idempotencia")
+            if pedido and registro["seq"] > seq_idempotencia:
+                idempotencia.restaurar((pedido["conta"], pedido["chave"]), pedido["resumo"], pedido["t"], ST_OK,
+                                       pedido["resposta"], registro["seq"])
+            if registro["seq"] > seq_distribuidas:
+                restaurar_distribuida(registro)
+            ultimo_seq = max(ultimo_seq, registro["seq"])
+        if ultimo_seq > seq_checkpoint:
+            print(f"[INFO] {ultimo_seq - seq_checkpoint} operações recuperadas do diário.")
+        if distribuidas.pendentes:
+            print(f"[PARTICOES] {len(distribuidas)} transferências entre partições com crédito a confirmar.")
+        diario.abrir(ultimo_seq)
+
+# Parte de um registro do diário que é das transferências entre partições: a decisão de uma transferência coordenada
+# aqui (fica pendente), o fim dela, ou um crédito de outra partição aplicado aqui
+def restaurar_distribuida(registro):
+    decisao = registro.get("distribuida")
+    if decisao:
+        distribuidas.restaurar_pendente(decisao["n"], decisao["creditos"])
+    if "fim" in registro:
+        distribuidas.concluir(registro["fim"])
+    recebida = registro.get("recebida")
+    if recebida:
+        distribuidas.marcar_aplicada(recebida["de"], recebida["n"], recebida["piso"])
+
+# Grava um checkpoint: as colunas são copiadas com todas as travas das contas pegas (só o tempo da cópia), então nenhuma
+# operação está pela metade na cópia; a montagem do arquivo e o disco ficam fora das travas. Tudo que está na cópia já
+# foi registrado no diário (até o seq "ate"), e o arquivo só é gravado depois que esses registros estiverem no disco:
+# se o diário falhar antes disso, o checkpoint não sai (DiarioIndisponivel) e o anterior continua valendo.
+# O seq do checkpoint é lido antes da cópia; o que entrou entre ele e "ate" é reaplicado na recuperação (o diário
+# guarda o estado novo das contas, então reaplicar o que já está no checkpoint não muda nada).
+# Depois apaga os segmentos do diário já cobertos pelo checkpoint anterior (mantido como contas.bin.anterior).
+# O checkpoint é binário (snapshot_binario.py); o conversor do mesmo módulo gera um contas.json quando precisar.
+# As respostas das chaves de idempotência vão antes para idempotencia.json, marcadas com o seq do checkpoint anterior:
+# o diário a partir dele só é apagado no próximo checkpoint, então uma operação que terminou durante a cópia
+# ainda é encontrada no diário na recuperação. O distribuidas.json (modo particionado) segue a mesma regra.
+def salvar_contas():
+    global seq_checkpoint
+    with checkpoint_lock, tempo_salvar_contas.medir():
+        try:
+            with contas_lock:
+                seq = diario.rotacionar()
+                if seq == seq_checkpoint and os.path.exists(ARQUIVO_CONTAS):
+                    return
+                with contas.travar_todas():
+                    copia = contas.copiar()
+                    ate = diario.ultimo_seq
+            diario.aguardar(ate)
+            gravar_snapshot(ARQUIVO_IDEMPOTENCIA, {"seq": seq_checkpoint, "chaves": idempotencia.exportar()})
+            if PARTICOES > 1:
+                gravar_snapshot(ARQUIVO_DISTRIBUIDAS, {"seq": seq_checkpoint, **distribuidas.exportar()})
+            gravar_snapshot_binario(ARQUIVO_CONTAS, seq, copia)
+            diario.descartar_ate(seq_checkpoint)
+            seq_checkpoint = seq
+        except Exception as e:
+            print(f"[ERRO FATAL] Falha ao salvar contas: {e}")
+
+# Registra a operação no diário com o estado novo das contas alteradas - chamar com as travas dessas contas.
+# Com pedido (conta, chave, resumo) a resposta vai no mesmo registro, então a operação e a chave ficam gravadas juntas.
+# Com creditos ({partição: [[conta, centavos, origem, nome da origem], ...]}) o registro também é a decisão de uma
+# transferência entre partições, e devolve o número dela; recebida marca um crédito vindo de outra partição, e fim
+# encerra uma transferência coordenada aqui (o estorno dos créditos recusados vai no mesmo registro que o fim).
+def registrar_operacao(operacao, contas_alteradas, cpfs_novos=None, pedido=None, resposta=None, creditos=None, recebida=None,
+                       fim=None):
+    registro = {"op": operacao, "contas": {num: contas.registro(num) for num in contas_alteradas}}
+    if cpfs_novos:
+        registro["cpf_salvos"] = cpfs_novos
+    if pedido is not None:
+        conta, chave, resumo = pedido
+        registro["idempotencia"] = {"conta": conta, "chave": chave, "resumo": resumo, "t": round(time.time(), 3),
+                                    "resposta": {campo: valor for campo, valor in resposta.items() if campo != "alertas"}}
+    numero = None
+    if creditos:
+        numero = distribuidas.nova(creditos)
+        registro["distribuida"] = {"n": numero, "creditos": creditos}
+    if recebida is not None:
+        registro["recebida"] = recebida
+    if fim is not None:
+        registro["fim"] = fim
+    try:
+        diario.registrar(registro)
+    except DiarioIndisponivel:
+        if numero is not None:
+            distribuidas.concluir(numero) # o débito é desfeito por travar_contas, não há crédito a mandar
+        raise
+    return numero
+
+#Função para logar transações - só coloca na fila, a thread do registro_log grava no arquivo (e os movimentos no extrato).
+#Quem tem movimentos chama com as travas das contas pegas, para o extrato de cada conta sair na ordem dos saldos, e
+#depois de soltar as travas chama registro_log.aguardar_vaga() (executar_aqui já faz isso por todas as operações).
+def log_transacao(mensagem, movimentos=()):
+    with tempo_log_transacao.medir():
+        registro_log.registrar(mensagem, movimentos)
+
+# Várias linhas de log de uma vez (usado pelo BATCH)
+def log_transacoes(mensagens, movimentos=None):
+    with tempo_log_transacao.medir():
+        registro_log.registrar_varios(mensagens, movimentos)
+
+# Alertas são (conta de origem, nome de quem mandou, quantidade de transferências, total em centavos); a fila de saída
+# de cada conexão transforma o alerta nos bytes do protocolo dela e, com a política "agrupar", soma os da mesma origem
+# (veja fila_saida.py)
+# Função para enviar notificações a clientes conectados (necessário recarregar a página ativa)
+def enviar_notificacao(num_conta_destino, alerta):
+    enviar_notificacoes([(num_conta_destino, alerta)])
+
+# Coloca cada (conta, alerta) na fila de saída da conexão logada na conta. conexoes_lock fica pego só para achar as
+# filas; o envio é feito pelo escritor de cada conexão, então um cliente lento não atrasa ninguém.
+# No modo particionado a conta pode estar logada por uma conexão de outro processo: o que não tem conexão aqui vai
+# para as outras partições, que entregam se tiverem.
+def enviar_notificacoes(notificacoes):
+    fora = entregar_notificacoes(notificacoes)
+    if fora and PARTICOES > 1:
+        pares.avisar_todas("ALERTAS", fora)
+
+# Entrega os alertas das contas logadas neste processo e devolve os outros
+def entregar_notificacoes(notificacoes):
+    with conexoes_lock:
+        destinos = [(num, conexoes_ativas.get(num), alerta) for num, alerta in notificacoes]
+    fora = []
+    for num_conta_destino, fila, alerta in destinos:
+        if fila is None:
+            fora.append((num_conta_destino, alerta))
+            continue
+        resultado = fila.enfileirar(alerta)
+        if resultado == ENFILEIRADO:
+            notificacoes_enviadas.incrementar()
+            print(f"[NOTIFICACAO] Alerta para conta {num_conta_destino} na fila de saída.")
+        elif resultado == AGRUPADO:
+            notificacoes_agrupadas.incrementar()
+        else:
+            notificacoes_falhas.incrementar()
+            print(f"[NOTIFICACAO] Alerta para conta {num_conta_destino} {resultado} (cliente não está lendo).")
+            if resultado == DESCONECTADO:
+                desconexoes_lentos.incrementar()
+    return fora
+
+# # Operações do banco: recebem valores já convertidos (centavos) e devolvem (status, dados) sem nenhum texto para o
+# cliente. O protocolo em texto e o binário chamam as mesmas funções e cada um monta a sua resposta.
+# "alertas" em dados é a lista de (conta, alerta) a enviar depois que a operação estiver no diário.
+def operacao_criar(nome, cpf, senha):
+    # O hash da senha é calculado antes de pegar a trava (é lento de propósito)
+    senha = gerar_hash_senha(senha)
+    # Criar conta é a única operação que precisa da trava global (número novo + índice de CPF)
+    with contas_lock:
+        if contas.conta_por_cpf(cpf) is not None:
+            print(f"[FALHA-CRIAR] CPF {cpf} já cadastrado.")
+            return (ST_CPF_DUPLICADO, {})
+
+        # A conta nova só aparece com a trava dela já pega, assim ninguém registra
+        # uma transferência para ela no diário antes do registro da criação
+        num_conta = contas.proximo_numero()
+        with travar_contas(num_conta):
+            contas.adicionar(nome, cpf, senha)
+            try:
+                registrar_operacao("CRIAR", [num_conta], {cpf: num_conta})
+            except DiarioIndisponivel:
+                contas.remover_ultima()
+                raise
+
+    print(f"[CONTAS] Conta {num_conta} criada para {nome} (CPF: {cpf[:3]}.***.{cpf[-3:]})")
+    log_transacao(f"CONTA_CRIADA: Conta {num_conta}, Nome: {nome}, CPF: {cpf[:3]}.***.{cpf[-3:]}")
+    return (ST_OK, {"conta": num_conta, "nome": nome})
+
+# # LEMBRETE - Fazer lógica para não conseguir logar na conta que já está em outra sessão # #
+# Login só lê o índice de CPF e a senha, que não mudam depois da criação - não precisa de trava.
+# É a única operação que confere a senha com o hash; a resposta leva o token da sessão (RETOMAR).
+def operacao_login(cpf, senha):
+    num_conta = contas.conta_por_cpf(cpf)
+    if num_conta is None:
+        print(f"[LOGIN] CPF não encontrado: {cpf[:3]}.***")
+        return (ST_LOGIN_INVALIDO, {})
+
+    if not verificar_senha(contas.senha(num_conta), senha):
+        print(f"[LOGIN] Senha incorreta para CPF {cpf[:3]}.***")
+        return (ST_LOGIN_INVALIDO, {})
+    nome = contas.nome(num_conta)
+    token = sessoes.criar(num_conta, nome, senha)
+    print(f"[LOGIN] Usuário {nome} (Conta: {num_conta}) logou.")
+    return (ST_OK, {"conta": num_conta, "nome": nome, "token": token})
+
+# Volta para a sessão de um LOGIN anterior numa conexão nova, só com o token
+def operacao_retomar(token):
+    sessao = sessoes.retomar(token)
+    if sessao is None:
+        print("[RETOMAR] Token de sessão inválido ou expirado.")
+        return (ST_SESSAO_INVALIDA, {})
+    print(f"[RETOMAR] Usuário {sessao.nome} (Conta: {sessao.conta}) retomou a sessão.")
+    return (ST_OK, {"conta": sessao.conta, "nome": sessao.nome})
+
+# Senha de confirmação das operações (opcional em SACAR/TRANSFERIR): o verificador guardado no login responde na hora;
+# só sem ele (sessão expirada) a senha é conferida com o hash
+def senha_confere(num_conta, senha):
+    confere = sessoes.senha_confere(num_conta, senha)
+    if confere is None:
+        confere = verificar_senha(contas.senha(num_conta), senha)
+    return confere
+
+# Consulta não pega a trava da conta: lê o saldo publicado (ver ArmazemContas.ler_saldo)
+def operacao_saldo(num_conta_logada):
+    saldo = contas.ler_saldo(num_conta_logada)
+    return (ST_OK, {"saldo": saldo})
+
+def operacao_depositar(num_conta_logada, valor, pedido=None):
+    if valor <= 0:
+        return (ST_VALOR_INVALIDO, {})
+    with travar_contas(num_conta_logada):
+        if not contas.ajustar_saldo(num_conta_logada, valor):
+            print(f"[DEPOSITO] Depósito de {formatar_centavos(valor)} passaria do saldo máximo da C:{num_conta_logada}.")
+            return (ST_VALOR_INVALIDO, {})
+        saldo_atual = contas.saldo(num_conta_logada)
+        resposta = {"valor": valor, "saldo": saldo_atual}
+        registrar_operacao("DEPOSITAR", [num_conta_logada], pedido=pedido, resposta=resposta)
+        log_transacao(f"DEPOSITO: Sucesso - Conta {num_conta_logada}, Valor: {formatar_centavos(valor)}, Saldo Novo: {formatar_centavos(saldo_atual)}",
+                      [movimento(num_conta_logada, DEPOSITO, valor, saldo_atual)])
+    print(f"[DEPOSITO] Conta {num_conta_logada} depositou R$ {formatar_centavos(valor)}.")
+    return (ST_OK, resposta)
+
+def operacao_sacar(num_conta_logada, valor, senha=None, pedido=None):
+    if senha is not None and not senha_confere(num_conta_logada, senha):
+        return (ST_SENHA_INCORRETA, {})
+    if valor <= 0:
+        return (ST_VALOR_INVALIDO, {})
+    with travar_contas(num_conta_logada):
+        if contas.saldo(num_conta_logada) < valor:
+            print(f"[SACAR] Saldo insuficiente para C:{num_conta_logada} (Tenta: {formatar_centavos(valor)}, Tem: {formatar_centavos(contas.saldo(num_conta_logada))})")
+            return (ST_SALDO_INSUFICIENTE, {})
+        contas.ajustar_saldo(num_conta_logada, -valor)
+        saldo_atual = contas.saldo(num_conta_logada)
+        resposta = {"valor": valor, "saldo": saldo_atual}
+        registrar_operacao("SACAR", [num_conta_logada], pedido=pedido, resposta=resposta)
+        log_transacao(f"SAQUE: Sucesso - Conta {num_conta_logada}, Valor: {formatar_centavos(valor)}, Saldo Novo: {formatar_centavos(saldo_atual)}",
+                      [movimento(num_conta_logada, SAQUE, -valor, saldo_atual)])
+    print(f"[SACAR] Conta {num_conta_logada} sacou R$ {formatar_centavos(valor)}.")
+    return (ST_OK, resposta)
+
+def operacao_transferir(num_conta_logada, c_destino, valor, senha=None, pedido=None):
+    if c_destino not in contas and em_outra_particao(c_destino) is None:
+        return (ST_CONTA_INEXISTENTE, {})
+    if c_destino == num_conta_logada:
+        return (ST_MESMA_CONTA, {})
+    if senha is not None and not senha_confere(num_conta_logada, senha):
+        return (ST_SENHA_INCORRETA, {})
+    if valor <= 0:
+        return (ST_VALOR_INVALIDO, {})
+    if c_destino not in contas:
+        return transferir_entre_particoes(num_conta_logada, c_destino, valor, pedido)
+
+    # Trava as duas contas (em ordem) só durante a verificação do saldo e a movimentação
+    with travar_contas(num_conta_logada, c_destino):
+        if not contas.cabe(c_destino, valor):
+            print(f"[TRANSFERÊNCIA] Crédito de {formatar_centavos(valor)} passaria do saldo máximo da C:{c_destino}.")
+            return (ST_VALOR_INVALIDO, {})
+        if not contas.mover(num_conta_logada, c_destino, valor):
+            print(f"[TRANSFERÊNCIA] Saldo insuficiente para C:{num_conta_logada} (Tenta: {formatar_centavos(valor)}, Tem: {formatar_centavos(contas.saldo(num_conta_logada))})")
+            return (ST_SALDO_INSUFICIENTE, {})
+        saldo_atual = contas.saldo(num_conta_logada)
+        nome_origem = contas.nome(num_conta_logada)
+        nome_destino = contas.nome(c_destino)
+        resposta = {"valor": valor, "saldo": saldo_atual, "destino": c_destino, "nome_destino": nome_destino}
+        registrar_operacao("TRANSFERIR", [num_conta_logada, c_destino], pedido=pedido, resposta=resposta)
+        log_transacao(f"TRANSFERENCIA: Sucesso - R$ {formatar_centavos(valor)} de C:{num_conta_logada} ({nome_origem}) para C:{c_destino} ({nome_destino})",
+                      [movimento(num_conta_logada, TRANSFERENCIA_ENVIADA, -valor, saldo_atual, c_destino),
+                       movimento(c_destino, TRANSFERENCIA_RECEBIDA, valor, contas.saldo(c_destino), num_conta_logada)])
+
+    print(f"[TRANSFERÊNCIA] {nome_origem} (C:{num_conta_logada}) -> {nome_destino} (C:{c_destino}), Valor: R$ {formatar_centavos(valor)}")
+
+    alertas = [(c_destino, (num_conta_logada, nome_origem, 1, valor))]
+    return (ST_OK, {**resposta, "alertas": alertas})
+
+# # Transferências entre partições (veja TransacoesDistribuidas em particoes.py)
+#Partição dona da conta, se for outra (no modo particionado); None se for esta ou se o número não é de conta
+def em_outra_particao(num):
+    if PARTICOES == 1:
+        return None
+    particao = particao_da_conta(num, PARTICOES)
+    return None if particao == PARTICAO else particao
+
+#Primeira fase, antes de debitar: cada partição confere se as contas de destino dela existem e se o crédito cabe no
+#saldo de cada uma, e devolve os nomes. destinos: {partição: {conta: [item do lote, total em centavos]}}.
+#Devolve (status, nomes, item); nada foi alterado em lugar nenhum.
+def preparar_creditos(destinos):
+    nomes = {}
+    for particao, contas_particao in destinos.items():
+        try:
+            resposta = pares.chamar(particao, "PREPARAR", {conta: total for conta, (_, total) in contas_particao.items()})
+        except Exception as e:
+            print(f"[PARTICOES] Partição {particao} indisponível para a transferência: {e}")
+            return (ST_OCUPADO, {}, 0)
+        if resposta["inexistente"] is not None:
+            return (ST_CONTA_INEXISTENTE, {}, contas_particao[resposta["inexistente"]][0])
+        if resposta["cheia"] is not None:
+            print(f"[TRANSFERÊNCIA] Crédito passaria do saldo máximo da C:{resposta['cheia']} (partição {particao}).")
+            return (ST_VALOR_INVALIDO, {}, contas_particao[resposta["cheia"]][0])
+        nomes.update(resposta["nomes"])
+    return (ST_OK, nomes, 0)
+
+#PREPARAR pedido pela coordenadora (creditos: {conta: total em centavos}): não guarda nada nem reserva o saldo, então
+#outro crédito pode encher a conta antes do CREDITAR - nesse caso o CREDITAR recusa e a coordenadora estorna
+def conferir_destinos(creditos):
+    inexistente = next((conta for conta in creditos if conta not in contas), None)
+    cheia = next((conta for conta, total in creditos.items() if conta in contas and not contas.cabe(conta, total)), None)
+    return {"nomes": {conta: contas.nome(conta) for conta in creditos if conta in contas}, "inexistente": inexistente,
+            "cheia": cheia}
+
+def transferir_entre_particoes(num_conta_logada, c_destino, valor, pedido=None):
+    particao = em_outra_particao(c_destino)
+    status, nomes, _ = preparar_creditos({particao: {c_destino: [0, valor]}})
+    if status != ST_OK:
+        return (status, {})
+    nome_destino = nomes[c_destino]
+
+    # Débito e decisão no mesmo registro do diário, só com a trava da origem (nenhuma trava espera outra partição)
+    with travar_contas(num_conta_logada):
+        if contas.saldo(num_conta_logada) < valor:
+            print(f"[TRANSFERÊNCIA] Saldo insuficiente para C:{num_conta_logada} (Tenta: {formatar_centavos(valor)}, Tem: {formatar_centavos(contas.saldo(num_conta_logada))})")
+            return (ST_SALDO_INSUFICIENTE, {})
+        contas.ajustar_saldo(num_conta_logada, -valor)
+        saldo_atual = contas.saldo(num_conta_logada)
+        nome_origem = contas.nome(num_conta_logada)
+        resposta = {"valor": valor, "saldo": saldo_atual, "destino": c_destino, "nome_destino": nome_destino}
+        creditos = {particao: [[c_destino, valor, num_conta_logada, nome_origem]]}
+        numero = registrar_operacao("TRANSFERIR", [num_conta_logada], pedido=pedido, resposta=resposta, creditos=creditos)
+        log_transacao(f"TRANSFERENCIA: Sucesso - R$ {formatar_centavos(valor)} de C:{num_conta_logada} ({nome_origem}) para C:{c_destino} ({nome_destino}), partição {particao}",
+                      [movimento(num_conta_logada, TRANSFERENCIA_ENVIADA, -valor, saldo_atual, c_destino)])
+
+    print(f"[TRANSFERÊNCIA] {nome_origem} (C:{num_conta_logada}) -> {nome_destino} (C:{c_destino}, partição {particao}), Valor: R$ {formatar_centavos(valor)}")
+    confirmar_distribuida(numero, creditos)
+
+    alertas = [(c_destino, (num_conta_logada, nome_origem, 1, valor))]
+    return (ST_OK, {**resposta, "alertas": alertas})
+
+#Segunda fase: a decisão já está no diário (espera ficar durável antes de mandar), cada partição credita e responde, e
+#com todas as respostas o fim vai para o diário. Se alguma não responder a transação continua pendente e a thread
+#das pendentes reenvia (primeira=False) - o débito já está feito, então o cliente recebe OK de qualquer jeito.
+#Os créditos que uma partição recusou (a conta encheu depois do PREPARAR) voltam para a origem junto com o fim.
+def confirmar_distribuida(numero, creditos, primeira=True):
+    diario.confirmar()
+    transferencias_particoes.incrementar()
+    recusados = []
+    for particao, itens in creditos.items():
+        try:
+            if not pares.chamar(particao, "CREDITAR", PARTICAO, numero, distribuidas.piso(), itens):
+                recusados.extend(itens)
+        except Exception as e:
+            if primeira:
+                print(f"[PARTICOES] Crédito da transação {PARTICAO}-{numero} na partição {particao} pendente: {e}")
+            return False
+    if recusados:
+        if not estornar_distribuida(numero, recusados):
+            return False
+    else:
+        diario.registrar({"op": "FIM", "contas": {}, "fim": numero})
+    # O número só sai das pendentes (e o piso passa dele) com o fim já no disco
+    diario.confirmar()
+    distribuidas.concluir(numero)
+    if not primeira:
+        print(f"[PARTICOES] Crédito da transação {PARTICAO}-{numero} confirmado na nova tentativa.")
+    return True
+
+#CREDITAR pedido pela coordenadora: aplica os créditos uma vez só (um reenvio de um número já aplicado só espera o
+#disco) e responde True com o registro já durável. Se algum crédito passaria do saldo máximo da conta, nada é aplicado
+#nem gravado e a resposta é False: a coordenadora estorna esses créditos para a origem e encerra a transação.
+def creditar_distribuida(coordenadora, numero, piso, itens):
+    destinos = {conta for conta, _, _, _ in itens}
+    with travar_contas(*destinos):
+        repetida = distribuidas.aplicada(coordenadora, numero)
+        if not repetida:
+            totais = {}
+            for conta, valor, _, _ in itens:
+                totais[conta] = totais.get(conta, 0) + valor
+            cheia = next((conta for conta, total in totais.items() if not contas.cabe(conta, total)), None)
+            if cheia is not None:
+                print(f"[PARTICOES] Crédito da transação {coordenadora}-{numero} recusado: passaria do saldo máximo da C:{cheia}.")
+                return False
+            mensagens_log = []
+            movimentos_log = []
+            for conta, valor, origem, nome_origem in itens:
+                contas.ajustar_saldo(conta, valor)
+                mensagens_log.append(f"CREDITO: Sucesso - R$ {formatar_centavos(valor)} de C:{origem} ({nome_origem}) para C:{conta} ({contas.nome(conta)}), transação {coordenadora}-{numero}")
+                movimentos_log.append([movimento(conta, TRANSFERENCIA_RECEBIDA, valor, contas.saldo(conta), origem)])
+            registrar_operacao("CREDITO", destinos, recebida={"de": coordenadora, "n": numero, "piso": piso})
+            distribuidas.marcar_aplicada(coordenadora, numero, piso)
+            log_transacoes(mensagens_log, movimentos_log)
+    registro_log.aguardar_vaga()
+    if repetida:
+        diario.esvaziar()
+    else:
+        diario.confirmar()
+    return True
+
+#Devolve às contas de origem os créditos recusados pelo destino, no mesmo registro do diário que o fim da transação.
+#Se a própria origem encheu desde o débito, o estorno também não cabe: a transação continua pendente e é tentada de
+#novo (o crédito no destino ou o estorno entra quando uma das contas tiver espaço).
+def estornar_distribuida(numero, itens):
+    origens = {origem for _, _, origem, _ in itens}
+    with travar_contas(*origens):
+        totais = {}
+        for _, valor, origem, _ in itens:
+            totais[origem] = totais.get(origem, 0) + valor
+        cheia = next((origem for origem, total in totais.items() if not contas.cabe(origem, total)), None)
+        if cheia is not None:
+            print(f"[PARTICOES] Estorno da transação {PARTICAO}-{numero} passaria do saldo máximo da C:{cheia}, fica pendente.")
+            return False
+        mensagens_log = []
+        movimentos_log = []
+        for conta, valor, origem, nome_origem in itens:
+            contas.ajustar_saldo(origem, valor)
+            mensagens_log.append(f"ESTORNO: R$ {formatar_centavos(valor)} de volta para C:{origem} ({nome_origem}), crédito recusado pela C:{conta}, transação {PARTICAO}-{numero}")
+            movimentos_log.append([movimento(origem, TRANSFERENCIA_RECEBIDA, valor, contas.saldo(origem), conta)])
+        registrar_operacao("ESTORNO", origens, fim=numero)
+        log_transacoes(mensagens_log, movimentos_log)
+    registro_log.aguardar_vaga()
+    print(f"[PARTICOES] Transação {PARTICAO}-{numero}: {len(itens)} crédito(s) recusado(s) estornado(s) para a origem.")
+    return True
+
+#Thread das pendentes: reenvia os créditos que ficaram sem resposta (e os que voltaram do diário ao subir)
+def reenviar_pendentes():
+    while not parar_pendentes.wait(INTERVALO_PENDENTES):
+        for numero, creditos in distribuidas.atrasadas(INTERVALO_PENDENTES):
+            confirmar_distribuida(numero, creditos, primeira=False)
+
+# Lote de transferências/depósitos da conta logada: tudo é validado antes e aplicado de uma vez (ou nada é
+# aplicado), com um único registro no diário e uma única escrita no log. Os alertas saem depois do commit.
+# Destinos de outras partições são conferidos antes (preparar_creditos) e creditados depois do registro, como numa
+# transferência entre partições.
+# operacoes: [("TRANSFERIR", conta, centavos) ou ("DEPOSITAR", conta logada, centavos), ...]
+def operacao_batch(num_conta_logada, senha, operacoes, pedido=None):
+    if not senha_confere(num_conta_logada, senha):
+        return (ST_SENHA_INCORRETA, {"item": 0})
+    if not operacoes:
+        return (ST_LOTE_VAZIO, {"item": 0})
+    if len(operacoes) > MAX_ITENS_BATCH:
+        return (ST_LOTE_GRANDE, {"item": 0})
+    remotas = {}
+    for n, (tipo, c_destino, valor) in enumerate(operacoes, 1):
+        if tipo == "TRANSFERIR" and c_destino not in contas:
+            particao = em_outra_particao(c_destino)
+            if particao is None:
+                return (ST_CONTA_INEXISTENTE, {"item": n})
+            remotas.setdefault(particao, {}).setdefault(c_destino, [n, 0])[1] += valor
+        if tipo == "TRANSFERIR" and c_destino == num_conta_logada:
+            return (ST_MESMA_CONTA, {"item": n})
+        if valor <= 0:
+            return (ST_VALOR_INVALIDO, {"item": n})
+    nomes_remotos = {}
+    if remotas:
+        status, nomes_remotos, item = preparar_creditos(remotas)
+        if status != ST_OK:
+            return (status, {"item": item})
+
+    envolvidas = {num_conta_logada} | {c_destino for _, c_destino, _ in operacoes if c_destino not in nomes_remotos}
+    with travar_contas(*envolvidas):
+        # Simula em ordem: o saldo da conta logada não pode ficar negativo em nenhum ponto do lote, e nenhum saldo
+        # daqui pode passar de SALDO_MAXIMO (o lote inteiro é recusado antes de mexer em qualquer conta)
+        simulados = {num: contas.saldo(num) for num in envolvidas}
+        for n, (tipo, c_destino, valor) in enumerate(operacoes, 1):
+            simulados[num_conta_logada] += valor if tipo == "DEPOSITAR" else -valor
+            if simulados[num_conta_logada] < 0:
+                print(f"[BATCH] Saldo insuficiente para C:{num_conta_logada} no item {n}, lote recusado.")
+                return (ST_SALDO_INSUFICIENTE, {"item": n})
+            if tipo == "TRANSFERIR" and c_destino in simulados:
+                simulados[c_destino] += valor
+            if simulados[num_conta_logada] > SALDO_MAXIMO or simulados.get(c_destino, 0) > SALDO_MAXIMO:
+                print(f"[BATCH] Item {n} passaria do saldo máximo, lote recusado.")
+                return (ST_VALOR_INVALIDO, {"item": n})
+
+        # Cada item vira uma linha do log e os movimentos do extrato, com o saldo das contas logo depois do item
+        nome_origem = contas.nome(num_conta_logada)
+        mensagens_log = []
+        movimentos_log = []
+        recebido = {}
+        creditos = {}
+        for tipo, c_destino, valor in operacoes:
+            if tipo == "DEPOSITAR":
+                contas.ajustar_saldo(num_conta_logada, valor)
+                mensagens_log.append(f"DEPOSITO: Sucesso (lote) - Conta {num_conta_logada}, Valor: {formatar_centavos(valor)}")
+                movimentos_log.append([movimento(num_conta_logada, DEPOSITO, valor, contas.saldo(num_conta_logada))])
+            else:
+                if c_destino in nomes_remotos:
+                    contas.ajustar_saldo(num_conta_logada, -valor)
+                    creditos.setdefault(em_outra_particao(c_destino), []).append([c_destino, valor, num_conta_logada, nome_origem])
+                    nome_destino = nomes_remotos[c_destino]
+                    movimentos = [movimento(num_conta_logada, TRANSFERENCIA_ENVIADA, -valor, contas.saldo(num_conta_logada), c_destino)]
+                else:
+                    contas.mover(num_conta_logada, c_destino, valor)
+                    nome_destino = contas.nome(c_destino)
+                    movimentos = [movimento(num_conta_logada, TRANSFERENCIA_ENVIADA, -valor, contas.saldo(num_conta_logada), c_destino),
+                                  movimento(c_destino, TRANSFERENCIA_RECEBIDA, valor, contas.saldo(c_destino), num_conta_logada)]
+                mensagens_log.append(f"TRANSFERENCIA: Sucesso (lote) - R$ {formatar_centavos(valor)} de C:{num_conta_logada} ({nome_origem}) para C:{c_destino} ({nome_destino})")
+                movimentos_log.append(movimentos)
+                quantidade, total = recebido.get(c_destino, (0, 0))
+                recebido[c_destino] = (quantidade + 1, total + valor)
+        saldo_atual = contas.saldo(num_conta_logada)
+        resposta = {"saldo": saldo_atual, "quantidade": len(operacoes)}
+        numero = registrar_operacao("BATCH", envolvidas, pedido=pedido, resposta=resposta, creditos=creditos)
+        mensagens_log.append(f"LOTE: Sucesso - Conta {num_conta_logada}, {len(operacoes)} operações, Saldo Novo: {formatar_centavos(saldo_atual)}")
+        movimentos_log.append(())
+        log_transacoes(mensagens_log, movimentos_log)
+    if creditos:
+        confirmar_distribuida(numero, creditos)
+
+    # Um alerta por destinatário, mesmo que ele receba várias transferências no mesmo lote
+    alertas = [(c_destino, (num_conta_logada, nome_origem, quantidade, total)) for c_destino, (quantidade, total) in recebido.items()]
+
+    print(f"[BATCH] Conta {num_conta_logada} executou lote com {len(operacoes)} operações.")
+    return (ST_OK, {**resposta, "alertas": alertas})
+
+# Extrato da conta logada, do movimento mais recente para o mais antigo (inicio/fim em segundos desde 1970).
+# Antes espera o log gravar o que já estava na fila, assim a sessão vê as operações que acabou de fazer;
+# a consulta só lê do arquivo as linhas da página (veja extrato.py).
+def operacao_extrato(num_conta_logada, limite=ITENS_EXTRATO, pagina=1, inicio=None, fim=None):
+    if not 1 <= limite <= MAX_ITENS_EXTRATO or pagina < 1:
+        return (ST_VALOR_INVALIDO, {})
+    if inicio is not None and fim is not None and fim <= inicio:
+        return (ST_VALOR_INVALIDO, {})
+    registro_log.esperar_gravacao()
+    total, movimentos = extrato.consultar(num_conta_logada, limite, pagina, inicio, fim)
+    return (ST_OK, {"movimentos": movimentos, "total": total, "pagina": pagina, "paginas": max(-(-total // limite), 1)})
+
+def operacao_logout(num_conta_logada):
+    sessoes.encerrar_conta(num_conta_logada)
+    print(f"[DESLOGAR] Usuário {contas.nome(num_conta_logada)} (Conta: {num_conta_logada}) deslogou.")
+    return (ST_OK, {})
+
+OPERACOES = {"CRIAR": operacao_criar, "LOGIN": operacao_login, "SALDO": operacao_saldo, "DEPOSITAR": operacao_depositar,
+             "SACAR": operacao_sacar, "TRANSFERIR": operacao_transferir, "BATCH": operacao_batch, "EXTRATO": operacao_extrato,
+             "LOGOUT": operacao_logout, "RETOMAR": operacao_retomar}
+OPERACOES_SEM_LOGIN = ("CRIAR", "LOGIN", "RETOMAR")
+# Operações que movem dinheiro e aceitam chave de idempotência (as outras ignoram a chave)
+OPERACOES_IDEMPOTENTES = ("DEPOSITAR", "SACAR", "TRANSFERIR", "BATCH")
+# Respostas que não são o resultado do pedido (nada foi feito, vale tentar de novo): não ficam guardadas pela chave
+STATUS_TRANSITORIOS = (ST_OCUPADO, ST_ERRO, ST_LIMITE_PEDIDOS)
+
+#Executa a operação já com os argumentos convertidos. Devolve (status, dados, estado_retorno), em que estado_retorno
+#diz ao atendimento da conexão se a sessão entrou ou saiu de uma conta.
+#Com chave (idempotência), um pedido repetido da mesma conta recebe a resposta guardada sem executar de novo.
+#No modo particionado o comando de uma conta (ou CPF/token) de outra partição é executado na dona.
+#O LOGIN numa conta já logada em outra conexão (de qualquer protocolo ou partição) vira ST_SESSAO_ATIVA e o token
+#criado é revogado; a conferência definitiva, junto com o registro da conexão, é a do atualizar_sessao.
+def executar_operacao(operacao, argumentos, num_conta_logada, chave=None):
+    dona = particao_dona(operacao, argumentos, num_conta_logada) if PARTICOES > 1 else None
+    if dona is not None and dona != PARTICAO:
+        resultado = repassar_operacao(dona, operacao, argumentos, num_conta_logada, chave)
+    else:
+        resultado = executar_aqui(operacao, argumentos, num_conta_logada, chave)
+    status, dados, _ = resultado
+    if operacao == "LOGIN" and status == ST_OK and dados["conta"] != num_conta_logada and sessao_ativa(dados["conta"]):
+        revogar_sessao(dados["token"])
+        print(f"[LOGIN] Conta {dados['conta']} já está logada em outra conexão.")
+        return (ST_SESSAO_ATIVA, {}, ("NO_CHANGE", None, None))
+    return resultado
+
+def executar_aqui(operacao, argumentos, num_conta_logada, chave=None):
+    estado_retorno = ("NO_CHANGE", None, None)
+    if operacao not in OPERACOES:
+        return (ST_DESCONHECIDO, {}, estado_retorno)
+    # Depois de uma falha de gravação do diário, os saldos em memória podem ter operações que não chegaram ao disco:
+    # nenhuma operação (nem consulta) é atendida até o servidor reiniciar e se recuperar do que está gravado
+    if diario.falha is not None:
+        return (ST_ERRO, {"erro": "diário indisponível"}, estado_retorno)
+    if operacao not in OPERACOES_SEM_LOGIN:
+        if num_conta_logada is None:
+            return (ST_NAO_LOGADO, {}, estado_retorno)
+        argumentos = (num_conta_logada, *argumentos)
+    opcoes = {}
+    if chave is not None and operacao in OPERACOES_IDEMPOTENTES:
+        if not chave_valida(chave):
+            return (ST_MAL_FORMATADO, {}, estado_retorno)
+        resumo = resumo_pedido(operacao, argumentos)
+        guardada = idempotencia.reservar((num_conta_logada, chave), resumo)
+        if guardada is not None:
+            if guardada.resumo != resumo:
+                print(f"[IDEMPOTENCIA] Chave {chave} da conta {num_conta_logada} reutilizada em outro pedido.")
+                return (ST_CHAVE_REUTILIZADA, {}, estado_retorno)
+            # A resposta só sai depois que a operação original estiver no disco, como na primeira vez
+            diario.aguardar(guardada.seq)
+            pedidos_repetidos.incrementar()
+            print(f"[IDEMPOTENCIA] {operacao} repetido pela conta {num_conta_logada} (chave {chave}), respondido do cache.")
+            return (guardada.status, dict(guardada.dados), estado_retorno)
+        opcoes["pedido"] = (num_conta_logada, chave, resumo)
+    try:
+        status, dados = OPERACOES[operacao](*argumentos, **opcoes)
+        # Com o extrato atrasado (disco lento) a resposta espera aqui, já sem as travas das contas
+        registro_log.aguardar_vaga()
+    except Exception as e:
+        if opcoes:
+            idempotencia.cancelar((num_conta_logada, chave))
+        print(f"[ERRO] {e}")
+        metricas.contador("operacoes_total", "Operações executadas", operacao=operacao, resultado="erro").incrementar()
+        return (ST_ERRO, {"erro": str(e)}, estado_retorno)
+    if opcoes and status in STATUS_TRANSITORIOS:
+        idempotencia.cancelar((num_conta_logada, chave))
+    elif opcoes:
+        idempotencia.concluir((num_conta_logada, chave), status, dados, diario.ultimo_registrado() if status == ST_OK else 0)
+    metricas.contador("operacoes_total", "Operações executadas", operacao=operacao,
+                      resultado="ok" if status == ST_OK else "recusada").incrementar()
+    if status == ST_OK and operacao in ("LOGIN", "RETOMAR"):
+        estado_retorno = (operacao, dados["conta"], dados["nome"])
+    elif status == ST_OK and operacao == "LOGOUT":
+        estado_retorno = ("LOGOUT", None, None)
+    return (status, dados, estado_retorno)
+
+# # Roteamento entre partições
+#Partição que executa o comando: a do CPF para CRIAR/LOGIN, a do token para RETOMAR, a da conta logada para o resto.
+#None = esta mesma (o comando é recusado ou respondido aqui).
+def particao_dona(operacao, argumentos, num_conta_logada):
+    if operacao == "CRIAR" and len(argumentos) == 3:
+        return particao_do_cpf(argumentos[1], PARTICOES)
+    if operacao == "LOGIN" and len(argumentos) == 2:
+        return particao_do_cpf(argumentos[0], PARTICOES)
+    if operacao == "RETOMAR" and len(argumentos) == 1:
+        return particao_do_token(argumentos[0], PARTICOES)
+    if operacao in OPERACOES and num_conta_logada is not None:
+        return particao_da_conta(num_conta_logada, PARTICOES)
+    return None
+
+#Manda o comando para a partição dona e devolve a resposta dela. Se o pedido nem saiu, responde ocupado (o cliente
+#pode repetir); se saiu e a resposta não veio, não dá para saber se executou: erro (com chave de idempotência, repetir
+#é seguro).
+def repassar_operacao(dona, operacao, argumentos, num_conta_logada, chave):
+    comandos_repassados.incrementar()
+    try:
+        status, dados, estado_retorno = pares.chamar(dona, "OPERACAO", operacao, argumentos, num_conta_logada, chave)
+    except ParticaoIndisponivel as e:
+        print(f"[PARTICOES] Partição {dona} indisponível para {operacao}: {e}")
+        return (ST_OCUPADO, {}, ("NO_CHANGE", None, None))
+    except Exception as e:
+        print(f"[PARTICOES] {operacao} repassado para a partição {dona} sem resposta: {e}")
+        return (ST_ERRO, {"erro": f"partição {dona}: {e}"}, ("NO_CHANGE", None, None))
+    if "alertas" in dados:
+        dados["alertas"] = [(conta, tuple(alerta)) for conta, alerta in dados["alertas"]]
+    return (status, dados, tuple(estado_retorno))
+
+#OPERACAO pedida por outra partição: executa aqui e responde com a operação já no disco
+def executar_repassada(operacao, argumentos, num_conta_logada, chave):
+    resultado = executar_aqui(operacao, argumentos, num_conta_logada, chave)
+    diario.confirmar()
+    return resultado
+
+#ALERTAS de outra partição: entrega os das contas logadas aqui
+def entregar_repassadas(notificacoes):
+    entregar_notificacoes([(conta, tuple(alerta)) for conta, alerta in notificacoes])
+
+#Métodos que as outras partições chamam no socket desta
+servidor_particao = ServidorParticao(ARQUIVO_SOCKET, {
+    "OPERACAO": (executar_repassada, executor_repassados),
+    "PREPARAR": (conferir_destinos, executor_particoes),
+    "CREDITAR": (creditar_distribuida, executor_particoes),
+    "ALERTAS": (entregar_repassadas, executor_particoes),
+    "REVOGAR": (sessoes.revogar, executor_particoes),
+    "RENOVAR": (sessoes.renovar_conta, executor_particoes),
+    "SESSAO_ATIVA": (lambda num_conta: sessao_ativa_aqui(num_conta), executor_particoes)})
+
+#Este processo passa a ser a partição `particao` de `particoes` - chamar antes de iniciar()
+def configurar_particoes(particao, particoes):
+    global PARTICAO, PARTICOES, pares
+    PARTICAO, PARTICOES = particao, particoes
+    contas.particao, contas.particoes = particao, particoes
+    sessoes.prefixo = f"{particao}."
+    pares = Particoes(particao, particoes)
+
+
+# # Admissão
+#Balde de tokens de uma conexão nova (o da conta fica em limites_contas)
+def novo_balde():
+    return BaldeTokens(TAXA_COMANDOS_CONEXAO, RAJADA_COMANDOS_CONEXAO)
+
+#Antes de executar (ou colocar no pool) um comando da conexão: devolve None se ele foi admitido, e então fim_comando()
+#precisa ser chamado depois da resposta, ou o status da recusa (ST_LIMITE_PEDIDOS/ST_OCUPADO) para responder na hora
+def admitir_comando(balde, num_conta_logada):
+    if not balde.consumir() or (num_conta_logada is not None and not limites_contas.consumir(num_conta_logada)):
+        comandos_limitados.incrementar()
+        return ST_LIMITE_PEDIDOS
+    if not carga.entrar():
+        comandos_descartados.incrementar()
+        return ST_OCUPADO
+    return None
+
+def fim_comando():
+    carga.sair()
+
+#Executa processar(*pedido, num_conta_logada) se a admissão deixar; recusado, devolve recusar(*pedido, status) na hora.
+#Serve para o modo com threads de todos os protocolos (o comando roda na thread da conexão).
+def comando_admitido(processar, recusar, balde, num_conta_logada, *pedido):
+    status = admitir_comando(balde, num_conta_logada)
+    if status is not None:
+        return recusar(*pedido, status)
+    try:
+        return processar(*pedido, num_conta_logada)
+    finally:
+        fim_comando()
+
+#Mesmo para o asyncio: o comando admitido vai para o executor_comandos, e o tempo na fila dele conta na carga
+async def comando_admitido_async(loop, processar, recusar, balde, num_conta_logada, *pedido):
+    status = admitir_comando(balde, num_conta_logada)
+    if status is not None:
+        return recusar(*pedido, status)
+    try:
+        return await loop.run_in_executor(executor_comandos, processar, *pedido, num_conta_logada)
+    finally:
+        fim_comando()
+
+#Histograma de latência de cada comando (do recebimento até a operação estar no diário); nomes desconhecidos
+#ficam todos em "OUTRO" para não criar uma métrica por texto recebido
+def tempo_comando(operacao, protocolo):
+    if operacao not in OPERACOES and operacao != "STATS":
+        operacao = "OUTRO"
+    return metricas.histograma("comando_segundos", "Latência dos comandos, incluindo a gravação no diário",
+                               operacao=operacao, protocolo=protocolo)
+
+# # Sessões
+#Atualiza a sessão depois de um comando: LOGIN registra a fila de saída da conexão para receber alertas, LOGOUT tira.
+#Uma conta fica logada em uma conexão só: se outra conexão deste processo já está na conta, o LOGIN é recusado - a
+#conferência e o registro acontecem juntos sob conexoes_lock, então de dois LOGIN ao mesmo tempo só um entra (as
+#outras partições já foram perguntadas no executar_operacao). RETOMAR não é recusado: quem tem o token é o cliente do
+#LOGIN voltando numa conexão nova, e a antiga (que pode ainda não ter sido percebida como caída) deixa de receber
+#os alertas.
+#Devolve (conta logada, nome) novos, ou None se o LOGIN foi recusado - a conexão continua como estava e o atendimento
+#responde ST_SESSAO_ATIVA.
+def atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila):
+    if novo_estado[0] in ("LOGIN", "RETOMAR"):
+        num_conta = novo_estado[1]
+        with conexoes_lock:
+            atual = conexoes_ativas.get(num_conta)
+            if novo_estado[0] == "LOGIN" and atual is not None and atual is not fila:
+                print(f"[LOGIN] Conta {num_conta} já está logada em outra conexão.")
+                return None
+            if num_conta_logada in conexoes_ativas and conexoes_ativas[num_conta_logada] is fila:
+                del conexoes_ativas[num_conta_logada]
+            conexoes_ativas[num_conta] = fila
+        return num_conta, novo_estado[2]
+    if novo_estado[0] == "LOGOUT":
+        with conexoes_lock:
+            if num_conta_logada in conexoes_ativas and conexoes_ativas[num_conta_logada] is fila:
+                del conexoes_ativas[num_conta_logada]
+        return None, None
+    return num_conta_logada, nome_logado
+
+#Conta já logada em alguma conexão (de qualquer protocolo)? No modo particionado a conexão pode estar em qualquer
+#partição, então as outras também são perguntadas; uma que não responde não impede o login
+def sessao_ativa(num_conta):
+    if sessao_ativa_aqui(num_conta):
+        return True
+    for particao in range(PARTICOES):
+        if particao == PARTICAO:
+            continue
+        try:
+            if pares.chamar(particao, "SESSAO_ATIVA", num_conta):
+                return True
+        except Exception as e:
+            print(f"[PARTICOES] Partição {particao} não respondeu se a conta {num_conta} está logada: {e}")
+    return False
+
+#Só as conexões deste processo (SESSAO_ATIVA pedido por outra partição)
+def sessao_ativa_aqui(num_conta):
+    with conexoes_lock:
+        return num_conta in conexoes_ativas
+
+#Tira a conexão de conexoes_ativas ao desconectar (se outra sessão não tiver entrado na mesma conta depois).
+#Os tokens da conta continuam valendo por VALIDADE_SESSAO a partir daqui, para o cliente voltar com RETOMAR.
+def remover_sessao(num_conta_logada, nome_logado, fila):
+    fila.fechar()
+    if num_conta_logada:
+        dona = em_outra_particao(num_conta_logada)
+        if dona is None:
+            sessoes.renovar_conta(num_conta_logada)
+        else:
+            pares.avisar(dona, "RENOVAR", num_conta_logada)
+        with conexoes_lock:
+            if num_conta_logada in conexoes_ativas and conexoes_ativas[num_conta_logada] is fila:
+                del conexoes_ativas[num_conta_logada]
+                print(f"[LIMPEZA] Conexão ativa de {nome_logado} (C:{num_conta_logada}) removida.")
+
+#Invalida um token de sessão na partição que o criou
+def revogar_sessao(token):
+    dona = particao_do_token(token, PARTICOES) if PARTICOES > 1 else None
+    if dona is None or dona == PARTICAO:
+        sessoes.revogar(token)
+    else:
+        pares.avisar(dona, "REVOGAR", token)
+
+# # Ciclo de vida
+# Grava o que ainda está na fila do log e mostra os contadores
+def fechar_registro_log():
+    registro_log.fechar()
+    estatisticas = registro_log.estatisticas()
+    print(f"[LOGS] Log de transações: {estatisticas['gravados']} linhas gravadas, {estatisticas['descartados']} descartadas, {estatisticas['atrasados']} atrasadas, {estatisticas['erros_gravacao']} lotes com erro de escrita, {estatisticas['rotacoes']} segmentos rotacionados.")
+
+# Sobe o motor: pastas, contas (checkpoint + diário), thread do log e checkpoints em segundo plano; no modo
+# particionado também o socket das outras partições e a thread que reenvia os créditos pendentes
+def iniciar():
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    os.makedirs(PASTA_LOGS, exist_ok=True)
+    carregar_contas()
+    registro_log.iniciar()
+    checkpoints.iniciar()
+    ociosas.iniciar()
+    if PARTICOES > 1:
+        servidor_particao.iniciar()
+        threading.Thread(target=reenviar_pendentes, name="pendentes", daemon=True).start()
+        print(f"[PARTICOES] Partição {PARTICAO} de {PARTICOES} pronta ({len(contas)} contas).")
+
+# Grava o último checkpoint e fecha o diário e o log
+def encerrar():
+    if PARTICOES > 1:
+        parar_pendentes.set()
+        servidor_particao.parar()
+        executor_repassados.shutdown(wait=True)
+        executor_particoes.shutdown(wait=True)
+        pares.fechar()
+        print(f"[PARTICOES] {len(distribuidas)} transferências entre partições com crédito a confirmar na próxima subida.")
+    ociosas.parar()
+    print(f"[OCIOSO] {ociosas.recuperadas} conexões paradas encerradas pelo servidor.")
+    checkpoints.parar()
+    salvar_contas()
+    diario.fechar()
+    fechar_registro_log()
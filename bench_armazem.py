@@ -0,0 +1,121 @@
+# bench_armazem.py / Compara o armazenamento antigo (dict por conta + saldo float + trava por conta) com o ArmazemContas:
+# memória por milhão de contas e tempo de SALDO/TRANSFERIR. Uso: python3 bench_armazem.py [quantidade_de_contas]
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from armazem import ArmazemContas, formatar_centavos
+
+OPERACOES = 200000
+
+#Como o servidor guardava as contas antes do armazem.py
+class ContasDict:
+    def __init__(self):
+        self.contas = {}
+        self.cpf_para_conta = {}
+        self.travas_contas = {}
+
+    def adicionar(self, nome, cpf, senha):
+        num = str(len(self.contas) + 100)
+        self.travas_contas[num] = threading.Lock()
+        self.contas[num] = {"nome": nome, "cpf": cpf, "senha": senha, "saldo": 0.0}
+        self.cpf_para_conta[cpf] = num
+        return num
+
+    @contextmanager
+    def travar(self, *nums):
+        travas = [self.travas_contas[num] for num in sorted(set(nums), key=int)]
+        for trava in travas:
+            trava.acquire()
+        try:
+            yield
+        finally:
+            for trava in reversed(travas):
+                trava.release()
+
+    def saldo(self, num):
+        with self.travar(num):
+            saldo = self.contas[num]["saldo"]
+        return f"[SALDO] Saldo: R$ {saldo:.2f}"
+
+    def transferir(self, origem, destino, valor):
+        valor = float(valor)
+        with self.travar(origem, destino):
+            if self.contas[origem]["saldo"] < valor:
+                return False
+            self.contas[origem]["saldo"] -= valor
+            self.contas[destino]["saldo"] += valor
+        return True
+
+#As mesmas operações feitas como o servidor.py faz agora
+class ContasArmazem:
+    def __init__(self):
+        self.contas = ArmazemContas()
+
+    def adicionar(self, nome, cpf, senha):
+        return self.contas.adicionar(nome, cpf, senha)
+
+    def saldo(self, num):
+        with self.contas.travar(num):
+            saldo = self.contas.saldo(num)
+        return f"[SALDO] Saldo: R$ {formatar_centavos(saldo)}"
+
+    def transferir(self, origem, destino, valor):
+        valor = round(float(valor) * 100)
+        with self.contas.travar(origem, destino):
+            return self.contas.mover(origem, destino, valor)
+
+def medir_memoria(classe, quantidade):
+    # Textos criados antes de medir: os dois armazenamentos guardam os mesmos objetos
+    dados = [(f"Cliente {i}", f"{i:011d}", f"senha{i}") for i in range(quantidade)]
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    armazem = classe()
+    for nome, cpf, senha in dados:
+        armazem.adicionar(nome, cpf, senha)
+    usado = tracemalloc.get_traced_memory()[0] - inicio
+    tracemalloc.stop()
+    return armazem, usado
+
+def medir_operacoes(armazem, quantidade):
+    rng = random.Random(42)
+    numeros = [str(100 + rng.randrange(quantidade)) for _ in range(OPERACOES)]
+    # Saldo inicial igual em todas as contas para as transferências não falharem
+    if isinstance(armazem, ContasDict):
+        for conta in armazem.contas.values():
+            conta["saldo"] = 1000.0
+    else:
+        for linha in range(len(armazem.contas)):
+            armazem.contas.saldos[linha] = 100000
+
+    inicio = time.perf_counter()
+    for num in numeros:
+        armazem.saldo(num)
+    tempo_saldo = (time.perf_counter() - inicio) / OPERACOES
+
+    inicio = time.perf_counter()
+    for i in range(OPERACOES - 1):
+        if numeros[i] != numeros[i + 1]:
+            armazem.transferir(numeros[i], numeros[i + 1], "0.10")
+    tempo_transferir = (time.perf_counter() - inicio) / OPERACOES
+    return tempo_saldo, tempo_transferir
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f"{quantidade} contas, {OPERACOES} operações de cada tipo\n")
+    resultados = {}
+    for nome, classe in (("dict", ContasDict), ("ArmazemContas", ContasArmazem)):
+        armazem, memoria = medir_memoria(classe, quantidade)
+        tempo_saldo, tempo_transferir = medir_operacoes(armazem, quantidade)
+        resultados[nome] = memoria
+        print(f"{nome:>14}: {memoria / quantidade:7.1f} bytes/conta ({memoria * 1000000 / quantidade / 2**20:7.1f} MiB por milhão) | "
+              f"SALDO {tempo_saldo * 1e6:5.2f} us | TRANSFERIR {tempo_transferir * 1e6:5.2f} us")
+        del armazem
+    economia = resultados["dict"] - resultados["ArmazemContas"]
+    print(f"\nEconomia: {economia * 1000000 / quantidade / 2**20:.1f} MiB por milhão de contas "
+          f"({economia / resultados['dict'] * 100:.0f}% do armazenamento antigo, sem contar os textos)")
+
+if __name__ == "__main__":
+    main()
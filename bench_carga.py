@@ -0,0 +1,426 @@
+# bench_carga.py / Gerador de carga para o servidor.py e o servidor-telnet.py: N clientes simultâneos fazendo uma mistura
+# de operações, com vazão e latência (p50/p99/p999) por operação e, no fim, a conferência de que nenhum centavo
+# apareceu ou sumiu (soma dos saldos = depósitos iniciais + depósitos - saques).
+#
+# Exemplos:
+#   python3 bench_carga.py --porta 5000 --clientes 50 --operacoes 2000
+#   python3 bench_carga.py --iniciar servidor.py --args-servidor "--asyncio" --clientes 200
+#   python3 bench_carga.py --telnet --iniciar servidor-telnet.py --mix "SALDO=50,DEPOSITAR=25,TRANSFERIR=25"
+#   python3 bench_carga.py --iniciar servidor.py --escala 1,2,4 --clientes 64   (vazão com 1, 2 e 4 partições)
+import argparse
+import os
+import random
+import re
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from cliente import ConexaoBanco
+
+OPERACOES = ("CRIAR", "LOGIN", "SALDO", "DEPOSITAR", "SACAR", "TRANSFERIR")
+MIX_PADRAO = "SALDO=40,DEPOSITAR=20,SACAR=15,TRANSFERIR=25"
+SALDO_INICIAL = 1000.00
+SENHA = "bench"
+
+RE_CONTA_CRIADA = re.compile(r"Conta (\d+) criada")
+RE_SALDO = re.compile(r"Saldo: R\$ (-?[\d.]+)")
+RE_DEPOSITO_OK = re.compile(r"Depósito de R\$")
+RE_SAQUE_OK = re.compile(r"Saque de R\$")
+MARCA_ALERTA_TELNET = "[IFBANK] Você recebeu"
+
+# Cliente do servidor.py: usa o mesmo caminho de pedido/resposta do cliente.py (ConexaoBanco)
+class ClienteTexto:
+    def __init__(self, host, porta):
+        self.conexao = ConexaoBanco(socket.create_connection((host, porta)))
+        self.cpf = None
+        self.logado = False
+
+    def criar(self, nome, cpf, senha):
+        return self.conexao.enviar_comando_e_receber(f"CRIAR|{nome}|{cpf}|{senha}")
+
+    def login(self, cpf, senha):
+        self.cpf = cpf
+        resposta = self.conexao.enviar_comando_e_receber(f"LOGIN|{cpf}|{senha}")
+        self.logado = resposta.startswith("[LOGIN]|")
+        return resposta
+
+    def saldo(self):
+        return self.conexao.enviar_comando_e_receber("SALDO")
+
+    def depositar(self, valor):
+        return self.conexao.enviar_comando_e_receber(f"DEPOSITAR|{valor:.2f}")
+
+    def sacar(self, valor, senha):
+        return self.conexao.enviar_comando_e_receber(f"SACAR|{valor:.2f}|{senha}")
+
+    def transferir(self, conta, valor, senha):
+        return self.conexao.enviar_comando_e_receber(f"TRANSFERIR|{conta}|{valor:.2f}|{senha}")
+
+    def fechar(self):
+        self.conexao.sock.close()
+
+# Cliente do servidor-telnet.py: navega pelos menus como uma pessoa no telnet faria. Cada entrada só é enviada
+# depois que o prompt correspondente chegou, para medir a latência de cada passo do menu.
+class ClienteTelnet:
+    FIM_MENU_PRINCIPAL = "3. Sair do Aplicativo "
+    FIM_MENU_LOGADO = "6. Sair da Conta "
+
+    def __init__(self, host, porta):
+        self.sock = socket.create_connection((host, porta))
+        self.buffer = ""
+        self.cpf = None
+        self.logado = False
+        self._esperar(self.FIM_MENU_PRINCIPAL)
+
+    #Lê até a marca aparecer e devolve o que veio antes dela; o que chegou depois fica para a próxima leitura
+    def _esperar(self, marca):
+        while marca not in self.buffer:
+            dados = self.sock.recv(65536)
+            if not dados:
+                raise ConnectionResetError("servidor fechou a conexão")
+            self.buffer += dados.decode('utf-8', errors='replace')
+        texto, self.buffer = self.buffer.split(marca, 1)
+        return texto
+
+    def _digitar(self, texto, marca):
+        self.sock.sendall((texto + "\r\n").encode('utf-8'))
+        return self._esperar(marca)
+
+    #A resposta é a última linha entre colchetes antes do próximo menu; alertas de transferência podem chegar
+    #antes ou depois dela e ficam de fora
+    @staticmethod
+    def _resposta(texto):
+        linhas = [linha.strip() for linha in texto.replace("\r", "").split("\n") if linha.strip().startswith("[")]
+        linhas = [linha for linha in linhas if MARCA_ALERTA_TELNET not in linha]
+        return linhas[-1] if linhas else texto.strip()
+
+    def _sair_da_conta(self):
+        if self.logado:
+            self._digitar("6", self.FIM_MENU_PRINCIPAL)
+            self.logado = False
+
+    def criar(self, nome, cpf, senha):
+        estava_logado = self.logado
+        self._sair_da_conta()
+        self._digitar("2", "nome completo: ")
+        self._digitar(nome, "CPF: ")
+        self._digitar(cpf, "Crie uma senha: ")
+        self._digitar(senha, "Confirme sua senha: ")
+        resposta = self._resposta(self._digitar(senha, self.FIM_MENU_PRINCIPAL))
+        if estava_logado:
+            self.login(self.cpf, SENHA)
+        return resposta
+
+    def login(self, cpf, senha):
+        self._sair_da_conta()
+        self.cpf = cpf
+        self._digitar("1", "CPF: ")
+        self._digitar(cpf, "senha: ")
+        self.sock.sendall((senha + "\r\n").encode('utf-8'))
+        # Depois do login vem o menu da conta; se falhar, volta o menu principal
+        while self.FIM_MENU_LOGADO not in self.buffer and self.FIM_MENU_PRINCIPAL not in self.buffer:
+            dados = self.sock.recv(65536)
+            if not dados:
+                raise ConnectionResetError("servidor fechou a conexão")
+            self.buffer += dados.decode('utf-8', errors='replace')
+        self.logado = self.FIM_MENU_LOGADO in self.buffer
+        return self._resposta(self._esperar(self.FIM_MENU_LOGADO if self.logado else self.FIM_MENU_PRINCIPAL))
+
+    def saldo(self):
+        return self._resposta(self._digitar("1", self.FIM_MENU_LOGADO))
+
+    def depositar(self, valor):
+        self._digitar("2", "depositar: R$ ")
+        return self._resposta(self._digitar(f"{valor:.2f}", self.FIM_MENU_LOGADO))
+
+    def sacar(self, valor, senha):
+        self._digitar("3", "sacar: R$ ")
+        self._digitar(f"{valor:.2f}", "confirmar: ")
+        return self._resposta(self._digitar(senha, self.FIM_MENU_LOGADO))
+
+    def transferir(self, conta, valor, senha):
+        self._digitar("4", "destino: ")
+        self._digitar(str(conta), "transferir: R$ ")
+        self._digitar(f"{valor:.2f}", "confirmar: ")
+        return self._resposta(self._digitar(senha, self.FIM_MENU_LOGADO))
+
+    def fechar(self):
+        self.sock.close()
+
+def ler_mix(texto):
+    mix = {}
+    for parte in texto.split(","):
+        operacao, _, peso = parte.partition("=")
+        operacao = operacao.strip().upper()
+        if operacao not in OPERACOES:
+            raise ValueError(f"operação desconhecida no mix: {operacao}")
+        mix[operacao] = float(peso or 1)
+    return mix
+
+#Percentil pelo posto mais próximo, com as amostras já ordenadas
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    indice = min(len(ordenadas) - 1, max(0, int(round(p / 100 * len(ordenadas) + 0.5)) - 1))
+    return ordenadas[indice]
+
+#O servidor-telnet.py ainda aceita só CPF de 3 números (ver operacao CRIAR), o servidor.py aceita qualquer quantidade
+def cpf_bench(rodada, i, digitos):
+    if digitos >= 11:
+        return f"{rodada:05d}{i:0{digitos - 5}d}"
+    return f"{i % 10 ** digitos:0{digitos}d}"
+
+class Carga:
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.mix = ler_mix(opcoes.mix)
+        self.rodada = random.randrange(100000)
+        self.classe = ClienteTelnet if opcoes.telnet else ClienteTexto
+        self.digitos_cpf = opcoes.digitos_cpf or (3 if opcoes.telnet else 11)
+        self.contas = []
+        self.contas_lock = threading.Lock()
+        self.latencias = {operacao: [] for operacao in OPERACOES}
+        self.erros = {}
+        self.depositado = 0  # centavos, inclui o saldo inicial
+        self.sacado = 0
+        self.resultados_lock = threading.Lock()
+        self.pronto = threading.Barrier(opcoes.clientes + 1)
+        self.clientes_prontos = []
+        self.vazao = 0 # operações por segundo no total, depois de executar()
+
+    def _erro(self, operacao, e):
+        with self.resultados_lock:
+            self.erros[operacao] = self.erros.get(operacao, 0) + 1
+        if self.opcoes.verboso:
+            print(f"[ERRO] {operacao}: {e}")
+
+    def _medir(self, latencias, operacao, funcao, *argumentos):
+        inicio = time.perf_counter()
+        resposta = funcao(*argumentos)
+        latencias[operacao].append(time.perf_counter() - inicio)
+        return resposta
+
+    #Cria e entra na conta do cliente, deposita o saldo inicial e espera todos ficarem prontos
+    def _preparar(self, i, latencias):
+        cliente = self.classe(self.opcoes.host, self.opcoes.porta)
+        cpf = cpf_bench(self.rodada, i, self.digitos_cpf)
+        resposta = self._medir(latencias, "CRIAR", cliente.criar, f"Bench {i}", cpf, SENHA)
+        conta = RE_CONTA_CRIADA.search(resposta)
+        if not conta:
+            raise RuntimeError(f"falha ao criar conta: {resposta}")
+        self._medir(latencias, "LOGIN", cliente.login, cpf, SENHA)
+        if not cliente.logado:
+            raise RuntimeError("falha ao entrar na conta")
+        resposta = cliente.depositar(SALDO_INICIAL)
+        if not RE_DEPOSITO_OK.search(resposta):
+            raise RuntimeError(f"falha no depósito inicial: {resposta}")
+        with self.contas_lock:
+            self.contas.append(conta.group(1))
+        return cliente, conta.group(1), round(SALDO_INICIAL * 100)
+
+    def _cliente(self, i):
+        rng = random.Random(self.rodada * 1000003 + i)
+        latencias = {operacao: [] for operacao in OPERACOES}
+        depositado = sacado = 0
+        extras = 0
+        try:
+            cliente, minha_conta, depositado = self._preparar(i, latencias)
+        except Exception as e:
+            self._erro("PREPARAR", e)
+            self.pronto.abort()
+            return
+        try:
+            self.pronto.wait()
+        except threading.BrokenBarrierError:
+            cliente.fechar()
+            return
+
+        operacoes, pesos = list(self.mix), list(self.mix.values())
+        for _ in range(self.opcoes.operacoes):
+            operacao = rng.choices(operacoes, pesos)[0]
+            valor = rng.randint(1, 5000) / 100
+            try:
+                if operacao == "SALDO":
+                    self._medir(latencias, operacao, cliente.saldo)
+                elif operacao == "DEPOSITAR":
+                    if RE_DEPOSITO_OK.search(self._medir(latencias, operacao, cliente.depositar, valor)):
+                        depositado += round(valor * 100)
+                elif operacao == "SACAR":
+                    if RE_SAQUE_OK.search(self._medir(latencias, operacao, cliente.sacar, valor, SENHA)):
+                        sacado += round(valor * 100)
+                elif operacao == "TRANSFERIR":
+                    destino = rng.choice(self.contas)
+                    if destino == minha_conta and len(self.contas) > 1:
+                        continue
+                    self._medir(latencias, operacao, cliente.transferir, destino, valor, SENHA)
+                elif operacao == "LOGIN":
+                    self._medir(latencias, operacao, cliente.login, cliente.cpf, SENHA)
+                elif operacao == "CRIAR":
+                    # Contas extras começam zeradas e não recebem transferências, então não mudam a conferência
+                    extras += 1
+                    cpf = cpf_bench(self.rodada, 100000 + i * self.opcoes.operacoes + extras, self.digitos_cpf)
+                    self._medir(latencias, operacao, cliente.criar, f"Extra {i}", cpf, SENHA)
+            except Exception as e:
+                self._erro(operacao, e)
+                break
+
+        with self.resultados_lock:
+            for operacao, amostras in latencias.items():
+                self.latencias[operacao].extend(amostras)
+            self.depositado += depositado
+            self.sacado += sacado
+        self.clientes_prontos.append(cliente)
+
+    #Soma os saldos de todas as contas do bench (cada cliente consulta a sua)
+    def _conferir(self):
+        total = 0
+        for cliente in self.clientes_prontos:
+            try:
+                resposta = cliente.saldo()
+                total += round(float(RE_SALDO.search(resposta).group(1)) * 100)
+            except Exception as e:
+                print(f"[ERRO] Não foi possível consultar um saldo: {e}")
+                return None
+            finally:
+                cliente.fechar()
+        return total
+
+    def executar(self):
+        threads = [threading.Thread(target=self._cliente, args=(i,), daemon=True) for i in range(self.opcoes.clientes)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.pronto.wait()
+        except threading.BrokenBarrierError:
+            print("[FALHA] Algum cliente não conseguiu se preparar:", self.erros)
+            return 1
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        self._relatorio(duracao)
+        return self._relatorio_conservacao()
+
+    def _relatorio(self, duracao):
+        medidas = {operacao: sorted(amostras) for operacao, amostras in self.latencias.items() if amostras}
+        total = sum(len(amostras) for operacao, amostras in medidas.items())
+        print(f"\n{self.opcoes.clientes} clientes, {duracao:.2f} s de carga ({'telnet' if self.opcoes.telnet else 'texto'})")
+        print(f"{'operação':<11}{'qtd':>9}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p999 ms':>10}{'máx ms':>10}")
+        for operacao in OPERACOES:
+            if operacao not in medidas:
+                continue
+            amostras = medidas[operacao]
+            print(f"{operacao:<11}{len(amostras):>9}{len(amostras) / duracao:>10.0f}"
+                  f"{percentil(amostras, 50) * 1000:>10.2f}{percentil(amostras, 99) * 1000:>10.2f}"
+                  f"{percentil(amostras, 99.9) * 1000:>10.2f}{amostras[-1] * 1000:>10.2f}")
+        print(f"{'total':<11}{total:>9}{total / duracao:>10.0f}  (CRIAR/LOGIN iniciais contam na tabela, não no tempo)")
+        self.vazao = total / duracao
+        if self.erros:
+            print(f"[AVISO] Erros: {self.erros}")
+
+    def _relatorio_conservacao(self):
+        esperado = self.depositado - self.sacado
+        total = self._conferir()
+        if total is None:
+            return 1
+        if total == esperado:
+            print(f"[OK] Conservação: soma dos saldos R$ {total / 100:.2f} = depósitos - saques")
+            return 0
+        print(f"[FALHA] Conservação: soma dos saldos R$ {total / 100:.2f}, esperado R$ {esperado / 100:.2f} "
+              f"(diferença de {total - esperado} centavos)")
+        return 1
+
+#Quantidade de partições pedida nos argumentos do servidor (--particoes N)
+def particoes_servidor(argumentos):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--particoes", type=int, default=1)
+    return parser.parse_known_args(argumentos)[0].particoes
+
+#Sobe o servidor numa pasta temporária (dados e logs próprios) e espera a porta abrir (com partições, também o socket
+#de cada uma: antes disso um comando repassado para ela voltaria "ocupado")
+def iniciar_servidor(script, host, porta, argumentos):
+    pasta = tempfile.mkdtemp(prefix="bench_")
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    saida = open(os.path.join(pasta, "servidor.out"), "w")
+    processo = subprocess.Popen([sys.executable, caminho, *argumentos], cwd=pasta, stdin=subprocess.PIPE,
+                                stdout=saida, stderr=subprocess.STDOUT)
+    processo.stdin.write(f"{host}\n{porta}\n".encode('utf-8'))
+    processo.stdin.flush()
+    sockets_particoes = [os.path.join(pasta, "particoes", str(i), "rpc.sock") for i in range(particoes_servidor(argumentos))]
+    for _ in range(100):
+        try:
+            socket.create_connection((host, porta)).close()
+            if len(sockets_particoes) > 1 and not all(os.path.exists(caminho) for caminho in sockets_particoes):
+                raise OSError("partições ainda subindo")
+            print(f"[INFO] {script} iniciado em {host}:{porta} (pasta {pasta})")
+            return processo
+        except OSError:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f"{script} não abriu a porta {porta}; veja {saida.name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga do IFBank")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=5000)
+    parser.add_argument("--clientes", type=int, default=20, help="clientes simultâneos (uma conexão cada)")
+    parser.add_argument("--operacoes", type=int, default=500, help="operações por cliente")
+    parser.add_argument("--mix", default=MIX_PADRAO, help=f"pesos das operações (padrão {MIX_PADRAO})")
+    parser.add_argument("--telnet", action="store_true", help="usa os menus do servidor-telnet.py")
+    parser.add_argument("--iniciar", metavar="SCRIPT", help="sobe o servidor (servidor.py ou servidor-telnet.py) numa pasta temporária")
+    parser.add_argument("--args-servidor", default="", help="argumentos extras para o servidor iniciado com --iniciar")
+    parser.add_argument("--digitos-cpf", type=int, help="tamanho do CPF das contas do bench (padrão 3 no telnet, 11 no texto)")
+    parser.add_argument("--escala", metavar="N,N,...", help="com --iniciar: repete a carga com o servidor em cada quantidade de partições e compara a vazão")
+    parser.add_argument("--verboso", action="store_true", help="mostra cada erro")
+    opcoes = parser.parse_args()
+    if opcoes.escala:
+        if not opcoes.iniciar:
+            parser.error("--escala precisa de --iniciar")
+        sys.exit(medir_escala(opcoes))
+
+    processo = None
+    if opcoes.iniciar:
+        processo = iniciar_servidor(opcoes.iniciar, opcoes.host, opcoes.porta, shlex.split(opcoes.args_servidor))
+    try:
+        codigo = Carga(opcoes).executar()
+    finally:
+        if processo:
+            parar_servidor(processo)
+    sys.exit(codigo)
+
+def parar_servidor(processo):
+    processo.send_signal(signal.SIGINT)
+    try:
+        processo.wait(30)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+
+#Mesma carga com 1, 2, ... partições (um servidor novo a cada rodada, cada um numa porta, para não esperar o sistema
+#liberar a anterior). A vazão só cresce com as partições se houver núcleos livres para elas e para os clientes do bench.
+def medir_escala(opcoes):
+    resultados = []
+    codigo = 0
+    for rodada, particoes in enumerate(int(n) for n in opcoes.escala.split(",")):
+        print(f"\n[ESCALA] {particoes} partição(ões)")
+        if rodada:
+            opcoes.porta += 1
+        argumentos = shlex.split(opcoes.args_servidor) + ["--particoes", str(particoes)]
+        processo = iniciar_servidor(opcoes.iniciar, opcoes.host, opcoes.porta, argumentos)
+        try:
+            carga = Carga(opcoes)
+            codigo |= carga.executar()
+        finally:
+            parar_servidor(processo)
+        resultados.append((particoes, carga.vazao))
+    print(f"\n[ESCALA] {os.cpu_count()} núcleos nesta máquina")
+    print(f"{'partições':<11}{'ops/s':>10}{'x 1ª':>8}")
+    for particoes, vazao in resultados:
+        print(f"{particoes:<11}{vazao:>10.0f}{vazao / resultados[0][1] if resultados[0][1] else 0:>8.2f}")
+    return codigo
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,148 @@
 # cliente.py / Arquivo do cliente, onde toda a lógica dos menus é feita e a comunicação com o servidor em socket iniciada - é iniciado no local onde o cliente está
+import random
 import socket
 import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, TimeoutError as TempoEsgotado
 # Para ocultar a senha ao digitá-la - pode ser removido depois
 import getpass
+from armazem import para_centavos
 
 client_socket = None
+conexao = None
+servidor = None     # (host, porta), para reconectar
+token_sessao = None # devolvido pelo LOGIN: volta para a conta numa conexão nova (RETOMAR) sem mandar a senha
+
+# Operações que movem dinheiro: quantas vezes repetir (com a mesma chave) e quanto esperar pela resposta (segundos)
+TENTATIVAS_REPETICAO = 5
+ESPERA_REPETICAO = 0.5
+TEMPO_RESPOSTA = 5
+# Respostas de comando recusado sem executar (servidor ocupado ou limite de comandos): o cliente espera e repete
+RECUSAS_TEMPORARIAS = ("[OCUPADO]", "[LIMITE]")
+
+# Linhas que o servidor manda sem ser resposta de um comando
+AVISOS_SERVIDOR = ("[ALERTA]", "[OCIOSO]")
+
+# Conexão com o servidor usando o protocolo em linhas: cada comando e cada resposta terminam em "\n".
+# Uma thread fica sempre lendo o socket: alertas ("[ALERTA] ...") e o aviso de conexão encerrada por inatividade
+# ("[OCIOSO] ...") vão direto para ao_alertar (ou ficam em self.alertas se ninguém for avisado) e as outras linhas são
+# respostas, entregues na ordem dos comandos (o servidor responde sempre na ordem) para o Future de quem mandou cada comando.
+class ConexaoBanco:
+    def __init__(self, sock, ao_alertar=None):
+        self.sock = sock
+        self.ao_alertar = ao_alertar
+        self.alertas = []
+        self.fechada = False
+        self._pendentes = deque()             # Futures esperando resposta, na ordem em que os comandos foram enviados
+        self._fila_lock = threading.Lock()    # protege _pendentes (a thread de leitura só usa esta)
+        self._envio_lock = threading.Lock()   # envio + registro do Future juntos, para a ordem bater com a das respostas
+        self._alertas_cond = threading.Condition()
+        self._leitor = threading.Thread(target=self._receber_sempre, name="leitor-ifbank", daemon=True)
+        self._leitor.start()
+
+    def _receber_sempre(self):
+        buffer = b""
+        try:
+            while True:
+                dados = self.sock.recv(65536)
+                if not dados:
+                    break
+                buffer += dados
+                *linhas, buffer = buffer.split(b"\n")
+                for linha in linhas:
+                    self._entregar(linha.decode('utf-8', errors='replace').rstrip("\r"))
+        except OSError:
+            pass
+        finally:
+            self._encerrar()
+
+    def _entregar(self, linha):
+        if linha.startswith(AVISOS_SERVIDOR):
+            if self.ao_alertar:
+                self.ao_alertar(linha)
+            else:
+                with self._alertas_cond:
+                    self.alertas.append(linha)
+                    self._alertas_cond.notify_all()
+            return
+        with self._fila_lock:
+            futuro = self._pendentes.popleft() if self._pendentes else None
+        if futuro is not None:
+            futuro.set_result(linha)
+
+    # Conexão caiu: quem ainda espera resposta recebe ConnectionResetError
+    def _encerrar(self):
+        with self._fila_lock:
+            self.fechada = True
+            pendentes, self._pendentes = list(self._pendentes), deque()
+        for futuro in pendentes:
+            futuro.set_exception(ConnectionResetError("servidor fechou a conexão"))
+        with self._alertas_cond:
+            self._alertas_cond.notify_all()
+
+    # Manda os comandos e devolve um Future por comando, sem esperar as respostas
+    def enviar(self, *comandos):
+        futuros = [Future() for _ in comandos]
+        with self._envio_lock:
+            with self._fila_lock:
+                if self.fechada:
+                    raise ConnectionResetError("servidor fechou a conexão")
+                self._pendentes.extend(futuros)
+            self.sock.sendall("".join(comando + "\n" for comando in comandos).encode('utf-8'))
+        return futuros
+
+    # Com chave, o comando vai como ID=chave|comando (idempotência: repetir com a mesma chave não executa de novo).
+    # espera: segundos até desistir da resposta (TempoEsgotado, o TimeoutError do concurrent.futures - só a partir do
+    # Python 3.11 ele também é um OSError); depois disso a conexão não serve mais, porque a resposta atrasada chegaria
+    # no lugar da próxima.
+    def enviar_comando_e_receber(self, comando, chave=None, espera=None):
+        if chave is not None:
+            comando = f"ID={chave}|{comando}"
+        return self.enviar(comando)[0].result(espera)
+
+    # Pipelining: manda vários comandos sem esperar cada resposta e devolve as respostas na mesma ordem.
+    # No máximo "janela" comandos ficam sem resposta, para os buffers dos sockets nunca encherem dos dois lados.
+    def enviar_lote(self, comandos, janela=128):
+        futuros = deque()
+        respostas = []
+        for inicio in range(0, len(comandos), janela // 2):
+            futuros.extend(self.enviar(*comandos[inicio:inicio + janela // 2]))
+            while len(futuros) > janela // 2:
+                respostas.append(futuros.popleft().result())
+        respostas.extend(futuro.result() for futuro in futuros)
+        return respostas
+
+    # Devolve os alertas guardados (só quando não há ao_alertar), esperando no máximo "espera" segundos pelo primeiro
+    def coletar_alertas(self, espera=0.1):
+        with self._alertas_cond:
+            if not self.alertas and not self.fechada:
+                self._alertas_cond.wait(espera)
+            if not self.alertas and self.fechada:
+                raise ConnectionResetError("servidor fechou a conexão")
+            alertas, self.alertas = self.alertas, []
+        return alertas
+
+    def fechar(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
 
 # Função para conectar ao servidor
 def conectar_servidor():
-    global client_socket
+    global client_socket, conexao, servidor
     host = input("Digite o endereco IP do servidor: ")
     port = int(input("Digite a porta do servidor: "))
 
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         client_socket.connect((host, port))
+        servidor = (host, port)
+        conexao = ConexaoBanco(client_socket, ao_alertar=mostrar_alerta)
         print(f"Conectado ao IFBank em {host}:{port}")
         return True
     except ConnectionRefusedError:
@@ -24,50 +152,81 @@ def conectar_servidor():
         print(f"[ERRO] Ocorreu um erro ao conectar: {e}")
         return False
 
-# Função para enviar comando ao servidor e receber resposta
+# Função para enviar comando ao servidor e receber resposta. Se o servidor já tinha encerrado a conexão (parada tempo
+# demais), o comando ainda não foi enviado: reconecta, volta para a conta com o token e manda nela.
 def enviar_comando_e_receber(comando):
     try:
-        client_socket.settimeout(None)
-        client_socket.sendall(comando.encode('utf-8'))
-        resposta = client_socket.recv(1024).decode('utf-8')
-        return resposta
+        if conexao.fechada:
+            reconectar()
+        return conexao.enviar_comando_e_receber(comando)
     except (ConnectionResetError, BrokenPipeError):
         print("\n[ERRO] Conexão com o servidor perdida.")
         sys.exit()
 
-# Função para verificar notificações do servidor - o alerta só aparece caso seja feito um reflesh na tela do menu
-def verificar_notificacoes():
+# Abre outra conexão com o mesmo servidor e, se havia uma conta logada, retoma a sessão pelo token
+def reconectar():
+    global client_socket, conexao
+    conexao.fechar()
     try:
-        client_socket.settimeout(0.1)
-        notificacao = client_socket.recv(1024).decode('utf-8')
-        
-        if notificacao.startswith("[ALERTA]"):
-            print("\n" + "="*50)
-            print(f" {notificacao} ")
-            print("="*50)
-            print("Digite sua opção: ", end='', flush=True)
-            
-    except socket.timeout:
-        pass
-    except (ConnectionResetError, BrokenPipeError):
-        print("\n[ERRO] Conexão com o servidor perdida.")
-        sys.exit()
-    finally:
+        client_socket = socket.create_connection(servidor, timeout=TEMPO_RESPOSTA)
         client_socket.settimeout(None)
+        conexao = ConexaoBanco(client_socket, ao_alertar=mostrar_alerta)
+        if token_sessao:
+            resposta = conexao.enviar_comando_e_receber(f"RETOMAR|{token_sessao}", espera=TEMPO_RESPOSTA)
+            if not resposta.startswith("[RETOMAR]|"):
+                raise ConnectionError(resposta)
+    except (OSError, TempoEsgotado) as e:
+        print(f"[AVISO] Falha ao reconectar: {e}")
+
+# Operações que movem dinheiro vão com uma chave de idempotência nova. Se a conexão cair ou a resposta demorar mais
+# que TEMPO_RESPOSTA, não dá para saber se o servidor executou: o cliente reconecta e repete com a mesma chave, e o
+# servidor devolve a resposta da primeira vez se já tinha executado (a operação nunca acontece duas vezes).
+# A espera entre as tentativas cresce e é sorteada em volta do valor, para os clientes não repetirem todos juntos
+def enviar_operacao(comando):
+    chave = uuid.uuid4().hex
+    for tentativa in range(1, TENTATIVAS_REPETICAO + 1):
+        try:
+            if conexao.fechada:
+                reconectar()
+            resposta = conexao.enviar_comando_e_receber(comando, chave=chave, espera=TEMPO_RESPOSTA)
+        except (OSError, TempoEsgotado): # conexão perdida ou resposta que passou de TEMPO_RESPOSTA
+            print(f"\n[AVISO] Sem resposta do servidor, repetindo a operação ({tentativa}/{TENTATIVAS_REPETICAO})...")
+            time.sleep(ESPERA_REPETICAO * tentativa * random.uniform(0.5, 1.5))
+            reconectar()
+            continue
+        if not resposta.startswith(RECUSAS_TEMPORARIAS) or tentativa == TENTATIVAS_REPETICAO:
+            return resposta
+        print(f"\n[AVISO] Servidor ocupado, repetindo a operação ({tentativa}/{TENTATIVAS_REPETICAO})...")
+        time.sleep(ESPERA_REPETICAO * tentativa * random.uniform(0.5, 1.5))
+    print("\n[ERRO] Conexão com o servidor perdida.")
+    sys.exit()
+
+# Lê um valor em reais e devolve o texto digitado, sem passar por float: o servidor converte o mesmo texto para centavos
+# exatos. A conferência com para_centavos (a mesma do servidor) recusa aqui o que lá seria recusado (ValueError).
+def ler_valor(prompt):
+    texto = input(prompt).strip()
+    para_centavos(texto)
+    return texto
+
+# Alertas aparecem assim que chegam (chamado pela thread de leitura da conexão, mesmo com um input() esperando)
+def mostrar_alerta(alerta):
+    print("\n" + "="*50)
+    print(f" {alerta} ")
+    print("="*50)
 
 # Menu após login - (adicionar espaçamento e melhorias visuais depois)
 def menu_logado(nome, num_conta):
+    global token_sessao
     print(f"\n--- Login - Entrando! ---")
     
     while True:
-        verificar_notificacoes()
-
         print(f"\n--- IFBank | Olá, {nome} (Conta: {num_conta}) ---\n")
         print("1. Ver Saldo")
         print("2. Depositar")
         print("3. Sacar")
         print("4. Transferir")
-        print("\n5. Sair da Conta\n")
+        print("5. Extrato")
+        print("\n6. Sair da Conta\n")
         
         escolha = input("Digite sua opção: ")
         
@@ -77,19 +236,18 @@ def menu_logado(nome, num_conta):
         
         elif escolha == '2':
             try:
-                valor = float(input("Digite o valor para depositar: R$ "))
+                valor = ler_valor("Digite o valor para depositar: R$ ")
                 comando = f"DEPOSITAR|{valor}"
-                resposta = enviar_comando_e_receber(comando)
+                resposta = enviar_operacao(comando)
                 print(f"Resposta do Servidor: {resposta}")
             except ValueError:
                 print("[ERRO] Valor inválido.")
         
         elif escolha == '3':
             try:
-                valor = float(input("Digite o valor para sacar: R$ "))
-                senha = getpass.getpass("Digite sua senha para confirmar: ")
-                comando = f"SACAR|{valor}|{senha}"
-                resposta = enviar_comando_e_receber(comando)
+                valor = ler_valor("Digite o valor para sacar: R$ ")
+                comando = f"SACAR|{valor}"
+                resposta = enviar_operacao(comando)
                 print(f"Resposta do Servidor: {resposta}")
             except ValueError:
                 print("[ERRO] Valor inválido.")
@@ -97,15 +255,24 @@ def menu_logado(nome, num_conta):
         elif escolha == '4':
             try:
                 c_destino = input("Digite o número da conta de destino: ")
-                valor = float(input("Digite o valor para transferir: R$ "))
-                senha = getpass.getpass("Digite sua senha para confirmar: ")
-                comando = f"TRANSFERIR|{c_destino}|{valor}|{senha}"
-                resposta = enviar_comando_e_receber(comando)
+                valor = ler_valor("Digite o valor para transferir: R$ ")
+                comando = f"TRANSFERIR|{c_destino}|{valor}"
+                resposta = enviar_operacao(comando)
                 print(f"Resposta do Servidor: {resposta}")
             except ValueError:
                 print("[ERRO] Valor inválido.")
                 
         elif escolha == '5':
+            pagina = input("Página do extrato (Enter para a mais recente): ").strip() or "1"
+            resposta = enviar_comando_e_receber(f"EXTRATO|10|{pagina}")
+            # Os movimentos vêm numa linha só, separados por "; "
+            cabecalho, _, movimentos = resposta.partition(": ")
+            print(f"Resposta do Servidor: {cabecalho}")
+            for mov in movimentos.split("; ") if movimentos else []:
+                print(f"  {mov}")
+
+        elif escolha == '6':
+            token_sessao = None
             resposta = enviar_comando_e_receber("LOGOUT")
             print(f"Resposta do Servidor: {resposta}")
             break
@@ -115,6 +282,7 @@ def menu_logado(nome, num_conta):
 
 # Menu principal antes do login 
 def menu_principal():
+    global token_sessao
     while True:
         print("\n--- Bem-vindo ao IFBank ---")
         print(" Transferências rápidas e sem taxas. Crie sua conta e aproveite!\n")
@@ -133,9 +301,9 @@ def menu_principal():
             comando = f"LOGIN|{cpf}|{senha}"
             resposta = enviar_comando_e_receber(comando)
             
-            if resposta.startswith("[SUCESSO]"):
+            if resposta.startswith("[LOGIN]|"):
                 try:
-                    _, nome, num_conta = resposta.split('|')
+                    _, nome, num_conta, token_sessao = resposta.split('|')
                     menu_logado(nome, num_conta)
                 except ValueError:
                     print(f"[ERRO] Resposta de login inesperada: {resposta}")
@@ -0,0 +1,161 @@
+# extrato.py / Movimentos de cada conta para o comando EXTRATO. Cada movimento é uma linha JSON em logs/extrato.jsonl
+# e o índice (logs/extrato.idx) guarda, para cada linha, a conta, a posição no arquivo, o tamanho e o horário.
+# O índice fica em memória separado por conta, então uma consulta lê só as linhas que vai devolver (os.pread na posição),
+# sem percorrer o arquivo: o custo depende do tamanho da página, não do tamanho do log.
+# Limite: os dois arquivos só crescem (não há rotação nem retenção dos movimentos) e abrir() lê o índice inteiro, então a
+# memória (~20 bytes por movimento nos arrays) e o tempo de subida acompanham o histórico de todas as contas.
+import json
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+
+# Tipos de movimento (valor positivo entra na conta, negativo sai)
+DEPOSITO = "DEPOSITO"
+SAQUE = "SAQUE"
+TRANSFERENCIA_ENVIADA = "TRANSFERENCIA_ENVIADA"
+TRANSFERENCIA_RECEBIDA = "TRANSFERENCIA_RECEBIDA"
+TIPOS_MOVIMENTO = (DEPOSITO, SAQUE, TRANSFERENCIA_ENVIADA, TRANSFERENCIA_RECEBIDA)
+
+# Como cada tipo aparece para o usuário (protocolo em texto e menu do telnet)
+DESCRICOES_MOVIMENTOS = {DEPOSITO: "Depósito", SAQUE: "Saque", TRANSFERENCIA_ENVIADA: "Transferência para C:{contraparte}",
+                         TRANSFERENCIA_RECEBIDA: "Transferência de C:{contraparte}"}
+
+# Entrada do índice: conta, posição da linha no extrato.jsonl, tamanho da linha, horário (segundos desde 1970)
+ENTRADA_INDICE = struct.Struct("<IqId")
+
+#Movimento de uma conta como é guardado: saldo é o saldo da conta logo depois do movimento, tudo em centavos
+def movimento(conta, tipo, valor, saldo, contraparte=None):
+    return {"conta": conta, "tipo": tipo, "valor": valor, "saldo": saldo, "contraparte": contraparte}
+
+#Descrição do movimento para mostrar (o tipo, com a outra conta nas transferências)
+def descrever_movimento(mov):
+    return DESCRICOES_MOVIMENTOS[mov["tipo"]].format(**mov)
+
+class Extrato:
+    def __init__(self, caminho, caminho_indice=None):
+        self.caminho = caminho
+        self.caminho_indice = caminho_indice or os.path.splitext(caminho)[0] + ".idx"
+        self._indice = {} # conta -> (posições, tamanhos, horários), na ordem em que foram gravados
+        self._lock = threading.Lock()
+        self._arquivo = None
+        self._arquivo_indice = None
+        self._leitura = None # descritor só para os.pread das consultas
+        self._tamanho = 0
+
+    def __len__(self):
+        return sum(len(posicoes) for posicoes, _, _ in self._indice.values())
+
+    # Carrega o índice e confere com o arquivo: entradas que apontam além do fim são descartadas, e linhas gravadas
+    # depois da última entrada (queda entre as duas gravações) são indexadas de novo. Uma linha cortada no fim é removida.
+    def abrir(self):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._arquivo = open(self.caminho, 'ab')
+        self._tamanho = self._arquivo.tell()
+        self._arquivo_indice = open(self.caminho_indice, 'ab')
+        self._indice = {}
+
+        with open(self.caminho_indice, 'rb') as f:
+            dados = f.read()
+        validos = len(dados) - len(dados) % ENTRADA_INDICE.size
+        fim_indexado = 0
+        for posicao_entrada in range(0, validos, ENTRADA_INDICE.size):
+            conta, posicao, tamanho, instante = ENTRADA_INDICE.unpack_from(dados, posicao_entrada)
+            if posicao + tamanho > self._tamanho:
+                validos = posicao_entrada
+                break
+            self._indexar(str(conta), posicao, tamanho, instante)
+            fim_indexado = max(fim_indexado, posicao + tamanho)
+        if validos != len(dados):
+            self._arquivo_indice.truncate(validos)
+
+        if fim_indexado < self._tamanho:
+            self._reindexar(fim_indexado)
+        self._leitura = os.open(self.caminho, os.O_RDONLY)
+        print(f"[EXTRATO] {len(self)} movimentos indexados em {self.caminho}.")
+
+    def _reindexar(self, inicio):
+        with open(self.caminho, 'rb') as f:
+            f.seek(inicio)
+            resto = f.read()
+        entradas = []
+        posicao = inicio
+        for linha in resto.splitlines(keepends=True):
+            if not linha.endswith(b"\n"):
+                break
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                print(f"[EXTRATO] Linha inválida na posição {posicao} ignorada.")
+            else:
+                self._indexar(registro["conta"], posicao, len(linha), registro["t"])
+                entradas.append(ENTRADA_INDICE.pack(int(registro["conta"]), posicao, len(linha), registro["t"]))
+            posicao += len(linha)
+        if posicao < self._tamanho:
+            print(f"[EXTRATO] Movimento incompleto no fim de {self.caminho} descartado.")
+            self._arquivo.truncate(posicao)
+            self._tamanho = posicao
+        self._arquivo_indice.write(b"".join(entradas))
+        self._arquivo_indice.flush()
+
+    def _indexar(self, conta, posicao, tamanho, instante):
+        colunas = self._indice.get(conta)
+        if colunas is None:
+            colunas = self._indice[conta] = (array('q'), array('I'), array('d'))
+        colunas[0].append(posicao)
+        colunas[1].append(tamanho)
+        colunas[2].append(instante)
+
+    #Grava os movimentos [(horário, movimento), ...] e atualiza o índice. Só a thread do registro de transações chama.
+    #O índice é gravado depois das linhas, então nunca aponta para uma linha que não chegou ao arquivo.
+    def anexar(self, registros, modo="flush"):
+        linhas = []
+        entradas = []
+        novas = []
+        posicao = self._tamanho
+        for instante, mov in registros:
+            linha = (json.dumps({"t": round(instante, 3), **mov}, ensure_ascii=False) + "\n").encode('utf-8')
+            linhas.append(linha)
+            entradas.append(ENTRADA_INDICE.pack(int(mov["conta"]), posicao, len(linha), instante))
+            novas.append((mov["conta"], posicao, len(linha), instante))
+            posicao += len(linha)
+        if not linhas:
+            return
+        self._arquivo.write(b"".join(linhas))
+        self._arquivo.flush() # a consulta lê pelo descritor, então as linhas precisam sair do buffer do Python
+        if modo == "fsync":
+            os.fsync(self._arquivo.fileno())
+        self._arquivo_indice.write(b"".join(entradas))
+        if modo != "buffer":
+            self._arquivo_indice.flush()
+        self._tamanho = posicao
+        with self._lock:
+            for nova in novas:
+                self._indexar(*nova)
+
+    #Página de movimentos da conta, do mais recente para o mais antigo. inicio/fim (segundos desde 1970, fim exclusivo)
+    #limitam o período. Devolve (total de movimentos no período, [movimentos com "t"]).
+    def consultar(self, conta, limite, pagina=1, inicio=None, fim=None):
+        with self._lock:
+            colunas = self._indice.get(conta)
+            if colunas is None:
+                return 0, []
+            posicoes, tamanhos, instantes = colunas
+            primeiro = 0 if inicio is None else bisect_left(instantes, inicio)
+            ultimo = len(instantes) if fim is None else bisect_left(instantes, fim)
+            total = max(ultimo - primeiro, 0)
+            ate = ultimo - (pagina - 1) * limite
+            de = max(ate - limite, primeiro)
+            trechos = [(posicoes[i], tamanhos[i]) for i in range(ate - 1, de - 1, -1)]
+        return total, [json.loads(os.pread(self._leitura, tamanho, posicao)) for posicao, tamanho in trechos]
+
+    def fechar(self):
+        for arquivo in (self._arquivo, self._arquivo_indice):
+            if arquivo:
+                arquivo.close()
+        if self._leitura is not None:
+            os.close(self._leitura)
+        self._arquivo = self._arquivo_indice = self._leitura = None
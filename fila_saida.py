@@ -0,0 +1,162 @@
+# fila_saida.py / Fila de saída dos alertas de cada conexão. Quem faz a transferência só coloca o alerta na fila e volta;
+# um escritor da própria conexão (thread ou tarefa do asyncio) é quem espera o socket. Assim um cliente lento ou travado
+# não segura conexoes_lock nem a operação de quem mandou o dinheiro.
+import asyncio
+import threading
+from collections import deque
+
+# O que fazer quando um cliente não lê os alertas e a fila chega ao limite:
+#   "descartar"   - o alerta novo é descartado
+#   "agrupar"     - o alerta novo é somado ao alerta pendente da mesma conta de origem ("Você recebeu N transferências");
+#                   se não houver um, é descartado
+#   "desconectar" - a conexão é derrubada (o cliente pode entrar de novo e consultar o saldo)
+POLITICAS = ("descartar", "agrupar", "desconectar")
+LIMITE_PADRAO = 256
+
+# Resultado de FilaSaida.enfileirar
+ENFILEIRADO = "enfileirado"
+AGRUPADO = "agrupado"
+DESCARTADO = "descartado"
+DESCONECTADO = "desconectado"
+
+#Socket que pode receber sendall de mais de uma thread (respostas do atendimento + alertas do escritor) sem misturar bytes
+class SocketTravado:
+    def __init__(self, sock):
+        self.sock = sock
+        self._trava_envio = threading.Lock()
+
+    def sendall(self, dados):
+        with self._trava_envio:
+            self.sock.sendall(dados)
+
+    def __getattr__(self, nome):
+        return getattr(self.sock, nome)
+
+#Alertas são (conta de origem, nome de quem mandou, quantidade, total em centavos); "codificar" transforma um alerta nos
+#bytes do protocolo da conexão e só é chamado pelo escritor, na hora de enviar (depois de um possível agrupamento).
+class FilaSaida:
+    def __init__(self, codificar, limite=LIMITE_PADRAO, politica="agrupar"):
+        if politica not in POLITICAS:
+            raise ValueError(f"política inválida: {politica}")
+        self.codificar = codificar
+        self.limite = limite
+        self.politica = politica
+        self.fechada = False
+        # Contadores
+        self.enviados = 0
+        self.agrupados = 0
+        self.descartados = 0
+        self._alertas = deque()   # [origem, nome, quantidade, total]
+        self._por_origem = {}     # origem -> alerta pendente (para agrupar)
+        self._lock = threading.Lock()
+        self._acordar = None      # avisa o escritor que a fila deixou de estar vazia
+        self._derrubar = None     # derruba a conexão (política "desconectar")
+        self._thread = None
+
+    @property
+    def profundidade(self):
+        return len(self._alertas)
+
+    #Nunca bloqueia: devolve ENFILEIRADO, AGRUPADO, DESCARTADO ou DESCONECTADO
+    def enfileirar(self, alerta):
+        acordar = derrubar = False
+        with self._lock:
+            if self.fechada:
+                self.descartados += 1
+                return DESCARTADO
+            origem = alerta[0]
+            if len(self._alertas) < self.limite:
+                item = list(alerta)
+                acordar = not self._alertas
+                self._alertas.append(item)
+                self._por_origem[origem] = item
+                resultado = ENFILEIRADO
+            elif self.politica == "agrupar" and origem in self._por_origem:
+                item = self._por_origem[origem]
+                item[2] += alerta[2]
+                item[3] += alerta[3]
+                self.agrupados += 1
+                resultado = AGRUPADO
+            elif self.politica == "desconectar":
+                self.descartados += len(self._alertas) + 1
+                self._alertas.clear()
+                self._por_origem.clear()
+                self.fechada = derrubar = True
+                resultado = DESCONECTADO
+            else:
+                self.descartados += 1
+                resultado = DESCARTADO
+        if acordar and self._acordar:
+            self._acordar()
+        if derrubar and self._derrubar:
+            self._derrubar()
+        return resultado
+
+    #Tira todos os alertas pendentes e devolve os bytes para enviar de uma vez (b"" se não havia nada)
+    def retirar(self):
+        with self._lock:
+            alertas = list(self._alertas)
+            self._alertas.clear()
+            self._por_origem.clear()
+        self.enviados += len(alertas)
+        return b"".join(self.codificar(tuple(alerta)) for alerta in alertas)
+
+    def fechar(self):
+        with self._lock:
+            self.fechada = True
+            self._alertas.clear()
+            self._por_origem.clear()
+        if self._acordar:
+            self._acordar()
+
+    # # Escritor com thread (servidor com uma thread por conexão). A thread só é criada no primeiro alerta.
+    # conn deve aceitar sendall de várias threads (SocketTravado)
+    def usar_thread(self, conn, derrubar=None):
+        evento = threading.Event()
+
+        def acordar():
+            with self._lock:
+                if self._thread is None and not self.fechada:
+                    self._thread = threading.Thread(target=self._escritor_thread, args=(conn, evento), name="fila-saida", daemon=True)
+                    self._thread.start()
+            evento.set()
+
+        self._acordar = acordar
+        self._derrubar = derrubar
+
+    def _escritor_thread(self, conn, evento):
+        while True:
+            evento.wait()
+            evento.clear()
+            if self.fechada:
+                return
+            dados = self.retirar()
+            if dados:
+                try:
+                    conn.sendall(dados)
+                except OSError:
+                    self.fechar()
+                    return
+
+    # # Escritor no event loop (modo asyncio): uma tarefa que escreve e espera o drain do writer.
+    # Enquanto o cliente não lê, o drain segura a tarefa e os alertas novos ficam na fila (e a política vale).
+    def usar_loop(self, loop, writer, derrubar=None):
+        evento = asyncio.Event()
+        self._acordar = lambda: loop.call_soon_threadsafe(evento.set)
+        self._derrubar = derrubar
+        return loop.create_task(self._escritor_async(writer, evento))
+
+    async def _escritor_async(self, writer, evento):
+        while True:
+            await evento.wait()
+            evento.clear()
+            if self.fechada:
+                return
+            dados = self.retirar()
+            if dados:
+                try:
+                    writer.write(dados)
+                    await writer.drain()
+                except (ConnectionError, OSError):
+                    self.fechar()
+                    return
@@ -0,0 +1,127 @@
+# idempotencia.py / Respostas recentes das operações que movem dinheiro, guardadas pela chave que o cliente mandou junto
+# (ID=chave|DEPOSITAR|50). Se a conexão cai antes da resposta, o cliente repete o mesmo comando com a mesma chave:
+# se a operação já tinha sido feita, o servidor devolve a resposta guardada em vez de executar de novo.
+# O cache é limitado em quantidade (sai a chave usada há mais tempo) e em idade (validade em segundos).
+# As respostas das operações aceitas vão no mesmo registro do diário que a operação e no checkpoint, então
+# continuam valendo depois de reiniciar o servidor (veja banco.py).
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Tamanho máximo da chave (o cliente normalmente usa um uuid4 em hexadecimal, 32 caracteres)
+TAMANHO_MAX_CHAVE = 64
+
+#Chave aceita: texto curto, só letras, números, "-" e "_" (não pode ter o separador "|" do protocolo em texto)
+def chave_valida(chave):
+    return 0 < len(chave) <= TAMANHO_MAX_CHAVE and chave.isascii() and chave.replace("-", "").replace("_", "").isalnum()
+
+#Resumo do pedido (operação e argumentos): a mesma chave com outro pedido é recusada em vez de devolver a resposta
+#de uma operação diferente. É um hash, então a senha que faz parte dos argumentos não fica guardada.
+#Listas viram tuplas antes, assim um pedido repassado por outra partição (que chega em JSON) tem o mesmo resumo.
+def resumo_pedido(operacao, argumentos):
+    return hashlib.sha256(repr((operacao, _tuplas(argumentos))).encode('utf-8')).hexdigest()[:32]
+
+def _tuplas(valor):
+    if isinstance(valor, (list, tuple)):
+        return tuple(_tuplas(item) for item in valor)
+    return valor
+
+class Entrada:
+    __slots__ = ("resumo", "instante", "status", "dados", "seq", "pronta")
+
+    def __init__(self, resumo, instante):
+        self.resumo = resumo
+        self.instante = instante
+        self.status = None
+        self.dados = None
+        self.seq = 0         # registro do diário da operação (0 se ela não mudou nada, como uma recusa)
+        self.pronta = None   # threading.Event enquanto a operação está em andamento
+
+class CacheIdempotencia:
+    def __init__(self, maximo=100000, validade=24 * 60 * 60):
+        self.maximo = maximo
+        self.validade = validade
+        self._entradas = OrderedDict() # (conta, chave) -> Entrada, da usada há mais tempo para a mais recente
+        self._lock = threading.Lock()
+        self.repetidos = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _expirada(self, entrada, agora):
+        return entrada.pronta is None and agora - entrada.instante > self.validade
+
+    #Chamar com self._lock: tira as expiradas do começo e as mais antigas além do máximo (nunca uma em andamento)
+    def _limitar(self, agora):
+        while self._entradas:
+            chave, entrada = next(iter(self._entradas.items()))
+            if entrada.pronta is not None or (len(self._entradas) <= self.maximo and not self._expirada(entrada, agora)):
+                break
+            del self._entradas[chave]
+
+    #Antes de executar: devolve None se a operação deve ser executada (a chave fica reservada até concluir/cancelar)
+    #ou a Entrada com a resposta já guardada. Se a mesma chave estiver em andamento em outra conexão, espera ela terminar.
+    def reservar(self, chave, resumo):
+        while True:
+            agora = time.time()
+            with self._lock:
+                entrada = self._entradas.get(chave)
+                if entrada is not None and self._expirada(entrada, agora):
+                    del self._entradas[chave]
+                    entrada = None
+                if entrada is None:
+                    entrada = self._entradas[chave] = Entrada(resumo, agora)
+                    entrada.pronta = threading.Event()
+                    self._limitar(agora)
+                    return None
+                self._entradas.move_to_end(chave)
+                pronta = entrada.pronta
+                if pronta is None:
+                    self.repetidos += 1
+                    return entrada
+            pronta.wait()
+
+    #Guarda a resposta (sem os alertas, que não são enviados de novo) e libera quem esperava pela mesma chave
+    def concluir(self, chave, status, dados, seq=0):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None: # saiu do cache enquanto executava (não acontece com o máximo razoável)
+                return
+            entrada.status = status
+            entrada.dados = {campo: valor for campo, valor in dados.items() if campo != "alertas"}
+            entrada.seq = seq
+            pronta, entrada.pronta = entrada.pronta, None
+        if pronta is not None:
+            pronta.set()
+
+    #A operação falhou com uma exceção: a chave é liberada para o cliente tentar de novo
+    def cancelar(self, chave):
+        with self._lock:
+            entrada = self._entradas.pop(chave, None)
+        if entrada is not None and entrada.pronta is not None:
+            entrada.pronta.set()
+
+    #Recuperação (checkpoint e diário): coloca uma resposta já concluída, se ainda estiver na validade
+    def restaurar(self, chave, resumo, instante, status, dados, seq):
+        agora = time.time()
+        if agora - instante > self.validade:
+            return
+        with self._lock:
+            entrada = Entrada(resumo, instante)
+            entrada.status, entrada.dados, entrada.seq = status, dados, seq
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            self._limitar(agora)
+
+    #Respostas que mudaram alguma conta (seq > 0), para o checkpoint: [[conta, chave, resumo, instante, status, dados, seq], ...]
+    def exportar(self):
+        agora = time.time()
+        with self._lock:
+            return [[conta, chave, entrada.resumo, entrada.instante, entrada.status, entrada.dados, entrada.seq]
+                    for (conta, chave), entrada in self._entradas.items()
+                    if entrada.pronta is None and entrada.seq and not self._expirada(entrada, agora)]
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
@@ -0,0 +1,211 @@
+# metricas.py / Métricas do servidor em memória: contadores, medidores e histogramas de latência, com saída em texto
+# no formato de exposição do Prometheus (servida numa porta local separada) e um resumo de uma linha para o comando STATS.
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites dos baldes dos histogramas, em segundos (de 50 us a 10 s, cada um ~2x o anterior)
+LIMITES_PADRAO = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                  0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{chave}="{valor}"' for chave, valor in rotulos) + "}"
+
+class Contador:
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, quantidade=1):
+        with self._lock:
+            self.valor += quantidade
+
+#Valor que sobe e desce (conexões abertas, por exemplo)
+class Medidor:
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, quantidade=1):
+        with self._lock:
+            self.valor += quantidade
+
+    def decrementar(self, quantidade=1):
+        self.incrementar(-quantidade)
+
+    def definir(self, valor):
+        self.valor = valor
+
+#Histograma com baldes fixos: observar() custa uma busca binária e uma soma, e os percentis saem dos baldes
+#(o valor devolvido é o limite superior do balde, como no Prometheus)
+class Histograma:
+    def __init__(self, limites=LIMITES_PADRAO):
+        self.limites = limites
+        self.baldes = [0] * (len(limites) + 1) # o último é "acima do maior limite"
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, segundos):
+        indice = bisect_left(self.limites, segundos)
+        with self._lock:
+            self.baldes[indice] += 1
+            self.quantidade += 1
+            self.soma += segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    #Mede o tempo do bloco with
+    @contextmanager
+    def medir(self):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio)
+
+    def percentil(self, p):
+        with self._lock:
+            baldes, quantidade, maximo = list(self.baldes), self.quantidade, self.maximo
+        if not quantidade:
+            return 0.0
+        alvo = p / 100 * quantidade
+        acumulado = 0
+        for indice, contagem in enumerate(baldes):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(self.limites[indice], maximo) if indice < len(self.limites) else maximo
+        return maximo
+
+#Trava que mede quanto tempo cada thread esperou para pegá-la e quanto tempo ficou com ela.
+#Substitui um threading.Lock em "with trava:" sem mudar quem usa.
+class TravaMedida:
+    def __init__(self, espera, posse):
+        self._lock = threading.Lock()
+        self._espera = espera
+        self._posse = posse
+        self._adquirida = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        inicio = time.perf_counter()
+        ok = self._lock.acquire(blocking, timeout)
+        if ok:
+            self._adquirida = time.perf_counter()
+            self._espera.observar(self._adquirida - inicio)
+        return ok
+
+    def release(self):
+        posse = time.perf_counter() - self._adquirida
+        self._lock.release()
+        self._posse.observar(posse)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *excecao):
+        self.release()
+
+#Registro de todas as métricas do processo. Cada métrica é identificada pelo nome + rótulos e criada no primeiro uso.
+class Metricas:
+    def __init__(self):
+        self._metricas = {} # nome -> (tipo, ajuda, {rotulos: métrica})
+        self._coletores = []
+        self._lock = threading.Lock()
+
+    def _obter(self, tipo, classe, nome, ajuda, rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        familia = self._metricas.get(nome)
+        if familia is not None and chave in familia[2]:
+            return familia[2][chave]
+        with self._lock:
+            familia = self._metricas.setdefault(nome, (tipo, ajuda, {}))
+            return familia[2].setdefault(chave, classe())
+
+    def contador(self, nome, ajuda="", **rotulos):
+        return self._obter("counter", Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda="", **rotulos):
+        return self._obter("gauge", Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome, ajuda="", **rotulos):
+        return self._obter("histogram", Histograma, nome, ajuda, rotulos)
+
+    def trava(self, nome):
+        espera = self.histograma("trava_espera_segundos", "Tempo esperando para pegar a trava", trava=nome)
+        posse = self.histograma("trava_posse_segundos", "Tempo com a trava pega", trava=nome)
+        return TravaMedida(espera, posse)
+
+    #Função chamada na hora de gerar a saída, para valores que já existem em outro lugar
+    #(ex.: profundidade da fila do log). Devolve [(nome, ajuda, valor), ...] de medidores sem rótulos.
+    def coletor(self, funcao):
+        self._coletores.append(funcao)
+
+    def familias(self):
+        with self._lock:
+            return [(nome, tipo, ajuda, dict(metricas)) for nome, (tipo, ajuda, metricas) in sorted(self._metricas.items())]
+
+    #Formato de exposição em texto do Prometheus
+    def texto(self):
+        linhas = []
+        for nome, tipo, ajuda, metricas in self.familias():
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, metrica in sorted(metricas.items()):
+                if tipo != "histogram":
+                    linhas.append(f"{nome}{_rotulos_texto(rotulos)} {metrica.valor}")
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(metrica.limites + ("+Inf",), metrica.baldes):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_rotulos_texto(rotulos + (('le', limite),))} {acumulado}")
+                linhas.append(f"{nome}_sum{_rotulos_texto(rotulos)} {metrica.soma:.6f}")
+                linhas.append(f"{nome}_count{_rotulos_texto(rotulos)} {metrica.quantidade}")
+        for coletor in self._coletores:
+            for nome, ajuda, valor in coletor():
+                linhas.extend((f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge", f"{nome} {valor}"))
+        return "\n".join(linhas) + "\n"
+
+    #Resumo em uma linha (o protocolo em texto tem uma resposta por linha): contadores/medidores com o valor e
+    #histogramas com quantidade, p50, p99 e máximo em milissegundos
+    def resumo(self):
+        partes = []
+        for nome, tipo, _, metricas in self.familias():
+            for rotulos, metrica in sorted(metricas.items()):
+                titulo = nome + "".join(f" {valor}" for _, valor in rotulos)
+                if tipo == "histogram":
+                    if metrica.quantidade:
+                        partes.append(f"{titulo} n={metrica.quantidade} p50={metrica.percentil(50) * 1000:.2f}ms "
+                                      f"p99={metrica.percentil(99) * 1000:.2f}ms max={metrica.maximo * 1000:.2f}ms")
+                else:
+                    partes.append(f"{titulo}={metrica.valor}")
+        for coletor in self._coletores:
+            partes.extend(f"{nome}={valor}" for nome, _, valor in coletor())
+        return " | ".join(partes)
+
+#Servidor HTTP mínimo que devolve metricas.texto() em qualquer caminho, numa thread própria
+def servir_metricas(metricas, host, porta):
+    class Atendimento(BaseHTTPRequestHandler):
+        def do_GET(self):
+            corpo = metricas.texto().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *argumentos):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Atendimento)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
@@ -0,0 +1,113 @@
+# ociosidade.py / Encerramento das conexões paradas: quem não entra numa conta em TEMPO_LOGIN segundos ou fica logado
+# sem mandar nada por TEMPO_OCIOSO segundos tem a conexão fechada, e a thread, o socket e a entrada em conexoes_ativas
+# voltam para o servidor. Uma thread só cuida de todas as conexões com uma roda de temporizadores: o tempo é dividido
+# em fatias de `passo` segundos e cada conexão fica na fatia do seu prazo. A cada passo só a fatia da vez é olhada.
+# A atividade de uma conexão só troca o prazo dela (Vigia.atividade, sem trava e sem mexer na roda); quando a fatia
+# antiga chega, a conexão que ainda tem prazo é movida para a fatia certa. Prazos mais longos que uma volta da roda
+# ficam na última fatia e são movidos de novo a cada volta.
+import math
+import threading
+import time
+
+class Vigia:
+    __slots__ = ("roda", "encerrar", "prazo", "logado", "expirou", "fatia")
+
+    def __init__(self, roda, encerrar, prazo):
+        self.roda = roda
+        self.encerrar = encerrar # encerrar(forcar): acorda o atendimento da conexão; não pode bloquear
+        self.prazo = prazo       # time.monotonic() em que a conexão é encerrada
+        self.logado = False
+        self.expirou = False     # o atendimento usa para avisar o cliente do motivo antes de fechar
+        self.fatia = None
+
+    #A conexão recebeu algo. Logada, o prazo passa a ser TEMPO_OCIOSO a partir de agora; sem conta, o prazo do login
+    #não é renovado (só recomeça quando a conta sai).
+    def atividade(self, logado):
+        if logado:
+            self.prazo = time.monotonic() + (self.roda.tempo_ocioso or math.inf)
+        elif self.logado:
+            self.prazo = time.monotonic() + (self.roda.tempo_login or math.inf)
+        self.logado = logado
+
+class RodaTempo:
+    #tempo_ocioso/tempo_login em segundos (0 = sem limite); tolerancia: segundos depois do primeiro aviso até fechar à
+    #força uma conexão cujo atendimento não saiu (preso num envio para um cliente que não lê, por exemplo)
+    def __init__(self, tempo_ocioso, tempo_login, passo=1.0, fatias=512, tolerancia=10):
+        self.tempo_ocioso = tempo_ocioso
+        self.tempo_login = tempo_login
+        self.passo = passo
+        self.tolerancia = tolerancia
+        self._fatias = [set() for _ in range(fatias)]
+        self._volta = 0   # passos já dados desde o início
+        self._inicio = time.monotonic()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.recuperadas = 0
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(fatia) for fatia in self._fatias)
+
+    #Chamar com self._lock
+    def _colocar(self, vigia, agora):
+        passos = math.ceil((vigia.prazo - agora) / self.passo) if vigia.prazo != math.inf else len(self._fatias)
+        fatia = (self._volta + min(max(passos, 1), len(self._fatias) - 1)) % len(self._fatias)
+        self._fatias[fatia].add(vigia)
+        vigia.fatia = fatia
+
+    #Conexão nova (ainda sem conta): devolve o Vigia dela, que o atendimento tira com remover() ao terminar
+    def vigiar(self, encerrar):
+        agora = time.monotonic()
+        vigia = Vigia(self, encerrar, agora + (self.tempo_login or math.inf))
+        with self._lock:
+            self._colocar(vigia, agora)
+        return vigia
+
+    def remover(self, vigia):
+        with self._lock:
+            if vigia.fatia is not None:
+                self._fatias[vigia.fatia].discard(vigia)
+                vigia.fatia = None
+
+    #Um passo: as conexões da fatia da vez que passaram do prazo são avisadas; as outras vão para a fatia do prazo novo
+    def _girar(self, agora):
+        vencidas = []
+        with self._lock:
+            self._volta += 1
+            fatia = self._fatias[self._volta % len(self._fatias)]
+            for vigia in list(fatia):
+                if vigia.prazo > agora:
+                    fatia.discard(vigia)
+                    self._colocar(vigia, agora)
+                    continue
+                vencidas.append((vigia, vigia.expirou))
+                if not vigia.expirou:
+                    self.recuperadas += 1
+                vigia.expirou = True
+                vigia.prazo = agora + self.tolerancia
+                fatia.discard(vigia)
+                self._colocar(vigia, agora)
+        for vigia, forcar in vencidas:
+            try:
+                vigia.encerrar(forcar)
+            except Exception as e:
+                print(f"[OCIOSO] Falha ao encerrar conexão parada: {e}")
+
+    def _girar_sempre(self):
+        while not self._parar.wait(self.passo):
+            agora = time.monotonic()
+            # Se a thread atrasou, dá os passos que faltaram
+            while self._volta < (agora - self._inicio) // self.passo:
+                self._girar(agora)
+
+    def iniciar(self):
+        self._inicio = time.monotonic()
+        self._volta = 0
+        self._thread = threading.Thread(target=self._girar_sempre, name="roda-ociosas", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
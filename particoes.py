@@ -0,0 +1,311 @@
+# particoes.py / Modo particionado: as contas são divididas pelo número entre N processos (partições), cada um com as
+# suas colunas, diário, checkpoints e logs numa pasta própria (particoes/<i>/), e portanto com o seu GIL e as suas travas.
+# Todos escutam a mesma porta (SO_REUSEPORT: o sistema distribui as conexões) e um comando de uma conta de outra partição
+# é repassado para a dona por um socket Unix local (particoes/<i>/rpc.sock), em linhas JSON, várias chamadas ao mesmo
+# tempo em cada conexão. Aqui ficam a regra de quem é dono de quê, o RPC entre as partições e a contabilidade das
+# transferências entre partições; quem usa é o banco.py (roteamento e duas fases) e o servidor.py (processos).
+#
+# Dona de cada coisa:
+#   conta   (número - PRIMEIRA_CONTA) % N, a partição i numera as suas contas como PRIMEIRA_CONTA + linha*N + i
+#   CPF     crc32(CPF) % N: CRIAR vai para a partição do CPF e a conta nasce nela, então o LOGIN acha a conta lá
+#   token   prefixo "i." do token de sessão (RETOMAR vai para quem fez o LOGIN)
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as TempoEsgotado
+from armazem import PRIMEIRA_CONTA
+
+PASTA_PARTICOES = "particoes"
+ARQUIVO_CONFIGURACAO = os.path.join(PASTA_PARTICOES, "particoes.json")
+ARQUIVO_SOCKET = "rpc.sock"
+# Segundos esperando a resposta de outra partição
+ESPERA_RESPOSTA = 10
+
+def particao_da_conta(num, particoes):
+    if not (num.isascii() and num.isdigit()) or int(num) < PRIMEIRA_CONTA:
+        return None
+    return (int(num) - PRIMEIRA_CONTA) % particoes
+
+def particao_do_cpf(cpf, particoes):
+    return zlib.crc32(cpf.encode('utf-8')) % particoes
+
+def particao_do_token(token, particoes):
+    prefixo, _, _ = token.partition(".")
+    if prefixo.isascii() and prefixo.isdigit() and int(prefixo) < particoes:
+        return int(prefixo)
+    return None
+
+#Socket de cada partição, visto da pasta de uma delas (o processo da partição roda dentro de particoes/<i>/)
+def caminho_socket(particao):
+    return os.path.join("..", str(particao), ARQUIVO_SOCKET)
+
+#Os números das contas dependem de N: subir com outra quantidade de partições embaralharia os donos.
+#Grava a quantidade na primeira vez e recusa (ValueError) uma diferente depois.
+def conferir_configuracao(particoes):
+    os.makedirs(PASTA_PARTICOES, exist_ok=True)
+    if os.path.exists(ARQUIVO_CONFIGURACAO):
+        with open(ARQUIVO_CONFIGURACAO, 'r') as f:
+            gravadas = json.load(f)["particoes"]
+        if gravadas != particoes:
+            raise ValueError(f"os dados em {PASTA_PARTICOES}/ são de {gravadas} partições, não de {particoes}")
+        return
+    with open(ARQUIVO_CONFIGURACAO, 'w') as f:
+        json.dump({"particoes": particoes}, f)
+    for particao in range(particoes):
+        os.makedirs(os.path.join(PASTA_PARTICOES, str(particao)), exist_ok=True)
+
+# # RPC entre as partições
+#O pedido nem chegou à outra partição (não conectou ou o envio falhou): é seguro repetir
+class ParticaoIndisponivel(ConnectionError):
+    pass
+
+#Conexão com uma partição. chamar() pode ser usado por várias threads ao mesmo tempo: cada pedido leva um id e a thread
+#de leitura entrega cada resposta ao Future certo. Se a conexão cair, a próxima chamada conecta de novo.
+class ConexaoParticao:
+    def __init__(self, caminho, espera=ESPERA_RESPOSTA):
+        self.caminho = caminho
+        self.espera = espera
+        self._sock = None
+        self._pendentes = {}    # id -> Future, só da conexão atual
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    #Chamar com self._lock
+    def _conectar(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.caminho)
+        except OSError:
+            sock.close()
+            raise
+        self._sock, self._pendentes = sock, {}
+        threading.Thread(target=self._receber_sempre, args=(sock, self._pendentes),
+                         name="leitor-particao", daemon=True).start()
+
+    def _enviar(self, mensagem, futuro=None):
+        dados = (json.dumps(mensagem, separators=(",", ":")) + "\n").encode('utf-8')
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._conectar()
+                if futuro is not None:
+                    self._pendentes[mensagem["id"]] = futuro
+                self._sock.sendall(dados)
+            except OSError as e:
+                if futuro is not None:
+                    self._pendentes.pop(mensagem["id"], None)
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                raise ParticaoIndisponivel(f"{self.caminho}: {e}")
+
+    def _receber_sempre(self, sock, pendentes):
+        try:
+            for linha in sock.makefile('rb'):
+                resposta = json.loads(linha)
+                futuro = pendentes.pop(resposta["id"], None)
+                if futuro is not None:
+                    futuro.set_result(resposta)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                sock.close()
+            for futuro in list(pendentes.values()):
+                futuro.set_exception(ConnectionResetError(f"{self.caminho}: partição fechou a conexão"))
+            pendentes.clear()
+
+    #Devolve o resultado do método na outra partição. ParticaoIndisponivel: o pedido não saiu; TimeoutError ou
+    #ConnectionError: saiu e a resposta não veio (pode ter sido executado); RuntimeError: o método deu erro lá.
+    def chamar(self, metodo, *argumentos):
+        futuro = Future()
+        id_pedido = next(self._ids)
+        self._enviar({"id": id_pedido, "m": metodo, "a": argumentos}, futuro)
+        try:
+            resposta = futuro.result(self.espera)
+        except TempoEsgotado:
+            with self._lock:
+                self._pendentes.pop(id_pedido, None)
+            raise TimeoutError(f"{self.caminho}: sem resposta em {self.espera} s")
+        if "e" in resposta:
+            raise RuntimeError(resposta["e"])
+        return resposta["r"]
+
+    #Manda sem esperar resposta (alertas, tokens); devolve False se não conseguiu enviar
+    def avisar(self, metodo, *argumentos):
+        try:
+            self._enviar({"id": None, "m": metodo, "a": argumentos})
+            return True
+        except ParticaoIndisponivel:
+            return False
+
+    def fechar(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.shutdown(socket.SHUT_RDWR)
+
+#Conexões desta partição com todas as outras
+class Particoes:
+    def __init__(self, particao, particoes):
+        self.particao = particao
+        self.quantidade = particoes
+        self.conexoes = {i: ConexaoParticao(caminho_socket(i)) for i in range(particoes) if i != particao}
+
+    def chamar(self, particao, metodo, *argumentos):
+        return self.conexoes[particao].chamar(metodo, *argumentos)
+
+    def avisar(self, particao, metodo, *argumentos):
+        return self.conexoes[particao].avisar(metodo, *argumentos)
+
+    def avisar_todas(self, metodo, *argumentos):
+        for conexao in self.conexoes.values():
+            conexao.avisar(metodo, *argumentos)
+
+    def fechar(self):
+        for conexao in self.conexoes.values():
+            conexao.fechar()
+
+#Atende as outras partições no socket Unix da pasta desta. metodos: nome -> (função, executor). Cada pedido roda no
+#executor do método, nunca na thread que lê a conexão, assim um pedido lento não segura os outros da mesma conexão.
+class ServidorParticao:
+    def __init__(self, caminho, metodos):
+        self.caminho = caminho
+        self.metodos = metodos
+        self._sock = None
+
+    def iniciar(self):
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho) # sobra de um processo que caiu
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.caminho)
+        os.chmod(self.caminho, 0o600) # só o dono dos processos fala com as partições
+        self._sock.listen(64)
+        threading.Thread(target=self._aceitar, name="rpc-particao", daemon=True).start()
+
+    def _aceitar(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError: # socket fechado no desligamento
+                return
+            threading.Thread(target=self._atender, args=(conn,), name="rpc-conexao", daemon=True).start()
+
+    def _atender(self, conn):
+        envio_lock = threading.Lock()
+        try:
+            for linha in conn.makefile('rb'):
+                pedido = json.loads(linha)
+                funcao, executor = self.metodos[pedido["m"]]
+                executor.submit(self._executar, conn, envio_lock, pedido, funcao)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[PARTICOES] Conexão de outra partição encerrada: {e!r}")
+        except RuntimeError: # executor já desligado
+            pass
+        finally:
+            conn.close()
+
+    def _executar(self, conn, envio_lock, pedido, funcao):
+        try:
+            resposta = {"id": pedido["id"], "r": funcao(*pedido["a"])}
+        except Exception as e:
+            print(f"[PARTICOES] Erro em {pedido['m']} pedido por outra partição: {e}")
+            resposta = {"id": pedido["id"], "e": f"{type(e).__name__}: {e}"}
+        if pedido["id"] is None:
+            return
+        dados = (json.dumps(resposta, separators=(",", ":")) + "\n").encode('utf-8')
+        with envio_lock:
+            try:
+                conn.sendall(dados)
+            except OSError:
+                pass
+
+    def parar(self):
+        if self._sock is not None:
+            self._sock.close()
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+# # Transferências entre partições
+# A partição da conta de origem coordena: debita, grava no diário o débito junto com a decisão (os créditos de cada
+# outra partição, com um número da transação) e só então manda cada partição creditar. Crédito não tem como falhar
+# (as contas de destino foram conferidas antes e conta não some), então a única decisão é a do débito, tomada com a trava
+# só da origem e sem esperar ninguém. Uma partição que credita grava o número da transação junto no diário e responde;
+# com todas as respostas a coordenadora grava o fim. Até lá a transação fica pendente e o crédito é reenviado (depois de
+# cair, a pendência volta do diário); quem credita reconhece um número já aplicado e não credita duas vezes.
+class TransacoesDistribuidas:
+    def __init__(self):
+        self.limpar()
+        self._lock = threading.Lock()
+
+    def limpar(self):
+        self.proximo = 1
+        self.pendentes = {}  # número -> (créditos {partição: [[conta, centavos, origem, nome da origem], ...]}, instante)
+        self.aplicadas = {}  # partição coordenadora -> números já creditados aqui
+        self.pisos = {}      # partição coordenadora -> menor número que ela ainda pode reenviar
+
+    def __len__(self):
+        return len(self.pendentes)
+
+    #Número e pendência de uma transação nova - chamar com a trava da origem, logo antes de gravar no diário
+    def nova(self, creditos):
+        with self._lock:
+            numero = self.proximo
+            self.proximo += 1
+            self.pendentes[numero] = (creditos, time.monotonic())
+            return numero
+
+    #Só chamar depois que o fim estiver no diário: o piso mandado às outras partições passa do número
+    def concluir(self, numero):
+        with self._lock:
+            self.pendentes.pop(numero, None)
+
+    #Números abaixo deste já terminaram e nunca mais são reenviados; vai junto em cada crédito
+    def piso(self):
+        with self._lock:
+            return min(self.pendentes, default=self.proximo)
+
+    #Pendentes há mais de `idade` segundos (as mais novas ainda estão com quem as criou)
+    def atrasadas(self, idade):
+        limite = time.monotonic() - idade
+        with self._lock:
+            return [(numero, creditos) for numero, (creditos, instante) in self.pendentes.items() if instante < limite]
+
+    def aplicada(self, coordenadora, numero):
+        with self._lock:
+            return numero < self.pisos.get(coordenadora, 0) or numero in self.aplicadas.get(coordenadora, ())
+
+    #Crédito aplicado aqui; o piso da coordenadora deixa esquecer os números que ela não reenvia mais
+    def marcar_aplicada(self, coordenadora, numero, piso):
+        with self._lock:
+            aplicadas = self.aplicadas.setdefault(coordenadora, set())
+            if piso > self.pisos.get(coordenadora, 0):
+                self.pisos[coordenadora] = piso
+                aplicadas.difference_update([n for n in aplicadas if n < piso])
+            if numero >= self.pisos.get(coordenadora, 0):
+                aplicadas.add(numero)
+
+    #Recuperação (arquivo do checkpoint e depois o diário, em ordem)
+    def restaurar_pendente(self, numero, creditos):
+        self.pendentes[numero] = ({int(particao): itens for particao, itens in creditos.items()}, 0)
+        self.proximo = max(self.proximo, numero + 1)
+
+    def restaurar(self, dados):
+        self.proximo = dados.get("proximo", 1)
+        for numero, creditos in dados.get("pendentes", []):
+            self.restaurar_pendente(numero, creditos)
+        for coordenadora, (piso, numeros) in dados.get("aplicadas", {}).items():
+            self.pisos[int(coordenadora)] = piso
+            self.aplicadas[int(coordenadora)] = set(numeros)
+
+    def exportar(self):
+        with self._lock:
+            return {"proximo": self.proximo,
+                    "pendentes": [[numero, creditos] for numero, (creditos, _) in self.pendentes.items()],
+                    "aplicadas": {coordenadora: [self.pisos.get(coordenadora, 0), sorted(numeros)]
+                                  for coordenadora, numeros in self.aplicadas.items()}}
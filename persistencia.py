@@ -0,0 +1,272 @@
+# persistencia.py / Diário de operações (write-ahead journal) e checkpoints usados pelos servidores para persistir as contas
+import json
+import os
+import threading
+import time
+
+PREFIXO_SEGMENTO = "diario-"
+SUFIXO_SEGMENTO = ".log"
+
+#Garante que uma renomeação/criação dentro da pasta também chegou ao disco
+def sincronizar_pasta(pasta):
+    try:
+        fd = os.open(pasta or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+#O diário parou de aceitar registros depois de uma falha ao gravar (disco cheio, erro de E/S...): nada do que ficou
+#sem gravar pode ser confirmado ao cliente, e a recuperação parte do que já estava no disco
+class DiarioIndisponivel(OSError):
+    pass
+
+#Diário só de acréscimo: cada operação vira uma linha JSON com o estado novo das contas alteradas.
+#As gravações de várias threads que chegam juntas são agrupadas em um único write + fsync (commit em grupo).
+#O diário é dividido em segmentos (diario-<primeiro seq>.log); a cada checkpoint começa um segmento novo
+#e os segmentos antigos que já estão cobertos pelos checkpoints são apagados.
+class Diario:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.ultimo_seq = 0
+        self.seq_duravel = 0
+        self.registros_desde_checkpoint = 0
+        self._pendentes = []
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._arquivo = None
+        self._para_fechar = []
+        self._thread = None
+        self._fechando = False
+        self.falha = None
+
+    def _caminho_segmento(self, primeiro_seq):
+        return os.path.join(self.pasta, f"{PREFIXO_SEGMENTO}{primeiro_seq:012d}{SUFIXO_SEGMENTO}")
+
+    #Lista os segmentos existentes como (primeiro_seq, caminho), em ordem
+    def segmentos(self):
+        if not os.path.isdir(self.pasta):
+            return []
+        lista = []
+        for nome in os.listdir(self.pasta):
+            if nome.startswith(PREFIXO_SEGMENTO) and nome.endswith(SUFIXO_SEGMENTO):
+                try:
+                    primeiro = int(nome[len(PREFIXO_SEGMENTO):-len(SUFIXO_SEGMENTO)])
+                except ValueError:
+                    continue
+                lista.append((primeiro, os.path.join(self.pasta, nome)))
+        lista.sort()
+        return lista
+
+    #Abre um segmento novo para acréscimo e inicia a thread que grava os lotes
+    def abrir(self, ultimo_seq=0):
+        os.makedirs(self.pasta, exist_ok=True)
+        self.ultimo_seq = ultimo_seq
+        self.seq_duravel = ultimo_seq
+        self._arquivo = open(self._caminho_segmento(ultimo_seq + 1), 'ab')
+        sincronizar_pasta(self.pasta)
+        self._fechando = False
+        self.falha = None
+        self._thread = threading.Thread(target=self._escritor, name="diario", daemon=True)
+        self._thread.start()
+
+    #Coloca o registro na fila e devolve o número de sequência; deve ser chamado com a trava das contas
+    #para que a ordem do diário seja a mesma ordem em que as alterações foram aplicadas
+    def registrar(self, registro):
+        with self._cond:
+            self._conferir_falha()
+            self.ultimo_seq += 1
+            seq = self.ultimo_seq
+            registro["seq"] = seq
+            self._pendentes.append(json.dumps(registro, ensure_ascii=False) + "\n")
+            self.registros_desde_checkpoint += 1
+            self._cond.notify_all()
+        self._local.ultimo = seq
+        return seq
+
+    #Seq do último registro feito pela thread atual (0 se ela ainda não registrou nada)
+    def ultimo_registrado(self):
+        return getattr(self._local, "ultimo", 0)
+
+    #Espera até que tudo que a thread atual registrou esteja no disco
+    def confirmar(self):
+        self.aguardar(self.ultimo_registrado())
+
+    def aguardar(self, seq):
+        with self._cond:
+            while self.seq_duravel < seq and self._thread is not None:
+                self._conferir_falha()
+                self._cond.wait()
+
+    #Chamar com self._cond
+    def _conferir_falha(self):
+        if self.falha is not None:
+            raise DiarioIndisponivel(f"diário indisponível depois de uma falha de gravação: {self.falha}")
+
+    #Espera todos os registros pendentes (de todas as threads) serem gravados
+    def esvaziar(self):
+        self.aguardar(self.ultimo_seq)
+
+    #Fecha o segmento atual e começa outro; devolve o último seq que ficou nos segmentos anteriores.
+    #Chamar com a trava das contas, assim o checkpoint tirado logo depois corresponde exatamente a esse seq.
+    def rotacionar(self):
+        with self._cond:
+            self._conferir_falha() # o checkpoint não pode gravar operações que não chegaram ao diário
+            seq = self.ultimo_seq
+            self.registros_desde_checkpoint = 0
+            if self._arquivo is None or os.path.basename(self._arquivo.name) == os.path.basename(self._caminho_segmento(seq + 1)):
+                return seq
+            #Os registros ainda na fila também têm seq <= seq; se forem parar no segmento novo não tem problema,
+            #a recuperação ignora o que já está no checkpoint
+            self._para_fechar.append((self._arquivo, seq))
+            self._arquivo = open(self._caminho_segmento(seq + 1), 'ab')
+        return seq
+
+    #Fecha os segmentos já substituídos assim que o que foi escrito neles estiver no disco
+    def _fechar_segmentos_antigos(self):
+        with self._cond:
+            para_fechar, self._para_fechar = self._para_fechar, []
+        for arquivo, seq in para_fechar:
+            try:
+                self.aguardar(seq)
+            finally:
+                arquivo.close()
+        sincronizar_pasta(self.pasta)
+
+    #Apaga os segmentos cujos registros são todos <= seq (já cobertos por um checkpoint)
+    def descartar_ate(self, seq):
+        self._fechar_segmentos_antigos()
+        segmentos = self.segmentos()
+        for (primeiro, caminho), (proximo, _) in zip(segmentos, segmentos[1:]):
+            if proximo - 1 <= seq:
+                try:
+                    os.remove(caminho)
+                except OSError as e:
+                    print(f"[AVISO] Falha ao remover segmento do diário {caminho}: {e}")
+        sincronizar_pasta(self.pasta)
+
+    def fechar(self):
+        with self._cond:
+            self._fechando = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self._fechar_segmentos_antigos()
+        except DiarioIndisponivel:
+            pass # já avisado pela thread de gravação
+        with self._cond:
+            self._thread = None
+            self._cond.notify_all()
+            if self._arquivo:
+                self._arquivo.close()
+                self._arquivo = None
+
+    #Thread de gravação: pega tudo que acumulou enquanto o fsync anterior rodava e grava de uma vez
+    def _escritor(self):
+        while True:
+            with self._cond:
+                while not self._pendentes and not self._fechando:
+                    self._cond.wait()
+                if not self._pendentes and self._fechando:
+                    return
+                lote = self._pendentes
+                self._pendentes = []
+                seq_lote = self.ultimo_seq
+                arquivo = self._arquivo
+            try:
+                arquivo.write("".join(lote).encode('utf-8'))
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            except Exception as e:
+                #Não dá para saber o que do lote chegou ao disco: ninguém que espera por ele é liberado como gravado
+                print(f"[ERRO FATAL] Falha ao gravar o diário, novas operações serão recusadas: {e}")
+                with self._cond:
+                    self.falha = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self.seq_duravel = seq_lote
+                self._cond.notify_all()
+
+    #Lê, em ordem, os registros com seq maior que a_partir_de. Só os segmentos que podem ter esses registros são abertos,
+    #então o tempo de recuperação depende apenas do que aconteceu depois do checkpoint.
+    def ler(self, a_partir_de=0):
+        segmentos = self.segmentos()
+        for i, (primeiro, caminho) in enumerate(segmentos):
+            if i + 1 < len(segmentos) and segmentos[i + 1][0] - 1 <= a_partir_de:
+                continue
+            with open(caminho, 'rb') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha.decode('utf-8'))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        #Linha cortada por uma queda no meio da gravação: nunca foi confirmada ao cliente
+                        print(f"[AVISO] Registro incompleto no diário {caminho}, ignorando o restante do segmento.")
+                        break
+                    if registro.get("seq", 0) > a_partir_de:
+                        yield registro
+
+#Grava o checkpoint de forma atômica: escreve num arquivo temporário, faz fsync e só então troca pelo atual.
+#O checkpoint anterior é mantido em <arquivo>.anterior para o caso do atual estar danificado.
+def gravar_snapshot(caminho, dados):
+    temporario = caminho + ".tmp"
+    with open(temporario, 'w') as f:
+        json.dump(dados, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(caminho):
+        os.replace(caminho, caminho + ".anterior")
+    os.replace(temporario, caminho)
+    sincronizar_pasta(os.path.dirname(caminho))
+
+#Carrega o checkpoint válido mais novo entre o atual, o temporário (queda durante a troca) e o anterior.
+#campo é a chave que todo arquivo daquele tipo tem ("contas" no contas.json, "chaves" no idempotencia.json...)
+def carregar_snapshot(caminho, campo="contas"):
+    melhor = None
+    for candidato in (caminho, caminho + ".tmp", caminho + ".anterior"):
+        if not os.path.exists(candidato):
+            continue
+        try:
+            with open(candidato, 'r') as f:
+                dados = json.load(f)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError):
+            print(f"[AVISO] Checkpoint {candidato} corrompido ou vazio, ignorando.")
+            continue
+        if not isinstance(dados, dict) or campo not in dados:
+            print(f"[AVISO] Checkpoint {candidato} sem {campo}, ignorando.")
+            continue
+        if melhor is None or dados.get("seq", 0) > melhor[1].get("seq", 0):
+            melhor = (candidato, dados)
+    return melhor
+
+#Thread que grava checkpoints em segundo plano: a cada intervalo ou quando o diário passa de um número de registros
+class Checkpoints:
+    def __init__(self, diario, salvar, intervalo=60, a_cada=1000):
+        self.diario = diario
+        self.salvar = salvar
+        self.intervalo = intervalo
+        self.a_cada = a_cada
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="checkpoints", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _executar(self):
+        ultimo = time.monotonic()
+        while not self._parar.wait(1):
+            pendentes = self.diario.registros_desde_checkpoint
+            if pendentes >= self.a_cada or (pendentes and time.monotonic() - ultimo >= self.intervalo):
+                self.salvar()
+                ultimo = time.monotonic()
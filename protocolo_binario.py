@@ -0,0 +1,297 @@
+# protocolo_binario.py / Protocolo binário opcional do servidor.py, para clientes que são programas (sem texto para montar/ler).
+# O cliente escolhe o modo mandando a linha "BINARIO\n" logo depois de conectar; o servidor responde "[BINARIO] OK\n"
+# e a partir daí os dois lados só trocam quadros. Quem não manda o aperto de mão continua no protocolo em texto.
+#
+# Quadro: tamanho do corpo (uint16) + código da operação (uint8) + corpo, tudo em ordem de rede (big-endian).
+# Pedido:   corpo = campos da operação (FORMATOS_PEDIDO)
+# Resposta: corpo = status (uint8) + campos da resposta (FORMATOS_RESPOSTA se ST_OK, FORMATOS_ERRO caso contrário)
+# Alerta:   OP_ALERTA enviado pelo servidor a qualquer momento (transferência recebida), corpo = FORMATO_ALERTA
+# Campos: "I" número de conta (uint32), "q" valor em centavos (int64), "H" uint16, "s" texto UTF-8 precedido do tamanho (uint16)
+# Chave de idempotência (opcional, veja idempotencia.py): o pedido vai com o código da operação | COM_CHAVE e o corpo
+# começa pela chave ("s"); a resposta volta com o código sem esse bit.
+import socket
+import struct
+
+APERTO_DE_MAO = "BINARIO"
+RESPOSTA_APERTO_DE_MAO = "[BINARIO] OK"
+
+OP_CRIAR = 1
+OP_LOGIN = 2
+OP_SALDO = 3
+OP_DEPOSITAR = 4
+OP_SACAR = 5
+OP_TRANSFERIR = 6
+OP_LOGOUT = 7
+OP_BATCH = 8
+OP_EXTRATO = 9
+OP_RETOMAR = 10
+OP_ALERTA = 0x80
+COM_CHAVE = 0x40
+
+# Nome da operação no protocolo em texto, usado pelo servidor para executar o mesmo código nos dois protocolos
+NOMES_OPERACOES = {OP_CRIAR: "CRIAR", OP_LOGIN: "LOGIN", OP_SALDO: "SALDO", OP_DEPOSITAR: "DEPOSITAR",
+                   OP_SACAR: "SACAR", OP_TRANSFERIR: "TRANSFERIR", OP_LOGOUT: "LOGOUT", OP_BATCH: "BATCH",
+                   OP_EXTRATO: "EXTRATO", OP_RETOMAR: "RETOMAR"}
+
+# Status das operações (também usados pelo servidor para montar as mensagens do protocolo em texto)
+ST_OK = 0
+ST_NAO_LOGADO = 1
+ST_LOGIN_INVALIDO = 2
+ST_CPF_DUPLICADO = 3
+ST_SENHA_INCORRETA = 4
+ST_VALOR_INVALIDO = 5
+ST_SALDO_INSUFICIENTE = 6
+ST_CONTA_INEXISTENTE = 7
+ST_MESMA_CONTA = 8
+ST_LOTE_VAZIO = 9
+ST_LOTE_GRANDE = 10
+ST_MAL_FORMATADO = 11
+ST_DESCONHECIDO = 12
+ST_ERRO = 13
+ST_CHAVE_REUTILIZADA = 14 # chave de idempotência já usada pela conta em um pedido diferente
+ST_SESSAO_INVALIDA = 15   # token de sessão desconhecido ou expirado (RETOMAR)
+ST_LIMITE_PEDIDOS = 16    # a conexão ou a conta passou do limite de comandos por segundo; nada foi executado
+ST_OCUPADO = 17           # servidor com comandos demais na fila; nada foi executado, tente de novo em instantes
+ST_SESSAO_ATIVA = 18      # a conta do LOGIN já está logada em outra conexão; a sessão desta continua como estava
+
+FORMATOS_PEDIDO = {
+    OP_CRIAR: "sss",        # nome, cpf, senha
+    OP_LOGIN: "ss",         # cpf, senha
+    OP_SALDO: "",
+    OP_DEPOSITAR: "q",      # valor
+    OP_SACAR: "qs",         # valor, senha ("" = sem senha, vale a sessão)
+    OP_TRANSFERIR: "Iqs",   # conta de destino, valor, senha ("" = sem senha)
+    OP_LOGOUT: "",
+    OP_EXTRATO: "HHqq",     # movimentos por página, página, início e fim (segundos desde 1970, 0 = sem limite)
+    OP_RETOMAR: "s",        # token de sessão devolvido pelo LOGIN
+    # OP_BATCH: senha + quantidade (uint16) + itens de ITEM_BATCH, codificado à parte
+}
+FORMATOS_RESPOSTA = {
+    OP_CRIAR: "I",          # conta nova
+    OP_LOGIN: "Iss",        # conta, nome, token de sessão
+    OP_RETOMAR: "Is",       # conta, nome
+    OP_SALDO: "q",          # saldo
+    OP_DEPOSITAR: "q",      # saldo novo
+    OP_SACAR: "q",          # saldo novo
+    OP_TRANSFERIR: "q",     # saldo novo
+    OP_LOGOUT: "",
+    OP_BATCH: "qH",         # saldo novo, operações realizadas
+    # OP_EXTRATO: total de movimentos no período (uint32) + quantidade (uint16) + itens de ITEM_EXTRATO, codificado à parte
+}
+FORMATOS_ERRO = {
+    OP_BATCH: "H",          # item do lote que causou a recusa (0 se o problema não é de um item)
+}
+FORMATO_ALERTA = "IsHq"     # conta de origem, nome de quem mandou, quantidade de transferências, total
+
+# Item do BATCH: tipo, conta de destino (0 no depósito), valor
+ITEM_BATCH = struct.Struct("!BIq")
+ITEM_TRANSFERIR = 1
+ITEM_DEPOSITAR = 2
+TIPOS_ITEM = {ITEM_TRANSFERIR: "TRANSFERIR", ITEM_DEPOSITAR: "DEPOSITAR"}
+
+# Item do EXTRATO: horário (segundos desde 1970), tipo, valor (negativo quando sai da conta), saldo depois, outra conta (0 se não houver)
+ITEM_EXTRATO = struct.Struct("!dBqqI")
+TIPOS_MOVIMENTO = {1: "DEPOSITO", 2: "SAQUE", 3: "TRANSFERENCIA_ENVIADA", 4: "TRANSFERENCIA_RECEBIDA"}
+CODIGOS_MOVIMENTO = {nome: codigo for codigo, nome in TIPOS_MOVIMENTO.items()}
+
+CABECALHO = struct.Struct("!HB")
+STATUS = struct.Struct("!B")
+TAMANHO_MAX_CORPO = 0xFFFF
+_NUMEROS = {"I": struct.Struct("!I"), "q": struct.Struct("!q"), "H": struct.Struct("!H")}
+
+def _empacotar(formato, campos):
+    if len(formato) != len(campos):
+        raise ValueError(f"esperados {len(formato)} campos, recebidos {len(campos)}")
+    partes = []
+    for tipo, campo in zip(formato, campos):
+        if tipo == "s":
+            texto = campo.encode('utf-8')
+            partes.append(_NUMEROS["H"].pack(len(texto)) + texto)
+        else:
+            try:
+                partes.append(_NUMEROS[tipo].pack(campo))
+            except struct.error as e:
+                raise ValueError(f"campo fora do limite: {e}")
+    return b"".join(partes)
+
+#Devolve os campos e a posição onde parou; ValueError se o corpo estiver cortado ou com texto inválido
+def _desempacotar(formato, corpo, posicao=0):
+    campos = []
+    try:
+        for tipo in formato:
+            if tipo == "s":
+                tamanho = _NUMEROS["H"].unpack_from(corpo, posicao)[0]
+                posicao += _NUMEROS["H"].size
+                texto = corpo[posicao:posicao + tamanho]
+                if len(texto) != tamanho:
+                    raise ValueError("texto cortado")
+                campos.append(texto.decode('utf-8'))
+                posicao += tamanho
+            else:
+                numero = _NUMEROS[tipo]
+                campos.append(numero.unpack_from(corpo, posicao)[0])
+                posicao += numero.size
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"quadro mal formatado: {e}")
+    return campos, posicao
+
+def _quadro(opcode, corpo):
+    if len(corpo) > TAMANHO_MAX_CORPO:
+        raise ValueError("quadro maior que o permitido")
+    return CABECALHO.pack(len(corpo), opcode) + corpo
+
+#Separa os quadros completos do buffer; devolve [(opcode, corpo), ...] e o que sobrou (quadro ainda incompleto)
+def separar_quadros(buffer):
+    quadros = []
+    posicao = 0
+    while len(buffer) - posicao >= CABECALHO.size:
+        tamanho, opcode = CABECALHO.unpack_from(buffer, posicao)
+        fim = posicao + CABECALHO.size + tamanho
+        if fim > len(buffer):
+            break
+        quadros.append((opcode, buffer[posicao + CABECALHO.size:fim]))
+        posicao = fim
+    return quadros, buffer[posicao:]
+
+# # Lado do cliente: montar pedidos e ler respostas
+def codificar_pedido(opcode, *campos, chave=None):
+    if opcode == OP_BATCH:
+        senha, itens = campos
+        corpo = _empacotar("sH", (senha, len(itens))) + b"".join(ITEM_BATCH.pack(*item) for item in itens)
+    else:
+        corpo = _empacotar(FORMATOS_PEDIDO[opcode], campos)
+    if chave is not None:
+        return _quadro(opcode | COM_CHAVE, _empacotar("s", (chave,)) + corpo)
+    return _quadro(opcode, corpo)
+
+def decodificar_resposta(opcode, corpo):
+    status = STATUS.unpack_from(corpo)[0] if corpo else ST_ERRO
+    if opcode == OP_EXTRATO and status == ST_OK:
+        (total, quantidade), posicao = _desempacotar("IH", corpo, STATUS.size)
+        itens = []
+        for instante, tipo, valor, saldo, outra in ITEM_EXTRATO.iter_unpack(corpo[posicao:posicao + quantidade * ITEM_EXTRATO.size]):
+            itens.append((instante, TIPOS_MOVIMENTO.get(tipo, str(tipo)), valor, saldo, str(outra) if outra else None))
+        return status, [total, itens]
+    formato = FORMATOS_RESPOSTA.get(opcode, "") if status == ST_OK else FORMATOS_ERRO.get(opcode, "")
+    campos, _ = _desempacotar(formato, corpo, STATUS.size)
+    return status, campos
+
+def decodificar_alerta(corpo):
+    return tuple(_desempacotar(FORMATO_ALERTA, corpo)[0])
+
+# # Lado do servidor: ler pedidos e montar respostas
+#Corpo de um pedido com COM_CHAVE: devolve (chave de idempotência, resto do corpo)
+def separar_chave(corpo):
+    (chave,), posicao = _desempacotar("s", corpo)
+    return chave, corpo[posicao:]
+
+def decodificar_pedido(opcode, corpo):
+    if opcode == OP_BATCH:
+        (senha, quantidade), posicao = _desempacotar("sH", corpo)
+        if len(corpo) - posicao != quantidade * ITEM_BATCH.size:
+            raise ValueError("quantidade de itens não confere com o tamanho do quadro")
+        itens = [ITEM_BATCH.unpack_from(corpo, posicao + i * ITEM_BATCH.size) for i in range(quantidade)]
+        return [senha, itens]
+    if opcode not in FORMATOS_PEDIDO:
+        raise KeyError(opcode)
+    campos, posicao = _desempacotar(FORMATOS_PEDIDO[opcode], corpo)
+    if posicao != len(corpo):
+        raise ValueError("sobraram bytes no quadro")
+    return campos
+
+def codificar_resposta(opcode, status, *campos):
+    if opcode == OP_EXTRATO and status == ST_OK:
+        total, itens = campos
+        corpo = _empacotar("IH", (total, len(itens))) + b"".join(ITEM_EXTRATO.pack(*item) for item in itens)
+        return _quadro(opcode, STATUS.pack(status) + corpo)
+    formato = FORMATOS_RESPOSTA.get(opcode, "") if status == ST_OK else FORMATOS_ERRO.get(opcode, "")
+    return _quadro(opcode, STATUS.pack(status) + _empacotar(formato, campos))
+
+def codificar_alerta(origem, nome_origem, quantidade, centavos):
+    return _quadro(OP_ALERTA, _empacotar(FORMATO_ALERTA, (int(origem), nome_origem, quantidade, centavos)))
+
+#Cliente para programas: cada método devolve (status, campos) sem nenhuma mensagem em texto.
+#Alertas que chegarem entre as respostas ficam em self.alertas como (origem, nome, quantidade, centavos).
+class ClienteBinario:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+        self.alertas = []
+        self.sock.sendall((APERTO_DE_MAO + "\n").encode('utf-8'))
+        while b"\n" not in self.buffer:
+            self._receber()
+        linha, self.buffer = self.buffer.split(b"\n", 1)
+        if linha.decode('utf-8', errors='replace').strip() != RESPOSTA_APERTO_DE_MAO:
+            raise ConnectionError(f"servidor não aceitou o protocolo binário: {linha!r}")
+
+    @classmethod
+    def conectar(cls, host, port):
+        return cls(socket.create_connection((host, port)))
+
+    def _receber(self):
+        dados = self.sock.recv(65536)
+        if not dados:
+            raise ConnectionResetError("servidor fechou a conexão")
+        self.buffer += dados
+
+    def _proxima_resposta(self):
+        while True:
+            if len(self.buffer) < CABECALHO.size:
+                self._receber()
+                continue
+            tamanho, opcode = CABECALHO.unpack_from(self.buffer)
+            fim = CABECALHO.size + tamanho
+            if len(self.buffer) >= fim:
+                corpo, self.buffer = self.buffer[CABECALHO.size:fim], self.buffer[fim:]
+                if opcode == OP_ALERTA:
+                    self.alertas.append(decodificar_alerta(corpo))
+                    continue
+                return opcode, corpo
+            self._receber()
+
+    def pedido(self, opcode, *campos, chave=None):
+        self.sock.sendall(codificar_pedido(opcode, *campos, chave=chave))
+        return decodificar_resposta(*self._proxima_resposta())
+
+    #Pipelining: manda todos os pedidos [(opcode, campos...), ...] e devolve as respostas na mesma ordem
+    def enviar_lote(self, pedidos):
+        self.sock.sendall(b"".join(codificar_pedido(*pedido) for pedido in pedidos))
+        return [decodificar_resposta(*self._proxima_resposta()) for _ in pedidos]
+
+    def criar(self, nome, cpf, senha):
+        return self.pedido(OP_CRIAR, nome, cpf, senha)
+
+    #Devolve (status, [conta, nome, token]); o token serve para retomar() numa conexão nova
+    def login(self, cpf, senha):
+        return self.pedido(OP_LOGIN, cpf, senha)
+
+    def retomar(self, token):
+        return self.pedido(OP_RETOMAR, token)
+
+    def saldo(self):
+        return self.pedido(OP_SALDO)
+
+    # As operações que movem dinheiro aceitam uma chave de idempotência: repetir o pedido com a mesma chave
+    # (depois de uma conexão perdida) devolve a resposta da primeira vez sem executar de novo
+    def depositar(self, centavos, chave=None):
+        return self.pedido(OP_DEPOSITAR, centavos, chave=chave)
+
+    def sacar(self, centavos, senha="", chave=None):
+        return self.pedido(OP_SACAR, centavos, senha, chave=chave)
+
+    def transferir(self, conta_destino, centavos, senha="", chave=None):
+        return self.pedido(OP_TRANSFERIR, int(conta_destino), centavos, senha, chave=chave)
+
+    #itens: [(ITEM_TRANSFERIR, conta, centavos) ou (ITEM_DEPOSITAR, 0, centavos), ...]
+    def batch(self, senha, itens, chave=None):
+        return self.pedido(OP_BATCH, senha, itens, chave=chave)
+
+    #Devolve (status, [total no período, [(horário, tipo, valor, saldo, outra conta ou None), ...]])
+    def extrato(self, limite, pagina=1, inicio=0, fim=0):
+        return self.pedido(OP_EXTRATO, limite, pagina, int(inicio), int(fim))
+
+    def logout(self):
+        return self.pedido(OP_LOGOUT)
+
+    def fechar(self):
+        self.sock.close()
@@ -0,0 +1,163 @@
+# protocolo_telnet.py / Leitura do que chega de um cliente telnet (RFC 854/855): separa os comandos IAC do texto digitado
+# e junta o texto em linhas. Cada conexão tem o seu LeitorTelnet, que guarda o estado entre um recv e outro, então uma
+# sequência IAC ou uma linha cortada no meio continuam no próximo pedaço, e várias linhas coladas de uma vez viram
+# várias entradas. O leitor não faz entrada/saída: alimentar() devolve os bytes de resposta da negociação e quem atende
+# a conexão (thread ou asyncio) envia.
+import re
+from collections import deque
+
+# Comandos (RFC 854)
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+
+# Opções (RFC 857 e 858)
+ECHO = 1
+SGA = 3 # suprimir "go ahead"
+
+# Opções que o servidor aceita ligar quando o cliente pede (DO). ECHO só é ligado pelo próprio servidor, nos prompts
+# de senha: com o servidor "fazendo o eco" o cliente para de mostrar o que é digitado, e o servidor não mostra nada.
+OPCOES_SERVIDOR = (SGA,)
+
+# Estados do leitor
+DADOS = 0       # texto digitado
+COMANDO = 1     # depois de um IAC
+OPCAO = 2       # depois de IAC WILL/WONT/DO/DONT, esperando o código da opção
+SUB = 3         # dentro de IAC SB ... (conteúdo ignorado)
+SUB_IAC = 4     # IAC dentro da subnegociação: IAC SE termina, IAC IAC é um 0xFF do conteúdo
+
+# Tamanho máximo de uma linha ainda sem fim (um cliente que manda texto sem parar derruba só a própria conexão)
+TAMANHO_MAX_LINHA = 4096
+
+# Fim de linha no telnet é CR LF ou CR NUL; LF sozinho também é aceito (clientes que não seguem a RFC)
+FIM_DE_LINHA = re.compile(rb"\r\n|\r\x00|\r|\n")
+APAGAR = ("\b", "\x7f")
+
+class LeitorTelnet:
+    def __init__(self):
+        self.linhas = deque() # linhas completas ainda não lidas (já decodificadas, sem o fim de linha)
+        self._estado = DADOS
+        self._verbo = None
+        self._linha = bytearray()
+        self._depois_de_cr = False # o último pedaço terminou em CR: um LF ou NUL no começo do próximo é o mesmo fim de linha
+        self._ligadas = set()      # opções do servidor ligadas (o que o cliente sabe que o servidor faz)
+        self._pendentes = {}       # opção -> estado pedido pelo servidor, esperando a resposta do cliente
+
+    #Processa um pedaço recebido: o texto vai para self.linhas e os comandos são tratados. Devolve os bytes de resposta
+    #da negociação (b"" se não houver). Levanta ValueError se uma linha passar de TAMANHO_MAX_LINHA.
+    def alimentar(self, dados):
+        respostas = bytearray()
+        i = 0
+        tamanho = len(dados)
+        while i < tamanho:
+            estado = self._estado
+            if estado == DADOS:
+                # Todo o texto até o próximo IAC de uma vez
+                fim = dados.find(b"\xff", i)
+                if fim < 0:
+                    fim = tamanho
+                self._texto(dados[i:fim])
+                if fim < tamanho:
+                    self._estado = COMANDO
+                i = fim + 1
+            elif estado == COMANDO:
+                byte = dados[i]
+                i += 1
+                if byte == IAC: # IAC IAC: o byte 0xFF no texto
+                    self._texto(b"\xff")
+                    self._estado = DADOS
+                elif byte in (WILL, WONT, DO, DONT):
+                    self._verbo = byte
+                    self._estado = OPCAO
+                elif byte == SB:
+                    self._estado = SUB
+                else: # NOP, GA, AYT e os outros comandos de dois bytes não mudam nada aqui
+                    self._estado = DADOS
+            elif estado == OPCAO:
+                respostas += self._negociar(self._verbo, dados[i])
+                i += 1
+                self._estado = DADOS
+            elif estado == SUB:
+                fim = dados.find(b"\xff", i)
+                if fim < 0:
+                    break
+                self._estado = SUB_IAC
+                i = fim + 1
+            else:
+                self._estado = DADOS if dados[i] == SE else SUB
+                i += 1
+        return bytes(respostas)
+
+    def _texto(self, pedaco):
+        if self._depois_de_cr and pedaco:
+            self._depois_de_cr = False
+            if pedaco[0] in (0, 10):
+                pedaco = pedaco[1:]
+        partes = FIM_DE_LINHA.split(pedaco)
+        self._linha += partes[0]
+        for parte in partes[1:]:
+            self._fechar_linha()
+            self._linha += parte
+        if len(self._linha) > TAMANHO_MAX_LINHA:
+            raise ValueError(f"linha maior que {TAMANHO_MAX_LINHA} bytes")
+        if pedaco.endswith(b"\r"):
+            self._depois_de_cr = True
+
+    def _fechar_linha(self):
+        linha = self._linha.decode('utf-8', errors='replace')
+        self._linha.clear()
+        # Clientes em modo caractere mandam o backspace em vez de apagar na tela
+        if any(letra in linha for letra in APAGAR):
+            letras = []
+            for letra in linha:
+                if letra in APAGAR:
+                    if letras:
+                        letras.pop()
+                else:
+                    letras.append(letra)
+            linha = "".join(letras)
+        self.linhas.append(linha)
+
+    #Resposta a um WILL/WONT/DO/DONT do cliente. Só responde quando o estado muda (RFC 854), então um cliente que repete
+    #o pedido não entra em laço com o servidor.
+    def _negociar(self, verbo, opcao):
+        if verbo in (WILL, WONT):
+            # O servidor não usa nenhuma opção do lado do cliente
+            return bytes((IAC, DONT, opcao)) if verbo == WILL else b""
+        ligar = verbo == DO
+        if opcao in self._pendentes: # resposta a um pedido do servidor
+            if self._pendentes.pop(opcao) and ligar:
+                self._ligadas.add(opcao)
+            else:
+                self._ligadas.discard(opcao)
+            return b""
+        if ligar == (opcao in self._ligadas):
+            return b""
+        if ligar and opcao in OPCOES_SERVIDOR:
+            self._ligadas.add(opcao)
+            return bytes((IAC, WILL, opcao))
+        self._ligadas.discard(opcao)
+        return bytes((IAC, WONT, opcao))
+
+    #Pedido do servidor para ligar/desligar uma opção dele; devolve os bytes para enviar (b"" se já está assim)
+    def _pedir(self, opcao, ligar):
+        if self._pendentes.get(opcao, opcao in self._ligadas) == ligar:
+            return b""
+        self._pendentes[opcao] = ligar
+        if ligar:
+            self._ligadas.add(opcao)
+        else:
+            self._ligadas.discard(opcao)
+        return bytes((IAC, WILL if ligar else WONT, opcao))
+
+    #Antes de um prompt de senha: o cliente para de mostrar o que é digitado
+    def ocultar_eco(self):
+        return self._pedir(ECHO, True)
+
+    #Antes dos outros prompts: o cliente volta a mostrar o que é digitado
+    def mostrar_eco(self):
+        return self._pedir(ECHO, False)
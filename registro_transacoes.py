@@ -0,0 +1,354 @@
+# registro_transacoes.py / Log de transações gravado em segundo plano: quem chama só coloca a linha na fila.
+# O arquivo ativo (transacoes.log) é rotacionado por tamanho ou idade: vira transacoes.log.000001, .000002, ... e é
+# compactado com gzip numa thread separada (transacoes.log.000001.gz). ler_registros() percorre todos os segmentos
+# em ordem, um de cada vez, para auditorias e conciliações sem carregar o histórico na memória.
+import argparse
+import gzip
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+# Modos de durabilidade do log:
+#   "buffer" - escreve no arquivo e deixa o sistema decidir quando ir para o disco (mais rápido)
+#   "flush"  - esvazia o buffer do Python a cada lote (uma queda do processo não perde o que já foi gravado)
+#   "fsync"  - faz fsync a cada lote (uma queda da máquina não perde o que já foi gravado)
+MODOS_DURABILIDADE = ("buffer", "flush", "fsync")
+# Rotação do arquivo ativo: tamanho máximo em bytes e idade máxima em segundos (None = sem limite)
+TAMANHO_SEGMENTO = 64 * 1024 * 1024
+IDADE_SEGMENTO = 24 * 60 * 60
+
+FORMATO_HORARIO = "%Y-%m-%d %H:%M:%S"
+_LINHA = re.compile(r"\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] ([A-Z_]+):? ?(.*)")
+_CONTAS = re.compile(r"(?:Conta |C:)(\d+)")
+_SEGMENTO = re.compile(r"\.(\d{6})(\.gz)?$")
+
+#Segmentos já rotacionados do log, do mais antigo para o mais novo: [(número, caminho), ...]. Se a compactação
+#foi interrompida e existem as duas versões, vale a que não é .gz (a compactação é refeita na próxima inicialização).
+def segmentos_rotacionados(caminho):
+    pasta, base = os.path.split(caminho)
+    encontrados = {}
+    for nome in os.listdir(pasta or "."):
+        if not nome.startswith(base + "."):
+            continue
+        marca = _SEGMENTO.search(nome[len(base):])
+        if marca and marca.start() == 0:
+            numero = int(marca.group(1))
+            if numero not in encontrados or not marca.group(2):
+                encontrados[numero] = os.path.join(pasta, nome)
+    return sorted(encontrados.items())
+
+#Compacta um segmento rotacionado: grava o .gz temporário, troca pelo definitivo e só então apaga o original
+def compactar_segmento(caminho):
+    destino = caminho + ".gz"
+    with open(caminho, 'rb') as origem, gzip.open(destino + ".tmp", 'wb') as compactado:
+        shutil.copyfileobj(origem, compactado, 1024 * 1024)
+    os.replace(destino + ".tmp", destino)
+    os.remove(caminho)
+    return destino
+
+def _abrir_segmento(caminho):
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, 'rt', encoding='utf-8', errors='replace')
+    return open(caminho, 'r', encoding='utf-8', errors='replace')
+
+def _primeiro_horario(caminho):
+    try:
+        with _abrir_segmento(caminho) as f:
+            marca = _LINHA.match(f.readline())
+    except OSError:
+        return None
+    return datetime.strptime(marca.group(1), FORMATO_HORARIO) if marca else None
+
+#Lê o log inteiro (segmentos rotacionados e o ativo) como um gerador de registros
+#{"horario": datetime, "tipo": "DEPOSITO", "contas": ["100"], "mensagem": "...", "segmento": caminho}.
+#inicio/fim (datetime, fim exclusivo), conta e tipos filtram; só uma linha fica na memória por vez e segmentos
+#inteiros antes de "inicio" são pulados olhando só a primeira linha do segmento seguinte.
+def ler_registros(caminho, inicio=None, fim=None, conta=None, tipos=None):
+    arquivos = [arquivo for _, arquivo in segmentos_rotacionados(caminho)]
+    if os.path.exists(caminho):
+        arquivos.append(caminho)
+    if inicio is not None:
+        while len(arquivos) > 1:
+            seguinte = _primeiro_horario(arquivos[1])
+            if seguinte is None or seguinte >= inicio:
+                break
+            arquivos.pop(0)
+    for arquivo in arquivos:
+        with _abrir_segmento(arquivo) as f:
+            for linha in f:
+                marca = _LINHA.match(linha)
+                if not marca:
+                    continue
+                horario = datetime.strptime(marca.group(1), FORMATO_HORARIO)
+                if inicio is not None and horario < inicio:
+                    continue
+                if fim is not None and horario >= fim:
+                    return
+                tipo = marca.group(2)
+                if tipos and tipo not in tipos:
+                    continue
+                contas = _CONTAS.findall(marca.group(3))
+                if conta is not None and conta not in contas:
+                    continue
+                yield {"horario": horario, "tipo": tipo, "contas": contas, "mensagem": marca.group(3).rstrip("\n"), "segmento": arquivo}
+
+#Fila + thread de gravação. O arquivo fica aberto o tempo todo e as linhas acumuladas são gravadas juntas
+#a cada "intervalo" segundos ou assim que a fila chega a "tamanho_lote" linhas.
+#Registrar nunca espera (é chamado com as travas das contas pegas): com a fila cheia (disco lento) as linhas novas do
+#log são descartadas e contadas nas estatísticas.
+#Com um Extrato (extrato.py), os movimentos que acompanham cada linha são gravados no mesmo lote, pela mesma thread.
+#Movimentos nunca são descartados (o extrato é o histórico da conta): mesmo sem a linha do log eles entram na fila, e
+#quem registrou chama aguardar_vaga() depois de soltar as travas, esperando enquanto houver mais de "max_movimentos"
+#movimentos por gravar.
+class RegistroTransacoes:
+    def __init__(self, caminho, intervalo=0.2, tamanho_lote=512, modo="flush", max_fila=100000, limite_atraso=1.0, extrato=None,
+                 tamanho_segmento=TAMANHO_SEGMENTO, idade_segmento=IDADE_SEGMENTO, max_movimentos=100000):
+        if modo not in MODOS_DURABILIDADE:
+            raise ValueError(f"modo de durabilidade inválido: {modo}")
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.modo = modo
+        self.max_fila = max_fila
+        self.limite_atraso = limite_atraso
+        self.extrato = extrato
+        self.tamanho_segmento = tamanho_segmento
+        self.idade_segmento = idade_segmento
+        self.max_movimentos = max_movimentos
+        # Contadores: linhas gravadas, descartadas (fila cheia) e gravadas depois de limite_atraso segundos na fila, e
+        # lotes em que a escrita no log ou no extrato falhou
+        self.gravados = 0
+        self.descartados = 0
+        self.erros_gravacao = 0
+        self.atrasados = 0
+        self.rotacoes = 0
+        self._aceitos = 0
+        self._processados = 0
+        self._movimentos_fila = 0
+        self._fila = []
+        self._em_gravacao = 0
+        self._cond = threading.Condition()
+        self._arquivo = None
+        self._thread = None
+        self._fechando = False
+        self._pressa = False
+        self._aberto_em = None
+        self._compactacoes = []
+        self._segundo_formatado = (None, "")
+
+    def iniciar(self):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._abrir_ativo()
+        # Segmentos que ficaram sem compactar (o servidor caiu antes da thread terminar)
+        pendentes = [arquivo for _, arquivo in segmentos_rotacionados(self.caminho) if not arquivo.endswith(".gz")]
+        if pendentes:
+            self._compactar(pendentes)
+        if self.extrato is not None:
+            self.extrato.abrir()
+        self._fechando = False
+        self._thread = threading.Thread(target=self._escritor, name="registro-transacoes", daemon=True)
+        self._thread.start()
+
+    def _abrir_ativo(self):
+        self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+        primeiro = _primeiro_horario(self.caminho)
+        self._aberto_em = primeiro.timestamp() if primeiro else time.time()
+
+    #Fecha o arquivo ativo, renomeia para o próximo número de segmento e abre um novo. Só a thread de gravação chama.
+    #Se a troca de nome falhar (EXDEV, EACCES, disco cheio...), o ativo é reaberto como estava: o log continua sendo
+    #gravado nele e a rotação é tentada de novo depois do próximo lote.
+    def _rotacionar(self):
+        existentes = segmentos_rotacionados(self.caminho)
+        numero = existentes[-1][0] + 1 if existentes else 1
+        segmento = f"{self.caminho}.{numero:06d}"
+        self._arquivo.close()
+        try:
+            os.replace(self.caminho, segmento)
+        finally:
+            self._abrir_ativo()
+        self.rotacoes += 1
+        self._compactar([segmento])
+
+    def _compactar(self, arquivos):
+        def compactar():
+            for arquivo in arquivos:
+                try:
+                    compactar_segmento(arquivo)
+                except OSError as e:
+                    print(f"[ERRO] Falha ao compactar {arquivo}: {e}")
+        thread = threading.Thread(target=compactar, name="compactar-log", daemon=True)
+        thread.start()
+        self._compactacoes = [t for t in self._compactacoes if t.is_alive()] + [thread]
+
+    def _precisa_rotacionar(self):
+        if self.tamanho_segmento and self._arquivo.tell() >= self.tamanho_segmento:
+            return True
+        return bool(self.idade_segmento) and time.time() - self._aberto_em >= self.idade_segmento
+
+    #Linhas esperando para serem gravadas
+    @property
+    def profundidade(self):
+        return len(self._fila)
+
+    #Só guarda o horário, a mensagem e os movimentos do extrato; a formatação e a escrita ficam para a thread de gravação
+    def registrar(self, mensagem, movimentos=()):
+        self.registrar_varios([mensagem], [movimentos])
+
+    #movimentos: uma lista de movimentos do extrato para cada mensagem (ou None se não houver nenhum)
+    def registrar_varios(self, mensagens, movimentos=None):
+        if movimentos is None:
+            movimentos = [()] * len(mensagens)
+        with self._cond:
+            # O horário é pego com a fila travada, assim os horários ficam em ordem no arquivo (o extrato depende disso)
+            agora = time.time()
+            espaco = self.max_fila - len(self._fila)
+            entradas = [(agora, mensagem, movs or ()) for mensagem, movs in zip(mensagens, movimentos)]
+            if espaco < len(entradas):
+                # Sem vaga a linha do log é descartada; os movimentos dela continuam na fila (sem mensagem)
+                aceitas = max(espaco, 0)
+                self.descartados += len(entradas) - aceitas
+                entradas[aceitas:] = [(agora, None, movs) for _, _, movs in entradas[aceitas:] if movs]
+            estava_vazia = not self._fila
+            self._fila.extend(entradas)
+            self._aceitos += len(entradas)
+            self._movimentos_fila += sum(len(movs) for _, _, movs in entradas)
+            if estava_vazia or len(self._fila) >= self.tamanho_lote:
+                self._cond.notify_all()
+
+    #Espera (sem travas pegas) enquanto há mais de max_movimentos movimentos do extrato esperando gravação
+    def aguardar_vaga(self):
+        if self._movimentos_fila <= self.max_movimentos:
+            return
+        with self._cond:
+            while self._movimentos_fila > self.max_movimentos and self._thread is not None:
+                self._pressa = True
+                self._cond.notify_all()
+                self._cond.wait(self.intervalo)
+
+    #Espera tudo que já está na fila ser gravado
+    def esvaziar(self):
+        with self._cond:
+            self._cond.notify_all()
+            while (self._fila or self._em_gravacao) and self._thread is not None:
+                self._cond.wait(self.intervalo)
+
+    #Espera só o que já estava na fila quando foi chamada (o EXTRATO usa para mostrar as operações que a sessão
+    #acabou de fazer); a thread grava na hora em vez de esperar o lote encher
+    def esperar_gravacao(self):
+        with self._cond:
+            alvo = self._aceitos
+            self._pressa = True
+            self._cond.notify_all()
+            while self._processados < alvo and self._thread is not None:
+                self._cond.wait(self.intervalo)
+
+    def fechar(self):
+        with self._cond:
+            self._fechando = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._arquivo:
+            self._arquivo.close()
+            self._arquivo = None
+        for thread in self._compactacoes:
+            thread.join()
+        self._compactacoes = []
+        if self.extrato is not None:
+            self.extrato.fechar()
+
+    def estatisticas(self):
+        return {"fila": self.profundidade, "gravados": self.gravados, "descartados": self.descartados,
+                "erros_gravacao": self.erros_gravacao, "atrasados": self.atrasados, "rotacoes": self.rotacoes,
+                "movimentos_fila": self._movimentos_fila}
+
+    #O strftime só é refeito quando o segundo muda
+    def _formatar_horario(self, instante):
+        segundo = int(instante)
+        if self._segundo_formatado[0] != segundo:
+            self._segundo_formatado = (segundo, datetime.fromtimestamp(segundo).strftime(FORMATO_HORARIO))
+        return self._segundo_formatado[1]
+
+    def _escritor(self):
+        while True:
+            with self._cond:
+                while not self._fila and not self._fechando:
+                    self._cond.wait()
+                #Dá um tempo para a fila juntar mais linhas, a não ser que o lote já esteja cheio
+                prazo = time.monotonic() + self.intervalo
+                while len(self._fila) < self.tamanho_lote and not self._fechando and not self._pressa:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                lote, self._fila = self._fila, []
+                self._pressa = False
+                self._em_gravacao = len(lote)
+                fechando = self._fechando
+            if lote:
+                agora = time.time()
+                falhou = False
+                texto = "".join(f"[{self._formatar_horario(instante)}] {mensagem}\n" for instante, mensagem, _ in lote
+                                if mensagem is not None)
+                try:
+                    self._arquivo.write(texto)
+                    if self.modo != "buffer":
+                        self._arquivo.flush()
+                    if self.modo == "fsync":
+                        os.fsync(self._arquivo.fileno())
+                except Exception as e:
+                    falhou = True
+                    print(f"[ERRO] Falha ao escrever no log: {e}")
+                try:
+                    if self._precisa_rotacionar():
+                        self._rotacionar()
+                except Exception as e: # as linhas já estão no arquivo ativo, só a rotação ficou para depois
+                    print(f"[ERRO] Falha ao rotacionar o log: {e}")
+                if self.extrato is not None:
+                    try:
+                        self.extrato.anexar([(instante, mov) for instante, _, movs in lote for mov in movs], self.modo)
+                    except Exception as e:
+                        falhou = True
+                        print(f"[ERRO] Falha ao escrever no extrato: {e}")
+                self.atrasados += sum(1 for instante, mensagem, _ in lote if mensagem is not None and agora - instante > self.limite_atraso)
+                with self._cond:
+                    self.erros_gravacao += falhou
+                    self.gravados += sum(1 for _, mensagem, _ in lote if mensagem is not None)
+                    self._processados += len(lote)
+                    self._movimentos_fila -= sum(len(movs) for _, _, movs in lote)
+                    self._em_gravacao = 0
+                    self._cond.notify_all()
+            if fechando and not lote:
+                self._arquivo.flush()
+                return
+
+#Consulta do log pela linha de comando, ex.: python3 registro_transacoes.py --conta 100 --tipo DEPOSITO --desde 2025-01-01
+def main():
+    parser = argparse.ArgumentParser(description="Lê o log de transações (todos os segmentos, compactados ou não)")
+    parser.add_argument("--log", default=os.path.join("logs", "transacoes.log"), help="arquivo ativo do log")
+    parser.add_argument("--desde", help="AAAA-MM-DD[ HH:MM:SS], inclusive")
+    parser.add_argument("--ate", help="AAAA-MM-DD[ HH:MM:SS], exclusivo")
+    parser.add_argument("--conta", help="só linhas que citam a conta")
+    parser.add_argument("--tipo", action="append", help="DEPOSITO, SAQUE, TRANSFERENCIA, LOTE, CONTA_CRIADA (pode repetir)")
+    parser.add_argument("--contar", action="store_true", help="mostra só a quantidade por tipo")
+    opcoes = parser.parse_args()
+
+    def horario(texto):
+        return datetime.fromisoformat(texto) if texto else None
+
+    por_tipo = {}
+    for registro in ler_registros(opcoes.log, horario(opcoes.desde), horario(opcoes.ate), opcoes.conta, opcoes.tipo):
+        por_tipo[registro["tipo"]] = por_tipo.get(registro["tipo"], 0) + 1
+        if not opcoes.contar:
+            print(f"[{registro['horario']:{FORMATO_HORARIO}}] {registro['tipo']}: {registro['mensagem']}")
+    for tipo, quantidade in sorted(por_tipo.items()):
+        print(f"[LOGS] {tipo}: {quantidade}")
+
+if __name__ == "__main__":
+    main()
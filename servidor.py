@@ -1,270 +1,791 @@
 # servidor.py / Arquivo que será alocado na máquina virtual - tentar iniciar em uma VM depois
-import socket
-import json
+# Um processo só, com um motor só (banco.py) e uma porta para cada protocolo: o protocolo em linhas (texto, ou binário
+# depois do aperto de mão) e, com --porta-telnet, o menu do telnet (telnet.py). Com --particoes N, um processo por
+# partição das contas, todos nas mesmas portas (veja particoes.py e supervisionar).
 import os
+import sys
+import signal
+import subprocess
+import socket
 import threading # multiplas conexões
-from datetime import datetime # Para log de transações
-
-PASTA_DADOS = "dados"
-PASTA_LOGS = "logs"
-ARQUIVO_CONTAS = os.path.join(PASTA_DADOS, "contas.json")
-ARQUIVO_LOG = os.path.join(PASTA_LOGS, "transacoes.log")
-
-# # Estruturas
-contas = {}
-cpf_para_conta = {}
-conexoes_ativas = {}
-
-# Aloca as threads no sistema
-contas_lock = threading.Lock()
-conexoes_lock = threading.Lock()
-
-# Funções para carregar e salvar contas
-def carregar_contas():
-    global contas, cpf_para_conta
-    with contas_lock:
-        if os.path.exists(ARQUIVO_CONTAS):
-            try:
-                with open(ARQUIVO_CONTAS, 'r') as f:
-                    dados = json.load(f)
-                    contas = dados.get("contas", {})
-                    cpf_para_conta = dados.get("cpf_salvos", {})
-                print(f"[INFO] Contas carregadas de {ARQUIVO_CONTAS}")
-            except json.JSONDecodeError:
-                print(f"[AVISO] Arquivo {ARQUIVO_CONTAS} corrompido ou vazio.")
-                contas, cpf_para_conta = {}, {}
-        else:
-            print("[INFO] Arquivo de contas não encontrado. Começando do zero.")
-            contas, cpf_para_conta = {}, {}
-
-# Função para salvar contas
-def salvar_contas():
-    try:
-        with open(ARQUIVO_CONTAS, 'w') as f:
-            dados = {"contas": contas, "cpf_salvos": cpf_para_conta}
-            json.dump(dados, f, indent=4)
-    except Exception as e:
-        print(f"[ERRO FATAL] Falha ao salvar contas: {e}")
+import asyncio # modo com um único event loop para muitas conexões
+import argparse
+import hmac
+import time
+from datetime import datetime, timedelta
+import banco
+import telnet
+from banco import (metricas, diario, conexoes_abertas_metrica, conexoes_recusadas, executar_operacao, tempo_comando,
+                   enviar_notificacoes, atualizar_sessao, remover_sessao, nova_fila, novo_balde, comando_admitido,
+                   comando_admitido_async, ociosas, OPERACOES_SEM_LOGIN, MAX_ITENS_BATCH, ITENS_EXTRATO, MAX_ITENS_EXTRATO)
+from persistencia import DiarioIndisponivel
+from registro_transacoes import MODOS_DURABILIDADE
+from extrato import descrever_movimento
+from armazem import para_centavos, formatar_centavos
+from metricas import servir_metricas
+from fila_saida import SocketTravado, POLITICAS
+from particoes import PASTA_PARTICOES, conferir_configuracao
 
-#Função para logar transações
-def log_transacao(mensagem):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        with open(ARQUIVO_LOG, 'a') as f:
-            f.write(f"[{timestamp}] {mensagem}\n")
-    except Exception as e:
-        print(f"[ERRO] Falha ao escrever no log: {e}")
+from protocolo_binario import (APERTO_DE_MAO, RESPOSTA_APERTO_DE_MAO, NOMES_OPERACOES, TIPOS_ITEM,
+                               OP_CRIAR, OP_LOGIN, OP_SACAR, OP_TRANSFERIR, OP_LOGOUT, OP_BATCH, OP_EXTRATO, OP_RETOMAR,
+                               ITEM_DEPOSITAR,
+                               CODIGOS_MOVIMENTO,
+                               ST_OK, ST_NAO_LOGADO, ST_LOGIN_INVALIDO, ST_CPF_DUPLICADO, ST_SENHA_INCORRETA,
+                               ST_VALOR_INVALIDO, ST_SALDO_INSUFICIENTE, ST_CONTA_INEXISTENTE, ST_MESMA_CONTA,
+                               ST_LOTE_VAZIO, ST_LOTE_GRANDE, ST_MAL_FORMATADO, ST_DESCONHECIDO, ST_ERRO,
+                               ST_CHAVE_REUTILIZADA, ST_SESSAO_INVALIDA, ST_LIMITE_PEDIDOS, ST_OCUPADO, ST_SESSAO_ATIVA, COM_CHAVE, separar_chave, separar_quadros, decodificar_pedido, codificar_resposta, codificar_alerta, CABECALHO)
 
-# Função para enviar notificações a clientes conectados (necessário recarregar a página ativa)
-def enviar_notificacao(num_conta_destino, mensagem):
-    with conexoes_lock:
-        if num_conta_destino in conexoes_ativas:
-            conn_destino = conexoes_ativas[num_conta_destino]
-            try:
-                #Envia a log que a notificação foi enviada
-                conn_destino.sendall(mensagem.encode('utf-8'))
-                print(f"[NOTIFICACAO] Alerta enviado para conta {num_conta_destino}.")
-            except Exception as e:
-                print(f"[ERRO] Falha ao enviar notificação para {num_conta_destino}: {e}")
 
-#Função para processar comandos dos clientes
+# Protocolo em linhas: tamanho de cada leitura do socket e tamanho máximo de um comando sem "\n"
+TAMANHO_LEITURA = 4096
+TAMANHO_MAX_COMANDO = 64 * 1024
+# Métricas: porta local do endpoint em texto (None = desligado) e senha do comando STATS (None = comando desativado)
+HOST_METRICAS = "127.0.0.1"
+PORTA_METRICAS = None
+SENHA_ADMIN = None
+# Opções dos sockets das conexões (os dois protocolos): TCP_NODELAY envia cada resposta na hora, sem o Nagle segurar um
+# envio pequeno até chegar o ACK do anterior (com o ACK atrasado do cliente são ~40 ms por passo); SO_KEEPALIVE faz o
+# sistema perceber clientes que sumiram sem fechar a conexão; buffers de envio/recepção em bytes (None = padrão do sistema)
+TCP_NODELAY = True
+KEEPALIVE = True
+BUFFER_ENVIO = None
+BUFFER_RECEPCAO = None
+# SO_KEEPALIVE: segundos sem tráfego até a primeira sonda, segundos entre sondas e sondas sem resposta até o sistema
+# dar a conexão como perdida (o padrão do Linux é 2 horas até a primeira; com estes valores, ~2 minutos no total)
+KEEPALIVE_OCIOSO = 60
+KEEPALIVE_INTERVALO = 10
+KEEPALIVE_TENTATIVAS = 5
+# Modo com threads: segundos que o laço do accept espera uma vaga (uma conexão terminar) quando o limite de conexões
+# foi atingido; passando disso, as conexões que chegarem são recusadas na hora até abrir uma vaga
+ESPERA_VAGA = 0.5
+# Modo com threads: o accept acorda a cada tantos segundos. O Ctrl+C (SIGINT) pode cair numa thread de atendimento, e
+# a thread principal só vê o KeyboardInterrupt quando o accept bloqueado retorna
+ESPERA_ACCEPT = 1.0
+LOTADO = "[FALHA] Servidor lotado, tente novamente mais tarde.\n".encode('utf-8')
+# Aviso para quem teve a conexão encerrada pela roda de ociosas (veja ociosidade.py), logado ou não
+OCIOSA = "[OCIOSO] Conexão encerrada por inatividade.\n".encode('utf-8')
+SEM_LOGIN = "[OCIOSO] Tempo para entrar numa conta esgotado, conexão encerrada.\n".encode('utf-8')
+# Modo particionado: segundos mínimos entre duas subidas da mesma partição (uma que cai ao subir não fica em laço)
+REINICIO_PARTICAO = 2
+
+# Alertas são (conta de origem, nome de quem mandou, quantidade de transferências, total em centavos); a fila de saída
+# de cada conexão usa a função que transforma o alerta nos bytes do seu protocolo
+def formatar_alerta(alerta):
+    origem, nome_origem, quantidade, total = alerta
+    if quantidade == 1:
+        return f"[ALERTA] Você recebeu uma transferência de {nome_origem} (Conta: {origem}) no valor de R$ {formatar_centavos(total)}."
+    return f"[ALERTA] Você recebeu {quantidade} transferências de {nome_origem} (Conta: {origem}) no total de R$ {formatar_centavos(total)}."
+
+def codificar_alerta_texto(alerta):
+    return (formatar_alerta(alerta) + "\n").encode('utf-8')
+
+def codificar_alerta_binario(alerta):
+    return codificar_alerta(*alerta)
+
+# # Protocolo em texto
+# Mensagem de cada (operação, status); valor/saldo/total em centavos são formatados em reais antes
+MENSAGENS_TEXTO = {
+    ("CRIAR", ST_OK): "[CONTAS] Conta {conta} criada para {nome}.",
+    ("CRIAR", ST_CPF_DUPLICADO): "[FALHA] CPF já cadastrado.",
+    ("LOGIN", ST_OK): "[LOGIN]|{nome}|{conta}|{token}",
+    ("LOGIN", ST_LOGIN_INVALIDO): "[LOGIN] CPF ou senha incorretos.",
+    ("RETOMAR", ST_OK): "[RETOMAR]|{nome}|{conta}",
+    ("RETOMAR", ST_SESSAO_INVALIDA): "[RETOMAR] Sessão inválida ou expirada. Faça LOGIN de novo.",
+    ("SALDO", ST_OK): "[SALDO] Saldo: R$ {saldo}",
+    ("DEPOSITAR", ST_OK): "[DEPOSITO] Depósito de R$ {valor} realizado. Novo saldo: R$ {saldo}",
+    ("DEPOSITAR", ST_VALOR_INVALIDO): "[DEPOSITO] Valor inválido: deve ser positivo e o saldo não pode passar do máximo.",
+    ("SACAR", ST_OK): "[SUCESSO] Saque de R$ {valor} realizado. Novo saldo: R$ {saldo}",
+    ("SACAR", ST_SENHA_INCORRETA): "[SACAR] Senha incorreta.",
+    ("SACAR", ST_VALOR_INVALIDO): "[SACAR] O valor deve ser positivo.",
+    ("SACAR", ST_SALDO_INSUFICIENTE): "[SACAR] Saldo insuficiente.",
+    ("TRANSFERIR", ST_OK): "[TRANSFERÊNCIA] Transferência de R$ {valor} para {nome_destino} (Conta: {destino}) realizada.",
+    ("TRANSFERIR", ST_CONTA_INEXISTENTE): "[TRANSFERÊNCIA] Conta de destino não existe.",
+    ("TRANSFERIR", ST_MESMA_CONTA): "[TRANSFERÊNCIA] Não pode transferir para si mesmo.",
+    ("TRANSFERIR", ST_SENHA_INCORRETA): "[TRANSFERÊNCIA] Senha incorreta.",
+    ("TRANSFERIR", ST_VALOR_INVALIDO): "[TRANSFERÊNCIA] Valor inválido: deve ser positivo e o saldo do destino não pode passar do máximo.",
+    ("TRANSFERIR", ST_SALDO_INSUFICIENTE): "[TRANSFERÊNCIA] Saldo insuficiente.",
+    ("BATCH", ST_OK): "[BATCH] {quantidade} operações realizadas. Novo saldo: R$ {saldo}",
+    ("BATCH", ST_SENHA_INCORRETA): "[BATCH] Senha incorreta.",
+    ("BATCH", ST_LOTE_VAZIO): "[BATCH] Formato: BATCH|Senha|TRANSFERIR:ContaDestino:Valor|DEPOSITAR:Valor|...",
+    ("BATCH", ST_LOTE_GRANDE): "[BATCH] No máximo " + str(MAX_ITENS_BATCH) + " operações por lote.",
+    ("BATCH", ST_CONTA_INEXISTENTE): "[BATCH] Item {item}: conta de destino não existe.",
+    ("BATCH", ST_MESMA_CONTA): "[BATCH] Item {item}: não pode transferir para si mesmo.",
+    ("BATCH", ST_VALOR_INVALIDO): "[BATCH] Item {item}: valor inválido (deve ser positivo e nenhum saldo pode passar do máximo). Nenhuma operação foi realizada.",
+    ("BATCH", ST_SALDO_INSUFICIENTE): "[BATCH] Saldo insuficiente no item {item}. Nenhuma operação foi realizada.",
+    ("EXTRATO", ST_VALOR_INVALIDO): "[EXTRATO] Use de 1 a " + str(MAX_ITENS_EXTRATO) + " movimentos por página, página a partir de 1 e a data final depois da inicial.",
+    ("LOGOUT", ST_OK): "[DESLOGAR] Você saiu da sua conta.",
+}
+MENSAGENS_GERAIS = {
+    ST_NAO_LOGADO: "[LOGIN] Você precisa estar logado para esta operação.",
+    ST_MAL_FORMATADO: "[FALHA] Comando mal formatado ou valor inválido.",
+    ST_DESCONHECIDO: "[FALHA] Comando desconhecido.",
+    ST_ERRO: "[FALHA] Erro inesperado no servidor: {erro}",
+    ST_CHAVE_REUTILIZADA: "[FALHA] Chave de idempotência já usada em outro pedido.",
+    ST_LIMITE_PEDIDOS: "[LIMITE] Muitos comandos em pouco tempo, aguarde um instante e tente de novo.",
+    ST_OCUPADO: "[OCUPADO] Servidor ocupado, tente de novo em instantes.",
+    ST_SESSAO_ATIVA: "[LOGIN] Essa conta já está logada em outra conexão.",
+}
+FORMATOS_TEXTO = {"CRIAR": "[CONTAS] Formato: CRIAR|Nome Completo|CPF|Senha", "LOGIN": "[LOGIN] Formato: LOGIN|CPF|Senha",
+                  "RETOMAR": "[RETOMAR] Formato: RETOMAR|Token"}
+# Quantidade de campos (depois da operação) de cada comando de FORMATOS_TEXTO
+CAMPOS_TEXTO = {"CRIAR": 3, "LOGIN": 2, "RETOMAR": 1}
+
+def formatar_resposta(operacao, status, dados):
+    if operacao == "EXTRATO" and status == ST_OK:
+        return formatar_extrato_texto(dados)
+    campos = {chave: formatar_centavos(valor) if chave in ("valor", "saldo") else valor for chave, valor in dados.items()}
+    modelo = MENSAGENS_TEXTO.get((operacao, status)) or MENSAGENS_GERAIS[status]
+    return modelo.format(**campos)
+
+# O extrato também vai em uma linha só, com os movimentos separados por "; "
+def formatar_extrato_texto(dados):
+    cabecalho = f"[EXTRATO] Página {dados['pagina']} de {dados['paginas']} ({dados['total']} movimentos)"
+    if not dados["movimentos"]:
+        return cabecalho + ": nenhum movimento."
+    itens = []
+    for mov in dados["movimentos"]:
+        sinal = "+" if mov["valor"] > 0 else ""
+        itens.append(f"{datetime.fromtimestamp(mov['t']):%Y-%m-%d %H:%M:%S} {descrever_movimento(mov)} "
+                     f"{sinal}{formatar_centavos(mov['valor'])} (saldo R$ {formatar_centavos(mov['saldo'])})")
+    return cabecalho + ": " + "; ".join(itens)
+
+# EXTRATO, EXTRATO|Quantidade[|Página] ou EXTRATO|AAAA-MM-DD|AAAA-MM-DD[|Página] (os dois dias entram no período)
+def argumentos_extrato_texto(campos):
+    if len(campos) >= 2 and "-" in campos[0]:
+        inicio = datetime.strptime(campos[0].strip(), "%Y-%m-%d")
+        fim = datetime.strptime(campos[1].strip(), "%Y-%m-%d") + timedelta(days=1)
+        pagina = int(campos[2]) if len(campos) > 2 else 1
+        return (ITENS_EXTRATO, pagina, inicio.timestamp(), fim.timestamp())
+    limite = int(campos[0]) if campos else ITENS_EXTRATO
+    pagina = int(campos[1]) if len(campos) > 1 else 1
+    return (limite, pagina, None, None)
+
+#Converte os campos do comando em texto nos argumentos da operação (ValueError/IndexError se estiver mal formatado).
+#A senha de SACAR/TRANSFERIR é opcional: a sessão já foi autenticada no LOGIN (ou RETOMAR).
+def argumentos_texto(operacao, partes):
+    if operacao in ("CRIAR", "LOGIN", "RETOMAR"):
+        return tuple(partes[1:1 + CAMPOS_TEXTO[operacao]])
+    if operacao == "DEPOSITAR":
+        return (para_centavos(partes[1]),)
+    if operacao == "SACAR":
+        return (para_centavos(partes[1]), partes[2] if len(partes) > 2 else None)
+    if operacao == "TRANSFERIR":
+        return (partes[1], para_centavos(partes[2]), partes[3] if len(partes) > 3 else None)
+    if operacao == "BATCH":
+        return (partes[1], partes[2:])
+    if operacao == "EXTRATO":
+        return argumentos_extrato_texto(partes[1:])
+    return ()
+
+# Itens do BATCH em texto: TRANSFERIR:ContaDestino:Valor ou DEPOSITAR:Valor. Devolve a lista ou a mensagem de erro.
+def itens_batch_texto(itens, num_conta_logada):
+    operacoes = []
+    for n, item in enumerate(itens, 1):
+        campos = item.split(':')
+        tipo = campos[0].upper()
+        try:
+            if tipo == "TRANSFERIR" and len(campos) == 3:
+                operacoes.append((tipo, campos[1], para_centavos(campos[2])))
+            elif tipo == "DEPOSITAR" and len(campos) == 2:
+                operacoes.append((tipo, num_conta_logada, para_centavos(campos[1])))
+            else:
+                return f"[BATCH] Item {n} mal formatado: {item}"
+        except ValueError:
+            return f"[BATCH] Item {n}: valor inválido."
+    return operacoes
+
+
+# Chave de idempotência opcional antes do comando: ID=chave|DEPOSITAR|50 (veja idempotencia.py)
+PREFIXO_CHAVE = "ID="
+
+#Separa a chave de idempotência do comando: devolve (chave ou None, comando sem ela)
+def separar_chave_texto(comando):
+    comando = comando.strip()
+    if comando[:len(PREFIXO_CHAVE)].upper() != PREFIXO_CHAVE:
+        return None, comando
+    chave, _, resto = comando.partition('|')
+    return chave[len(PREFIXO_CHAVE):], resto
+
+#Resposta de um comando recusado na admissão (veja admissao.py): nada foi executado
+def recusar_comando(comando, status):
+    return (MENSAGENS_GERAIS[status], ("NO_CHANGE", None, None), [])
+
+#Se o diário falhar antes de gravar a operação, a resposta vira ST_ERRO: nada que não está no disco é confirmado
 def processar_comando(comando, num_conta_logada):
+    inicio = time.perf_counter()
+    chave, comando = separar_chave_texto(comando)
+    resultado = executar_comando(comando, num_conta_logada, chave)
+    try:
+        diario.confirmar()
+    except DiarioIndisponivel as e:
+        print(f"[ERRO] {e}")
+        return (MENSAGENS_GERAIS[ST_ERRO].format(erro="diário indisponível"), ("NO_CHANGE", None, None), [])
+    tempo_comando(comando.split('|', 1)[0].strip().upper(), "texto").observar(time.perf_counter() - inicio)
+    return resultado
+
+#STATS|SenhaAdmin: resumo das métricas em uma linha, só com a senha dada em --senha-admin
+def comando_stats(partes):
+    if SENHA_ADMIN is None:
+        return "[STATS] Comando desativado. Inicie o servidor com --senha-admin."
+    if len(partes) != 2 or not hmac.compare_digest(partes[1].encode('utf-8'), SENHA_ADMIN.encode('utf-8')):
+        print("[STATS] Senha de administrador incorreta.")
+        return "[STATS] Senha de administrador incorreta."
+    return f"[STATS] {metricas.resumo()}"
+
+#Toda leitura dos comandos inseridos: devolve (resposta em texto, estado_retorno, [(conta, alerta), ...])
+def executar_comando(comando, num_conta_logada, chave=None):
     partes = comando.strip().split('|')
     operacao = partes[0].upper()
     estado_retorno = ("NO_CHANGE", None, None)
-    notificacao = None
 
-#Toda lógica de operações e leitura dos comandos inseridos
-    with contas_lock:
-        if operacao == "CRIAR":
-            try:
-                nome, cpf, senha = partes[1], partes[2], partes[3]
-                if cpf in cpf_para_conta:
-                    print(f"[FALHA-CRIAR] CPF {cpf} já cadastrado.")
-                    return ("[FALHA] CPF já cadastrado.", estado_retorno, notificacao)
-                
-                num_conta = str(len(contas) + 100)
-                contas[num_conta] = {"nome": nome, "cpf": cpf, "senha": senha, "saldo": 0.0}
-                cpf_para_conta[cpf] = num_conta
-                salvar_contas()
-                
-                print(f"[CONTAS] Conta {num_conta} criada para {nome} (CPF: {cpf[:3]}.***.{cpf[-3:]})")
-                log_transacao(f"CONTA_CRIADA: Conta {num_conta}, Nome: {nome}, CPF: {cpf[:3]}.***.{cpf[-3:]}")
-                return (f"[CONTAS] Conta {num_conta} criada para {nome}.", estado_retorno, notificacao)
-            except IndexError:
-                return ("[CONTAS] Formato: CRIAR|Nome Completo|CPF|Senha", estado_retorno, notificacao)
-
-# # LEMBRETE - Fazer lógica para não conseguir logar na conta que já está em outra sessão # #
-        elif operacao == "LOGIN":
-            try:
-                cpf, senha = partes[1], partes[2]
-                if cpf not in cpf_para_conta:
-                    print(f"[LOGIN] CPF não encontrado: {cpf[:3]}.***")
-                    return ("[LOGIN] CPF ou senha incorretos.", estado_retorno, notificacao)
-                
-                num_conta = cpf_para_conta[cpf]
-                if contas[num_conta]["senha"] == senha:
-                    nome = contas[num_conta]["nome"]
-                    estado_retorno = ("LOGIN", num_conta, nome)
-                    print(f"[LOGIN] Usuário {nome} (Conta: {num_conta}) logou.")
-                    return (f"[LOGIN]|{nome}|{num_conta}", estado_retorno, notificacao)
-                else:
-                    print(f"[LOGIN] Senha incorreta para CPF {cpf[:3]}.***")
-                    return ("[LOGIN] CPF ou senha incorretos.", estado_retorno, notificacao)
-            except IndexError:
-                return ("[LOGIN] Formato: LOGIN|CPF|Senha", estado_retorno, notificacao)
+    if operacao == "STATS":
+        return (comando_stats(partes), estado_retorno, [])
+    if operacao not in OPERACOES_SEM_LOGIN and num_conta_logada is None:
+        return (MENSAGENS_GERAIS[ST_NAO_LOGADO], estado_retorno, [])
+    try:
+        argumentos = argumentos_texto(operacao, partes)
+        if operacao in FORMATOS_TEXTO and len(argumentos) < CAMPOS_TEXTO[operacao]:
+            return (FORMATOS_TEXTO[operacao], estado_retorno, [])
+        if operacao == "BATCH":
+            operacoes = itens_batch_texto(argumentos[1], num_conta_logada)
+            if isinstance(operacoes, str):
+                return (operacoes, estado_retorno, [])
+            argumentos = (argumentos[0], operacoes)
+    except (IndexError, ValueError):
+        return (MENSAGENS_GERAIS[ST_MAL_FORMATADO], estado_retorno, [])
 
-        if num_conta_logada is None:
-            return ("[LOGIN] Você precisa estar logado para esta operação.", estado_retorno, notificacao)
+    status, dados, estado_retorno = executar_operacao(operacao, argumentos, num_conta_logada, chave)
+    return (formatar_resposta(operacao, status, dados), estado_retorno, dados.get("alertas", []))
 
-        try:
-            if operacao == "SALDO":
-                saldo = contas[num_conta_logada]["saldo"]
-                return (f"[SALDO] Saldo: R$ {saldo:.2f}", estado_retorno, notificacao)
-            elif operacao == "DEPOSITAR":
-                valor = float(partes[1])
-                if valor <= 0:
-                    return ("[DEPOSITO] O valor deve ser positivo.", estado_retorno, notificacao)
-                contas[num_conta_logada]["saldo"] += valor
-                saldo_atual = contas[num_conta_logada]["saldo"]
-                salvar_contas()
-                log_transacao(f"DEPOSITO: Sucesso - Conta {num_conta_logada}, Valor: {valor:.2f}, Saldo Novo: {saldo_atual:.2f}")
-                print(f"[DEPOSITO] Conta {num_conta_logada} depositou R$ {valor:.2f}.")
-                return (f"[DEPOSITO] Depósito de R$ {valor:.2f} realizado. Novo saldo: R$ {saldo_atual:.2f}", estado_retorno, notificacao)
-            
-            elif operacao == "SACAR":
-                valor, senha = float(partes[1]), partes[2]
-                if contas[num_conta_logada]["senha"] != senha:
-                    return ("[SACAR] Senha incorreta.", estado_retorno, notificacao)
-                if valor <= 0:
-                    return ("[SACAR] O valor deve ser positivo.", estado_retorno, notificacao)
-                if contas[num_conta_logada]["saldo"] < valor:
-                    print(f"[SACAR] Saldo insuficiente para C:{num_conta_logada} (Tenta: {valor:.2f}, Tem: {contas[num_conta_logada]['saldo']:.2f})")
-                    return ("[SACAR] Saldo insuficiente.", estado_retorno, notificacao)
-                contas[num_conta_logada]["saldo"] -= valor
-                saldo_atual = contas[num_conta_logada]["saldo"]
-                salvar_contas()
-                log_transacao(f"SAQUE: Sucesso - Conta {num_conta_logada}, Valor: {valor:.2f}, Saldo Novo: {saldo_atual:.2f}")
-                print(f"[SACAR] Conta {num_conta_logada} sacou R$ {valor:.2f}.")
-                return (f"[SUCESSO] Saque de R$ {valor:.2f} realizado. Novo saldo: R$ {saldo_atual:.2f}", estado_retorno, notificacao)
-            
-            elif operacao == "TRANSFERIR":
-                c_destino, valor, senha = partes[1], float(partes[2]), partes[3]
-                
-                if c_destino not in contas:
-                    return ("[TRANSFERÊNCIA] Conta de destino não existe.", estado_retorno, notificacao)
-                if c_destino == num_conta_logada:
-                    return ("[TRANSFERÊNCIA] Não pode transferir para si mesmo.", estado_retorno, notificacao)
-                if contas[num_conta_logada]["senha"] != senha:
-                    return ("[TRANSFERÊNCIA] Senha incorreta.", estado_retorno, notificacao)
-                if valor <= 0:
-                    return ("[TRANSFERÊNCIA] O valor deve ser positivo.", estado_retorno, notificacao)
-                if contas[num_conta_logada]["saldo"] < valor:
-                    print(f"[TRANSFERÊNCIA] Saldo insuficiente para C:{num_conta_logada} (Tenta: {valor:.2f}, Tem: {contas[num_conta_logada]['saldo']:.2f})")
-                    return ("[TRANSFERÊNCIA] Saldo insuficiente.", estado_retorno, notificacao)
-                
-                contas[num_conta_logada]["saldo"] -= valor
-                contas[c_destino]["saldo"] += valor
-                nome_origem = contas[num_conta_logada]["nome"]
-                nome_destino = contas[c_destino]["nome"]
-                salvar_contas()
-                
-                print(f"[TRANSFERÊNCIA] {nome_origem} (C:{num_conta_logada}) -> {nome_destino} (C:{c_destino}), Valor: R$ {valor:.2f}")
-                log_transacao(f"TRANSFERENCIA: Sucesso - R$ {valor:.2f} de C:{num_conta_logada} ({nome_origem}) para C:{c_destino} ({nome_destino})")
-
-                mensagem_notificacao = f"[ALERTA] Você recebeu uma transferência de {nome_origem} (Conta: {num_conta_logada}) no valor de R$ {valor:.2f}."
-                notificacao = (c_destino, mensagem_notificacao)
-                
-                return (f"[TRANSFERÊNCIA] Transferência de R$ {valor:.2f} para {nome_destino} (Conta: {c_destino}) realizada.", estado_retorno, notificacao)
-            
-            elif operacao == "LOGOUT":
-                estado_retorno = ("LOGOUT", None, None)
-                print(f"[DESLOGAR] Usuário {contas[num_conta_logada]['nome']} (Conta: {num_conta_logada}) deslogou.")
-                return ("[DESLOGAR] Você saiu da sua conta.", estado_retorno, notificacao)
+# # Protocolo binário (protocolo_binario.py): mesmas operações, campos já convertidos, resposta só com números
+def argumentos_binario(opcode, campos, num_conta_logada):
+    if opcode == OP_SACAR:
+        valor, senha = campos
+        return (valor, senha or None)
+    if opcode == OP_TRANSFERIR:
+        c_destino, valor, senha = campos
+        return (str(c_destino), valor, senha or None)
+    if opcode == OP_BATCH:
+        senha, itens = campos
+        operacoes = []
+        for tipo, c_destino, valor in itens:
+            if tipo not in TIPOS_ITEM:
+                raise ValueError(f"tipo de item desconhecido: {tipo}")
+            operacoes.append((TIPOS_ITEM[tipo], num_conta_logada if tipo == ITEM_DEPOSITAR else str(c_destino), valor))
+        return (senha, operacoes)
+    if opcode == OP_EXTRATO:
+        limite, pagina, inicio, fim = campos
+        return (limite, pagina, inicio or None, fim or None)
+    return tuple(campos)
 
-            else:
-                return ("[FALHA] Comando desconhecido.", estado_retorno, notificacao)
-        
-        except (IndexError, ValueError):
-            return ("[FALHA] Comando mal formatado ou valor inválido.", estado_retorno, notificacao)
-        except Exception as e:
-            print(f"[ERRO] {e}")
-            return (f"[FALHA] Erro inesperado no servidor: {e}", estado_retorno, notificacao)
+def campos_resposta_binaria(opcode, status, dados):
+    if status != ST_OK:
+        return (dados.get("item", 0),) if opcode == OP_BATCH else ()
+    if opcode == OP_CRIAR:
+        return (int(dados["conta"]),)
+    if opcode == OP_LOGIN:
+        return (int(dados["conta"]), dados["nome"], dados["token"])
+    if opcode == OP_RETOMAR:
+        return (int(dados["conta"]), dados["nome"])
+    if opcode == OP_BATCH:
+        return (dados["saldo"], dados["quantidade"])
+    if opcode == OP_EXTRATO:
+        return (dados["total"], [(mov["t"], CODIGOS_MOVIMENTO[mov["tipo"]], mov["valor"], mov["saldo"], int(mov["contraparte"] or 0))
+                                 for mov in dados["movimentos"]])
+    if opcode == OP_LOGOUT:
+        return ()
+    return (dados["saldo"],)
+
+#Devolve (quadro de resposta, estado_retorno, [(conta, alerta), ...]) - também só depois de gravado no diário
+def processar_binario(opcode, corpo, num_conta_logada):
+    with tempo_comando(NOMES_OPERACOES.get(opcode & ~COM_CHAVE), "binario").medir():
+        return executar_binario(opcode, corpo, num_conta_logada)
+
+def recusar_binario(opcode, corpo, status):
+    opcode &= ~COM_CHAVE
+    return (codificar_resposta(opcode, status, *campos_resposta_binaria(opcode, status, {})), ("NO_CHANGE", None, None), [])
+
+def executar_binario(opcode, corpo, num_conta_logada):
+    estado_retorno = ("NO_CHANGE", None, None)
+    chave = None
+    try:
+        if opcode & COM_CHAVE:
+            opcode &= ~COM_CHAVE
+            chave, corpo = separar_chave(corpo)
+        operacao = NOMES_OPERACOES[opcode]
+        argumentos = argumentos_binario(opcode, decodificar_pedido(opcode, corpo), num_conta_logada)
+    except KeyError:
+        return (codificar_resposta(opcode, ST_DESCONHECIDO), estado_retorno, [])
+    except ValueError:
+        return (codificar_resposta(opcode, ST_MAL_FORMATADO, *campos_resposta_binaria(opcode, ST_MAL_FORMATADO, {})), estado_retorno, [])
+
+    status, dados, estado_retorno = executar_operacao(operacao, argumentos, num_conta_logada, chave)
+    try:
+        diario.confirmar()
+    except DiarioIndisponivel as e:
+        print(f"[ERRO] {e}")
+        return (codificar_resposta(opcode, ST_ERRO, *campos_resposta_binaria(opcode, ST_ERRO, {})), ("NO_CHANGE", None, None), [])
+    return (codificar_resposta(opcode, status, *campos_resposta_binaria(opcode, status, dados)), estado_retorno, dados.get("alertas", []))
 
-#Função para lidar com cada cliente conectado
+# Protocolo: cada comando e cada resposta/alerta é uma linha terminada em "\n". O cliente pode mandar vários
+# comandos de uma vez (pipelining); as respostas voltam na mesma ordem.
+def separar_comandos(buffer):
+    *linhas, resto = buffer.split(b"\n")
+    comandos = [linha.decode('utf-8', errors='replace').rstrip("\r") for linha in linhas]
+    return [comando for comando in comandos if comando.strip()], resto
+
+#Função para lidar com cada cliente conectado. Se a primeira linha for "BINARIO", a conexão passa a usar
+#o protocolo binário (protocolo_binario.py); senão segue no protocolo em texto.
 def handle_client(conn, addr):
     print(f"[NOVA CONEXAO] {addr} conectado.")
+    conexoes_abertas_metrica.incrementar()
+    # Respostas saem por esta thread e alertas pelo escritor da fila de saída, cada sendall inteiro
+    conn = SocketTravado(conn)
+    fila = nova_fila(codificar_alerta_texto)
+    fila.usar_thread(conn, derrubar=lambda: derrubar_conexao(conn))
+    balde = novo_balde()
+    vigia = ociosas.vigiar(lambda forcar: encerrar_parada(conn, forcar))
     num_conta_logada = None
     nome_logado = None
-    
+    buffer = b""
+    binario = None # None enquanto a primeira linha não chegou
+
     try:
         while True:
-            data = conn.recv(1024).decode('utf-8')
+            data = conn.recv(TAMANHO_LEITURA)
             if not data:
-                print(f"[CONEXAO PERDIDA] {addr} desconectou.")
+                if vigia.expirou:
+                    aviso = aviso_parada(vigia, addr, num_conta_logada)
+                    if not binario:
+                        conn.sendall(aviso)
+                else:
+                    print(f"[CONEXAO PERDIDA] {addr} desconectou.")
                 break
-            
-            print(f"[{addr} | C:{num_conta_logada or 'N/A'}] Comando: {data}")
-            
-            resposta, novo_estado, notificacao = processar_comando(data, num_conta_logada)
-            
-            if novo_estado[0] == "LOGIN":
-                num_conta_logada, nome_logado = novo_estado[1], novo_estado[2]
-                with conexoes_lock:
-                    conexoes_ativas[num_conta_logada] = conn
-            elif novo_estado[0] == "LOGOUT":
-                with conexoes_lock:
-                    if num_conta_logada in conexoes_ativas:
-                        del conexoes_ativas[num_conta_logada]
-                num_conta_logada, nome_logado = None, None
-            
-            conn.sendall(resposta.encode('utf-8'))
-            
-            if notificacao:
-                enviar_notificacao(notificacao[0], notificacao[1])
+            buffer += data
 
-    except (ConnectionResetError, BrokenPipeError):
+            if binario is None:
+                if b"\n" not in buffer:
+                    if len(buffer) > TAMANHO_MAX_COMANDO:
+                        print(f"[FALHA] {addr} mandou um comando maior que {TAMANHO_MAX_COMANDO} bytes, encerrando.")
+                        break
+                    continue
+                primeira, resto = buffer.split(b"\n", 1)
+                binario = primeira.decode('utf-8', errors='replace').strip().upper() == APERTO_DE_MAO
+                if binario:
+                    print(f"[BINARIO] {addr} usando o protocolo binário.")
+                    fila.codificar = codificar_alerta_binario
+                    conn.sendall((RESPOSTA_APERTO_DE_MAO + "\n").encode('utf-8'))
+                    buffer = resto
+
+            # Todas as respostas dos comandos que chegaram juntos vão em um único envio
+            respostas = []
+            notificacoes = []
+            if binario:
+                quadros, buffer = separar_quadros(buffer)
+                for opcode, corpo in quadros:
+                    resposta, novo_estado, notificacoes_comando = comando_admitido(processar_binario, recusar_binario, balde,
+                                                                                   num_conta_logada, opcode, corpo)
+                    sessao = atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila)
+                    if sessao is None:
+                        resposta = recusar_binario(opcode, corpo, ST_SESSAO_ATIVA)[0]
+                    else:
+                        num_conta_logada, nome_logado = sessao
+                    respostas.append(resposta)
+                    notificacoes.extend(notificacoes_comando)
+            else:
+                comandos, buffer = separar_comandos(buffer)
+                if len(buffer) > TAMANHO_MAX_COMANDO:
+                    print(f"[FALHA] {addr} mandou um comando maior que {TAMANHO_MAX_COMANDO} bytes, encerrando.")
+                    break
+                for comando in comandos:
+                    print(f"[{addr} | C:{num_conta_logada or 'N/A'}] Comando: {comando}")
+                    resposta, novo_estado, notificacoes_comando = comando_admitido(processar_comando, recusar_comando, balde,
+                                                                                   num_conta_logada, comando)
+                    sessao = atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila)
+                    if sessao is None:
+                        resposta = recusar_comando(comando, ST_SESSAO_ATIVA)[0]
+                    else:
+                        num_conta_logada, nome_logado = sessao
+                    respostas.append((resposta + "\n").encode('utf-8'))
+                    notificacoes.extend(notificacoes_comando)
+
+            vigia.atividade(num_conta_logada is not None)
+            if respostas:
+                conn.sendall(b"".join(respostas))
+
+            if notificacoes:
+                enviar_notificacoes(notificacoes)
+
+    except (ConnectionResetError, BrokenPipeError, OSError):
         print(f"[CONEXAO FECHADA] {addr} desconectou.")
     finally:
-        if num_conta_logada:
-            with conexoes_lock:
-                if num_conta_logada in conexoes_ativas:
-                    del conexoes_ativas[num_conta_logada]
-                    print(f"[LIMPEZA] Conexão ativa de {nome_logado} (C:{num_conta_logada}) removida.")
+        ociosas.remover(vigia)
+        remover_sessao(num_conta_logada, nome_logado, fila)
+        conexoes_abertas_metrica.decrementar()
         conn.close()
 
+#Chamado pela roda de ociosas: acorda o recv da conexão parada, que volta vazio como se o cliente tivesse saído.
+#forcar (o atendimento não saiu depois do primeiro aviso, preso mandando algo para quem não lê) fecha o envio também.
+def encerrar_parada(conn, forcar):
+    try:
+        conn.shutdown(socket.SHUT_RDWR if forcar else socket.SHUT_RD)
+    except OSError:
+        pass
+
+def aviso_parada(vigia, addr, num_conta_logada):
+    print(f"[OCIOSO] {addr} (C:{num_conta_logada or 'N/A'}) encerrada: " + ("inatividade." if vigia.logado else "sem login no prazo."))
+    return OCIOSA if vigia.logado else SEM_LOGIN
+
+# Política "desconectar": o recv do atendimento volta vazio e a conexão é encerrada normalmente
+def derrubar_conexao(conn):
+    print("[NOTIFICACAO] Cliente não está lendo os alertas, derrubando a conexão.")
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+# Mesmo atendimento do handle_client, mas sem uma thread por conexão: a conexão ociosa fica só esperando no event loop
+# e os comandos (que podem esperar travas e o diário) rodam num pool pequeno de threads
+async def handle_client_async(reader, writer):
+    addr = writer.get_extra_info("peername")
+    if conexoes_abertas_metrica.valor >= banco.MAX_CONEXOES:
+        print(f"[LOTADO] Limite de {banco.MAX_CONEXOES} conexões atingido, recusando {addr}.")
+        conexoes_recusadas.incrementar()
+        writer.write(LOTADO)
+        writer.close()
+        return
+
+    conexoes_abertas_metrica.incrementar()
+    print(f"[NOVA CONEXAO] {addr} conectado.")
+    loop = asyncio.get_running_loop()
+    fila = nova_fila(codificar_alerta_texto)
+    escritor_alertas = fila.usar_loop(loop, writer, derrubar=lambda: loop.call_soon_threadsafe(writer.transport.abort))
+    balde = novo_balde()
+    vigia = ociosas.vigiar(lambda forcar: loop.call_soon_threadsafe(writer.transport.abort if forcar else reader.feed_eof))
+    num_conta_logada = None
+    nome_logado = None
+    binario = None
+
+    try:
+        while True:
+            if binario:
+                try:
+                    tamanho, opcode = CABECALHO.unpack(await reader.readexactly(CABECALHO.size))
+                    corpo = await reader.readexactly(tamanho)
+                except asyncio.IncompleteReadError:
+                    if vigia.expirou:
+                        aviso_parada(vigia, addr, num_conta_logada)
+                    else:
+                        print(f"[CONEXAO PERDIDA] {addr} desconectou.")
+                    break
+                resposta, novo_estado, notificacoes = await comando_admitido_async(loop, processar_binario, recusar_binario, balde,
+                                                                                   num_conta_logada, opcode, corpo)
+                sessao = atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila)
+                if sessao is None:
+                    resposta = recusar_binario(opcode, corpo, ST_SESSAO_ATIVA)[0]
+                else:
+                    num_conta_logada, nome_logado = sessao
+                writer.write(resposta)
+            else:
+                try:
+                    linha = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError:
+                    if vigia.expirou:
+                        writer.write(aviso_parada(vigia, addr, num_conta_logada))
+                    else:
+                        print(f"[CONEXAO PERDIDA] {addr} desconectou.")
+                    break
+                except asyncio.LimitOverrunError:
+                    print(f"[FALHA] {addr} mandou um comando maior que {TAMANHO_MAX_COMANDO} bytes, encerrando.")
+                    break
+
+                data = linha.decode('utf-8', errors='replace').rstrip("\r\n")
+                if binario is None:
+                    binario = data.strip().upper() == APERTO_DE_MAO
+                    if binario:
+                        print(f"[BINARIO] {addr} usando o protocolo binário.")
+                        fila.codificar = codificar_alerta_binario
+                        writer.write((RESPOSTA_APERTO_DE_MAO + "\n").encode('utf-8'))
+                        continue
+                if not data.strip():
+                    continue
+
+                print(f"[{addr} | C:{num_conta_logada or 'N/A'}] Comando: {data}")
+
+                resposta, novo_estado, notificacoes = await comando_admitido_async(loop, processar_comando, recusar_comando, balde,
+                                                                                   num_conta_logada, data)
+                sessao = atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila)
+                if sessao is None:
+                    resposta = recusar_comando(data, ST_SESSAO_ATIVA)[0]
+                else:
+                    num_conta_logada, nome_logado = sessao
+                writer.write((resposta + "\n").encode('utf-8'))
+
+            vigia.atividade(num_conta_logada is not None)
+            await writer.drain()
+
+            if notificacoes:
+                enviar_notificacoes(notificacoes)
+
+    except (ConnectionResetError, BrokenPipeError):
+        print(f"[CONEXAO FECHADA] {addr} desconectou.")
+    finally:
+        ociosas.remover(vigia)
+        conexoes_abertas_metrica.decrementar()
+        remover_sessao(num_conta_logada, nome_logado, fila)
+        escritor_alertas.cancel()
+        writer.close()
+
+#Opções de cada conexão aceita (todos os protocolos): Nagle, keepalive com os tempos configurados e buffers
+def ajustar_socket(sock):
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(TCP_NODELAY))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(KEEPALIVE))
+    if KEEPALIVE and hasattr(socket, "TCP_KEEPIDLE"): # Linux; nos outros sistemas ficam os tempos padrão
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_OCIOSO)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVALO)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_TENTATIVAS)
+    if BUFFER_ENVIO:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUFFER_ENVIO)
+    if BUFFER_RECEPCAO:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_RECEPCAO)
+
+# No asyncio a conexão chega já como reader/writer; o socket é ajustado antes do atendimento começar
+def com_socket_ajustado(atendimento):
+    async def atender(reader, writer):
+        ajustar_socket(writer.get_extra_info("socket"))
+        await atendimento(reader, writer)
+    return atender
+
+# Atendimento de cada protocolo: (modo com threads, modo asyncio, resposta para quem chega com o servidor lotado)
+PROTOCOLOS = {"tcp": (handle_client, handle_client_async, LOTADO),
+              "telnet": (telnet.handle_client, telnet.handle_client_async, telnet.LOTADO)}
+
+async def servir_async(host, ouvintes):
+    servidores = []
+    for protocolo, port in ouvintes:
+        server = await asyncio.start_server(com_socket_ajustado(PROTOCOLOS[protocolo][1]), host, port, backlog=1024,
+                                            limit=TAMANHO_MAX_COMANDO, reuse_port=banco.PARTICOES > 1)
+        print(f"[CONEXÃO] Servidor IFBank (asyncio, {protocolo}) ativo em {host}:{port} - até {banco.MAX_CONEXOES} conexões")
+        servidores.append(server)
+    await asyncio.gather(*(server.serve_forever() for server in servidores))
+
+# Modo com threads: cada porta tem uma thread aceitando conexões, e cada conexão ganha a sua thread, no máximo
+# banco.MAX_CONEXOES ao mesmo tempo (vagas é dividido entre as portas). Com todas as vagas ocupadas, a conexão aceita
+# espera uma vaga por até ESPERA_VAGA, e enquanto isso as próximas ficam na fila do sistema; sem vaga ela é recusada
+# com a mensagem de lotado, e as seguintes também, na hora, até abrir uma vaga (em vez de esperarem até desistir).
+def aceitar_conexoes(server_socket, protocolo, vagas):
+    atendimento, _, lotado = PROTOCOLOS[protocolo]
+    espera = ESPERA_VAGA
+    server_socket.settimeout(ESPERA_ACCEPT) # a conexão aceita continua bloqueante
+    while True:
+        try:
+            conn, addr = server_socket.accept()
+        except socket.timeout:
+            continue
+        except OSError: # socket fechado no desligamento
+            return
+        ajustar_socket(conn)
+        if not vagas.acquire(timeout=espera):
+            recusar_conexao(conn, addr, lotado)
+            espera = 0
+            continue
+        espera = ESPERA_VAGA
+        try:
+            threading.Thread(target=atender_na_vaga, args=(atendimento, conn, addr, vagas)).start()
+        except RuntimeError: # o sistema não deixou criar mais threads
+            vagas.release()
+            recusar_conexao(conn, addr, lotado)
+
+def atender_na_vaga(atendimento, conn, addr, vagas):
+    try:
+        atendimento(conn, addr)
+    finally:
+        vagas.release()
+
+def recusar_conexao(conn, addr, lotado):
+    print(f"[LOTADO] Limite de {banco.MAX_CONEXOES} conexões atingido, recusando {addr}.")
+    conexoes_recusadas.incrementar()
+    try:
+        conn.sendall(lotado)
+    except OSError:
+        pass
+    conn.close()
+
+# Opções de linha de comando: python3 servidor.py [--asyncio] [--porta-telnet N] [--max-conexoes N] [--porta-metricas N] [--senha-admin S]
+#                             [--taxa-conexao N] [--taxa-conta N] [--limite-fila-comandos N] ...
+# A porta digitada atende o protocolo do script (servidor.py = tcp, servidor-telnet.py = telnet); --porta-tcp e
+# --porta-telnet abrem a porta do outro protocolo no mesmo processo.
+def ler_opcoes():
+    global PORTA_METRICAS, SENHA_ADMIN, TCP_NODELAY, KEEPALIVE, BUFFER_ENVIO, BUFFER_RECEPCAO
+    global KEEPALIVE_OCIOSO, KEEPALIVE_INTERVALO, KEEPALIVE_TENTATIVAS
+    parser = argparse.ArgumentParser(description="Servidor IFBank")
+    parser.add_argument("--asyncio", action="store_true", help="atende todas as conexões em um único event loop")
+    parser.add_argument("--porta-tcp", type=int, default=None, help="também atende o protocolo em linhas (texto/binário) nesta porta")
+    parser.add_argument("--porta-telnet", type=int, default=None, help="também atende o menu do telnet nesta porta")
+    parser.add_argument("--max-conexoes", type=int, default=banco.MAX_CONEXOES, help="limite de conexões simultâneas (no modo com threads, de threads de atendimento)")
+    parser.add_argument("--taxa-conexao", type=float, default=banco.TAXA_COMANDOS_CONEXAO, help="comandos por segundo de cada conexão (0 = sem limite)")
+    parser.add_argument("--rajada-conexao", type=int, default=banco.RAJADA_COMANDOS_CONEXAO, help="comandos seguidos que uma conexão pode mandar acima da taxa")
+    parser.add_argument("--taxa-conta", type=float, default=banco.TAXA_COMANDOS_CONTA, help="comandos por segundo de cada conta, somando as conexões dela (0 = sem limite)")
+    parser.add_argument("--rajada-conta", type=int, default=banco.RAJADA_COMANDOS_CONTA, help="comandos seguidos que uma conta pode mandar acima da taxa")
+    parser.add_argument("--limite-fila-comandos", type=int, default=banco.LIMITE_FILA_COMANDOS, help="comandos na fila/executando antes de responder \"ocupado\" (0 = sem limite)")
+    parser.add_argument("--modo-log", choices=MODOS_DURABILIDADE, default=banco.MODO_LOG, help="durabilidade do log de transações")
+    parser.add_argument("--tamanho-segmento-log", type=int, default=banco.TAMANHO_SEGMENTO_LOG, help="bytes do log ativo antes de rotacionar")
+    parser.add_argument("--politica-cliente-lento", choices=POLITICAS, default=banco.POLITICA_CLIENTE_LENTO, help="o que fazer quando a fila de alertas de um cliente enche")
+    parser.add_argument("--limite-fila-saida", type=int, default=banco.LIMITE_FILA_SAIDA, help="alertas pendentes por conexão")
+    parser.add_argument("--max-chaves-idempotencia", type=int, default=banco.MAX_CHAVES_IDEMPOTENCIA, help="respostas guardadas por chave de idempotência")
+    parser.add_argument("--validade-idempotencia", type=float, default=banco.VALIDADE_IDEMPOTENCIA, help="segundos em que um pedido repetido é reconhecido pela chave")
+    parser.add_argument("--sem-nodelay", action="store_true", help="deixa o algoritmo de Nagle ligado nas conexões")
+    parser.add_argument("--sem-keepalive", action="store_true", help="não liga o SO_KEEPALIVE nas conexões")
+    parser.add_argument("--keepalive-ocioso", type=int, default=KEEPALIVE_OCIOSO, help="segundos sem tráfego até a primeira sonda do keepalive")
+    parser.add_argument("--keepalive-intervalo", type=int, default=KEEPALIVE_INTERVALO, help="segundos entre as sondas do keepalive")
+    parser.add_argument("--keepalive-tentativas", type=int, default=KEEPALIVE_TENTATIVAS, help="sondas sem resposta até a conexão ser dada como perdida")
+    parser.add_argument("--tempo-ocioso", type=float, default=banco.TEMPO_OCIOSO, help="segundos que uma conexão logada pode ficar sem mandar nada (0 = sem limite)")
+    parser.add_argument("--tempo-login", type=float, default=banco.TEMPO_LOGIN, help="segundos para entrar numa conta depois de conectar (0 = sem limite)")
+    parser.add_argument("--buffer-envio", type=int, default=BUFFER_ENVIO, help="SO_SNDBUF de cada conexão, em bytes")
+    parser.add_argument("--buffer-recepcao", type=int, default=BUFFER_RECEPCAO, help="SO_RCVBUF de cada conexão, em bytes")
+    parser.add_argument("--porta-metricas", type=int, default=PORTA_METRICAS, help=f"serve as métricas em texto em {HOST_METRICAS}:PORTA")
+    parser.add_argument("--senha-admin", default=SENHA_ADMIN, help="senha do comando STATS (sem ela o comando fica desativado)")
+    parser.add_argument("--host", default=None, help="endereço do servidor (sem ele, é perguntado ao iniciar)")
+    parser.add_argument("--porta", type=int, default=None, help="porta do servidor (sem ela, é perguntada ao iniciar)")
+    parser.add_argument("--particoes", type=int, default=banco.PARTICOES, help="divide as contas entre N processos na mesma porta (dados em particoes/)")
+    parser.add_argument("--particao", type=int, default=None, help=argparse.SUPPRESS) # uso interno: o processo de uma partição
+    opcoes = parser.parse_args()
+    if opcoes.particoes < 1:
+        parser.error("--particoes precisa ser pelo menos 1")
+    if opcoes.particao is not None and not 0 <= opcoes.particao < opcoes.particoes:
+        parser.error(f"--particao precisa estar entre 0 e {opcoes.particoes - 1}")
+    banco.MAX_CONEXOES = opcoes.max_conexoes
+    banco.TAXA_COMANDOS_CONEXAO = opcoes.taxa_conexao
+    banco.RAJADA_COMANDOS_CONEXAO = opcoes.rajada_conexao
+    banco.limites_contas.taxa = opcoes.taxa_conta
+    banco.limites_contas.rajada = opcoes.rajada_conta
+    banco.carga.limite = opcoes.limite_fila_comandos
+    banco.ociosas.tempo_ocioso = opcoes.tempo_ocioso
+    banco.ociosas.tempo_login = opcoes.tempo_login
+    banco.POLITICA_CLIENTE_LENTO = opcoes.politica_cliente_lento
+    banco.LIMITE_FILA_SAIDA = opcoes.limite_fila_saida
+    banco.registro_log.modo = opcoes.modo_log
+    banco.registro_log.tamanho_segmento = opcoes.tamanho_segmento_log
+    banco.idempotencia.maximo = opcoes.max_chaves_idempotencia
+    banco.idempotencia.validade = opcoes.validade_idempotencia
+    TCP_NODELAY = not opcoes.sem_nodelay
+    KEEPALIVE = not opcoes.sem_keepalive
+    KEEPALIVE_OCIOSO = opcoes.keepalive_ocioso
+    KEEPALIVE_INTERVALO = opcoes.keepalive_intervalo
+    KEEPALIVE_TENTATIVAS = opcoes.keepalive_tentativas
+    BUFFER_ENVIO = opcoes.buffer_envio
+    BUFFER_RECEPCAO = opcoes.buffer_recepcao
+    PORTA_METRICAS = opcoes.porta_metricas + (opcoes.particao or 0) if opcoes.porta_metricas else None # uma por partição
+    SENHA_ADMIN = opcoes.senha_admin
+    return opcoes
+
 #Principal, onde é iniciado o servidor e determinado o IP e porta, caso queira alocar no ip que a máquina estar, use: 0.0.0.0 como IP.
-def main():
-    os.makedirs(PASTA_DADOS, exist_ok=True)
-    os.makedirs(PASTA_LOGS, exist_ok=True)
-    carregar_contas()
+def main(protocolo="tcp"):
+    opcoes = ler_opcoes()
+    if opcoes.particoes > 1 and opcoes.particao is None:
+        supervisionar(opcoes)
+        return
+    if opcoes.particao is not None:
+        banco.configurar_particoes(opcoes.particao, opcoes.particoes)
+    banco.iniciar()
+    if PORTA_METRICAS:
+        servir_metricas(metricas, HOST_METRICAS, PORTA_METRICAS)
+        print(f"[METRICAS] Métricas disponíveis em http://{HOST_METRICAS}:{PORTA_METRICAS}/metrics")
 
 #
-    host = input("Digite o endereco IP do servidor: ")
-    port = int(input("Digite a porta do servidor: "))
+    host = opcoes.host if opcoes.host is not None else input("Digite o endereco IP do servidor: ")
+    port = opcoes.porta if opcoes.porta is not None else int(input("Digite a porta do servidor: "))
+    portas = {protocolo: port}
+    for outro, porta_extra in (("tcp", opcoes.porta_tcp), ("telnet", opcoes.porta_telnet)):
+        if porta_extra:
+            portas.setdefault(outro, porta_extra)
+    ouvintes = list(portas.items())
 # #
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if opcoes.asyncio:
+        try:
+            asyncio.run(servir_async(host, ouvintes))
+        except KeyboardInterrupt:
+            print("\n[ENCERRANDO] Servidor encerrando atividades...")
+        except Exception as e:
+            print(f"[FALHA] Falha ao iniciar o servidor: {e}")
+        finally:
+            print("[SALVANDO] Salvando contas...")
+            banco.encerrar()
+            print("[DESLIGADO] Servidor desligado.")
+        return
+
+    sockets = []
     try:
-        server_socket.bind((host, port))
-        server_socket.listen()
-        print(f"[CONEXÃO] Servidor IFBank ativo em {host}:{port}")
+        for protocolo_ouvinte, porta_ouvinte in ouvintes:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(server_socket)
+            if banco.PARTICOES > 1: # as partições dividem a porta, o sistema distribui as conexões entre elas
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            server_socket.bind((host, porta_ouvinte))
+            server_socket.listen(1024)
+            print(f"[CONEXÃO] Servidor IFBank ({protocolo_ouvinte}) ativo em {host}:{porta_ouvinte} - até {banco.MAX_CONEXOES} conexões")
     except Exception as e:
         print(f"[FALHA] Falha ao iniciar o servidor: {e}")
+        for server_socket in sockets:
+            server_socket.close()
         return
 
+    # A primeira porta é atendida por esta thread, as outras por threads próprias
+    vagas = threading.BoundedSemaphore(banco.MAX_CONEXOES)
+    for server_socket, (protocolo_ouvinte, _) in list(zip(sockets, ouvintes))[1:]:
+        threading.Thread(target=aceitar_conexoes, args=(server_socket, protocolo_ouvinte, vagas),
+                         name=f"aceitar-{protocolo_ouvinte}", daemon=True).start()
     try:
-        while True:
-            conn, addr = server_socket.accept()
-            thread = threading.Thread(target=handle_client, args=(conn, addr))
-            thread.start()
+        aceitar_conexoes(sockets[0], ouvintes[0][0], vagas)
     except KeyboardInterrupt:
         print("\n[ENCERRANDO] Servidor encerrando atividades...")
     finally:
         print("[SALVANDO] Salvando contas...")
-        with contas_lock:
-            salvar_contas()
-        server_socket.close()
+        banco.encerrar()
+        for server_socket in sockets:
+            server_socket.close()
         print("[DESLIGADO] Servidor desligado.")
 
+# Modo particionado: sobe um processo por partição (este mesmo script com --particao i), cada um dentro de
+# particoes/<i>/ com os seus dados e logs e todos nas mesmas portas. Este processo só acompanha: sobe de novo a partição
+# que cair (ela se recupera do diário e reenvia os créditos pendentes) e, no Ctrl+C, encerra cada uma com o seu checkpoint.
+def supervisionar(opcoes):
+    try:
+        conferir_configuracao(opcoes.particoes)
+    except (ValueError, OSError) as e:
+        print(f"[FALHA] Não foi possível iniciar as partições: {e}")
+        return
+    host = opcoes.host if opcoes.host is not None else input("Digite o endereco IP do servidor: ")
+    port = opcoes.porta if opcoes.porta is not None else int(input("Digite a porta do servidor: "))
+    comando = [sys.executable, os.path.abspath(sys.argv[0]), *sys.argv[1:], "--host", host, "--porta", str(port)]
+
+    # Sessão própria para cada partição: o Ctrl+C do terminal chega só aqui, e cada uma recebe um só SIGINT
+    def subir(particao):
+        processo = subprocess.Popen([*comando, "--particao", str(particao)], cwd=os.path.join(PASTA_PARTICOES, str(particao)),
+                                    stdin=subprocess.DEVNULL, start_new_session=True)
+        return processo, time.monotonic()
+
+    print(f"[PARTICOES] Iniciando {opcoes.particoes} partições em {host}:{port} (dados em {PASTA_PARTICOES}/)")
+    processos = {particao: subir(particao) for particao in range(opcoes.particoes)}
+    try:
+        while True:
+            time.sleep(0.5)
+            for particao, (processo, inicio) in list(processos.items()):
+                if processo.poll() is not None and time.monotonic() - inicio >= REINICIO_PARTICAO:
+                    print(f"[PARTICOES] Partição {particao} terminou (código {processo.returncode}), iniciando de novo...")
+                    processos[particao] = subir(particao)
+    except KeyboardInterrupt:
+        print("\n[ENCERRANDO] Encerrando as partições...")
+    finally:
+        for processo, _ in processos.values():
+            if processo.poll() is None:
+                processo.send_signal(signal.SIGINT)
+        for processo, _ in processos.values():
+            try:
+                processo.wait(60)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+        print("[DESLIGADO] Partições desligadas.")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,203 @@
+# snapshot_binario.py / Checkpoint das contas em formato binário, feito para ser aberto com mmap: a inicialização lê só o
+# cabeçalho e copia a coluna de saldos (8 bytes por conta, uma cópia de memória), e nomes/CPFs/senhas ficam no arquivo
+# até alguém pedir (ArmazemContas usa o snapshot como base, veja armazem.py). O contas.json era lido e transformado em
+# dicts inteiro antes da primeira conexão; aqui o tempo de subir quase não depende da quantidade de contas.
+#
+# Arquivo (inteiros little-endian):
+#   cabeçalho  CABECALHO: mágico, versão, seq do diário coberto, quantidade de contas, vagas do índice, posições das seções
+#   saldos     int64 por conta, em centavos, na ordem das linhas (veja ArmazemContas.numero)
+#   registros  REGISTRO por conta: posição (uint64) e tamanho do nome, do CPF e da senha dentro dos textos; a versão 1
+#              tinha as posições em uint32 (textos até 4 GiB) e continua sendo lida
+#   índice     uint32 por vaga: linha + 1 da conta daquele CPF (0 = vaga livre); endereçamento aberto com sondagem linear
+#              a partir de crc32(CPF), com pelo menos o dobro de vagas que contas
+#   textos     nomes, CPFs e senhas em UTF-8, um atrás do outro
+#
+# Uso como conversor: python3 snapshot_binario.py para-binario dados/contas.json dados/contas.bin
+#                     python3 snapshot_binario.py para-json dados/contas.bin dados/contas.json
+#                     (de uma partição: ... para-json --particao 1 --particoes 4 particoes/1/dados/contas.bin contas-1.json)
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from persistencia import sincronizar_pasta, gravar_snapshot
+
+MAGICO = b"IFBANKSN"
+VERSAO = 2
+CABECALHO = struct.Struct("<8sIQIIQQQQQ") # mágico, versão, seq, quantidade, vagas, saldos, registros, índice, textos, tamanho total
+REGISTRO = struct.Struct("<QQQHHH")       # posição do nome, do CPF e da senha; tamanho do nome, do CPF e da senha
+# Registro de cada versão que ainda é lida
+REGISTROS = {1: struct.Struct("<IIIHHH"), 2: REGISTRO}
+
+# Campos de texto de cada registro
+NOME = 0
+CPF = 1
+SENHA = 2
+
+def _vagas(quantidade):
+    vagas = 8
+    while vagas < 2 * quantidade:
+        vagas *= 2
+    return vagas
+
+def _little_endian(colunas):
+    if sys.byteorder != "little":
+        colunas.byteswap()
+    return colunas
+
+class SnapshotBinario:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, 'rb') as f:
+            try:
+                self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # arquivo vazio
+                raise ValueError(f"{caminho} está vazio")
+        if len(self._mapa) < CABECALHO.size:
+            self.fechar()
+            raise ValueError(f"{caminho} menor que o cabeçalho")
+        (magico, versao, self.seq, self.quantidade, self.vagas, self._pos_saldos, self._pos_registros,
+         self._pos_indice, self._pos_textos, tamanho) = CABECALHO.unpack_from(self._mapa, 0)
+        if magico != MAGICO or versao not in REGISTROS or tamanho != len(self._mapa):
+            self.fechar()
+            raise ValueError(f"{caminho} não é um snapshot válido (versões {', '.join(map(str, REGISTROS))}) ou está incompleto")
+        self._registro = REGISTROS[versao]
+        self._indice = memoryview(self._mapa)[self._pos_indice:self._pos_indice + 4 * self.vagas].cast('I')
+
+    #Saldos de todas as contas em um array('q') novo (que o servidor altera em memória)
+    def saldos(self):
+        saldos = array('q')
+        with memoryview(self._mapa) as mapa:
+            saldos.frombytes(mapa[self._pos_saldos:self._pos_saldos + 8 * self.quantidade])
+        return _little_endian(saldos)
+
+    #Bytes do campo (NOME, CPF ou SENHA) da conta na linha, direto do mmap
+    def bruto(self, campo, linha):
+        registro = self._registro.unpack_from(self._mapa, self._pos_registros + linha * self._registro.size)
+        inicio = self._pos_textos + registro[campo]
+        return self._mapa[inicio:inicio + registro[3 + campo]]
+
+    def texto(self, campo, linha):
+        return self.bruto(campo, linha).decode('utf-8')
+
+    #Linha da conta com o CPF ou None
+    def linha_por_cpf(self, cpf):
+        chave = cpf.encode('utf-8')
+        mascara = self.vagas - 1
+        vaga = zlib.crc32(chave) & mascara
+        while True:
+            valor = self._indice[vaga]
+            if not valor:
+                return None
+            if self.bruto(CPF, valor - 1) == chave:
+                return valor - 1
+            vaga = (vaga + 1) & mascara
+
+    def fechar(self):
+        indice = getattr(self, "_indice", None)
+        if indice is not None:
+            indice.release()
+        self._mapa.close()
+
+#Grava o checkpoint binário de forma atômica (temporário + fsync + troca, o anterior fica em <arquivo>.anterior).
+#copia é o que ArmazemContas.copiar() devolve: colunas de nomes, CPFs e senhas (com brutos()) e o array de saldos.
+def gravar_snapshot_binario(caminho, seq, copia):
+    nomes, cpfs, senhas, saldos = copia
+    quantidade = len(saldos)
+    vagas = _vagas(quantidade)
+    indice = array('I', bytes(4 * vagas))
+    registros = bytearray(REGISTRO.size * quantidade)
+    textos = bytearray()
+    mascara = vagas - 1
+    for linha, (nome, cpf, senha) in enumerate(zip(nomes.brutos(), cpfs.brutos(), senhas.brutos())):
+        posicao = len(textos)
+        REGISTRO.pack_into(registros, linha * REGISTRO.size, posicao, posicao + len(nome), posicao + len(nome) + len(cpf),
+                           len(nome), len(cpf), len(senha))
+        textos += nome
+        textos += cpf
+        textos += senha
+        vaga = zlib.crc32(cpf) & mascara
+        while indice[vaga]:
+            vaga = (vaga + 1) & mascara
+        indice[vaga] = linha + 1
+
+    pos_saldos = CABECALHO.size
+    pos_registros = pos_saldos + 8 * quantidade
+    pos_indice = pos_registros + len(registros)
+    pos_textos = pos_indice + 4 * vagas
+    tamanho = pos_textos + len(textos)
+    cabecalho = CABECALHO.pack(MAGICO, VERSAO, seq, quantidade, vagas, pos_saldos, pos_registros, pos_indice, pos_textos, tamanho)
+
+    temporario = caminho + ".tmp"
+    with open(temporario, 'wb') as f:
+        f.write(cabecalho)
+        f.write(_little_endian(array('q', saldos)).tobytes())
+        f.write(registros)
+        f.write(_little_endian(indice).tobytes())
+        f.write(textos)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(caminho):
+        os.replace(caminho, caminho + ".anterior")
+    os.replace(temporario, caminho)
+    sincronizar_pasta(os.path.dirname(caminho))
+
+#Abre o snapshot válido mais novo entre o atual, o temporário (queda durante a troca) e o anterior.
+#Devolve (caminho, SnapshotBinario) ou None.
+def carregar_snapshot_binario(caminho):
+    melhor = None
+    for candidato in (caminho, caminho + ".tmp", caminho + ".anterior"):
+        if not os.path.exists(candidato):
+            continue
+        try:
+            snapshot = SnapshotBinario(candidato)
+        except (OSError, ValueError) as e:
+            print(f"[AVISO] Checkpoint {candidato} ignorado: {e}")
+            continue
+        if melhor is None or snapshot.seq > melhor[1].seq:
+            if melhor is not None:
+                melhor[1].fechar()
+            melhor = (candidato, snapshot)
+        else:
+            snapshot.fechar()
+    return melhor
+
+# # Conversão entre o contas.json (formato antigo) e o binário
+def json_para_binario(origem, destino, particao=0, particoes=1):
+    from armazem import ArmazemContas
+    with open(origem, 'r') as f:
+        dados = json.load(f)
+    contas = ArmazemContas(particao=particao, particoes=particoes)
+    contas.carregar(dados.get("contas", {}))
+    gravar_snapshot_binario(destino, dados.get("seq", 0), contas.copiar())
+    return len(contas)
+
+def binario_para_json(origem, destino, particao=0, particoes=1):
+    from armazem import ArmazemContas
+    snapshot = SnapshotBinario(origem)
+    try:
+        contas = ArmazemContas(particao=particao, particoes=particoes)
+        contas.limpar(snapshot)
+        copia_contas, copia_cpf = contas.exportar(contas.copiar())
+        gravar_snapshot(destino, {"contas": copia_contas, "cpf_salvos": copia_cpf, "seq": snapshot.seq})
+        return len(contas)
+    finally:
+        snapshot.fechar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte o checkpoint das contas entre o contas.json e o formato binário")
+    parser.add_argument("direcao", choices=("para-binario", "para-json"))
+    parser.add_argument("origem")
+    parser.add_argument("destino")
+    parser.add_argument("--particao", type=int, default=0, help="partição dona do arquivo, no modo particionado")
+    parser.add_argument("--particoes", type=int, default=1, help="quantidade de partições do servidor")
+    opcoes = parser.parse_args()
+    converter = json_para_binario if opcoes.direcao == "para-binario" else binario_para_json
+    quantidade = converter(opcoes.origem, opcoes.destino, opcoes.particao, opcoes.particoes)
+    print(f"[INFO] {quantidade} contas gravadas em {opcoes.destino}")
+
+if __name__ == "__main__":
+    main()
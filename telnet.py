@@ -0,0 +1,524 @@
+# telnet.py / Atendimento das conexões de telnet (PuTTY ou o telnet do sistema): menus em texto, um campo por vez.
+# As operações são as mesmas do protocolo em linhas (banco.py); aqui só ficam a conversa com o cliente e as mensagens
+# do menu. Quem inicia as portas é o servidor.py (servidor-telnet.py abre esta porta como a principal).
+import socket
+import asyncio
+import time
+from datetime import datetime
+import banco
+from banco import (diario, conexoes_abertas_metrica, conexoes_recusadas, executar_operacao, tempo_comando,
+                   enviar_notificacoes, atualizar_sessao, remover_sessao, nova_fila, revogar_sessao, novo_balde,
+                   comando_admitido, comando_admitido_async, ociosas, ITENS_EXTRATO)
+from extrato import descrever_movimento
+from persistencia import DiarioIndisponivel
+from armazem import para_centavos, formatar_centavos
+from fila_saida import SocketTravado
+from protocolo_telnet import LeitorTelnet
+from protocolo_binario import (ST_OK, ST_NAO_LOGADO, ST_LOGIN_INVALIDO, ST_CPF_DUPLICADO, ST_SENHA_INCORRETA,
+                               ST_VALOR_INVALIDO, ST_SALDO_INSUFICIENTE, ST_CONTA_INEXISTENTE, ST_MESMA_CONTA,
+                               ST_DESCONHECIDO, ST_ERRO, ST_LIMITE_PEDIDOS, ST_OCUPADO, ST_SESSAO_ATIVA)
+
+#Tamanho de cada leitura do socket (as linhas são montadas pelo LeitorTelnet, não importa como o texto chega)
+TAMANHO_LEITURA = 4096
+
+#Página do extrato para a tela do telnet, um movimento por linha (do mais recente para o mais antigo)
+def formatar_extrato_telnet(dados):
+    movimentos = dados["movimentos"]
+    linhas = [f"[IFBANK] Extrato - página {dados['pagina']} de {dados['paginas']} ({dados['total']} movimentos)"]
+    for mov in movimentos:
+        descricao = descrever_movimento(mov)
+        linhas.append(f"  {datetime.fromtimestamp(mov['t']):%d/%m/%Y %H:%M:%S}  {descricao:<28} {mov['valor'] / 100:>+12.2f}  | Saldo: R$ {formatar_centavos(mov['saldo'])}")
+    if not movimentos:
+        linhas.append("  Nenhum movimento nesta página.")
+    return "\r\n".join(linhas)
+
+#Alerta de transferência: (conta de origem, nome de quem mandou, quantidade, total em centavos). Quantidade > 1 só
+#aparece quando a fila de saída de um cliente lento juntou vários alertas da mesma origem. O alerta pode vir de uma
+#transferência feita em qualquer protocolo.
+def codificar_alerta_telnet(alerta):
+    origem, nome_origem, quantidade, total = alerta
+    if quantidade == 1:
+        mensagem = f"\n[IFBANK] Você recebeu uma transferência de {nome_origem} (Conta: {origem}) no valor de R$ {formatar_centavos(total)}."
+    else:
+        mensagem = f"\n[IFBANK] Você recebeu {quantidade} transferências de {nome_origem} (Conta: {origem}) no total de R$ {formatar_centavos(total)}."
+    return f"\r\n{mensagem}\r\n".encode('utf-8')
+
+#Mensagens do menu para cada (operação, status); valor/saldo em centavos são formatados em reais antes
+MENSAGENS_TELNET = {
+    ("CRIAR", ST_OK): "[IFBANK] Conta {conta} criada para {nome}.",
+    ("CRIAR", ST_CPF_DUPLICADO): "[IFBANK] CPF já cadastrado.",
+    ("LOGIN", ST_OK): "[IFBANK] | {nome} C:{conta}",
+    ("LOGIN", ST_LOGIN_INVALIDO): "[IFBANK] CPF ou senha incorretos.",
+    ("SALDO", ST_OK): "[IFBANK] Saldo: R$ {saldo}",
+    ("DEPOSITAR", ST_OK): "[IFBANK] Depósito de R$ {valor} realizado. Novo saldo: R$ {saldo}",
+    ("SACAR", ST_OK): "[IFBANK] Saque de R$ {valor} realizado. Novo saldo: R$ {saldo}",
+    ("TRANSFERIR", ST_OK): "[IFBANK] Transferência de R$ {valor} para {nome_destino} (Conta: {destino}) realizada.",
+    ("LOGOUT", ST_OK): "[IFBANK] Você saiu da sua conta.",
+}
+MENSAGENS_GERAIS = {
+    ST_NAO_LOGADO: "[IFBANK] Você precisa estar logado para esta operação.",
+    ST_SENHA_INCORRETA: "[IFBANK] Senha incorreta.",
+    ST_VALOR_INVALIDO: "[IFBANK] Valor inválido: deve ser positivo e o saldo não pode passar do máximo.",
+    ST_SALDO_INSUFICIENTE: "[IFBANK] Saldo insuficiente.",
+    ST_CONTA_INEXISTENTE: "[IFBANK] Conta de destino não existe.",
+    ST_MESMA_CONTA: "[IFBANK] Não pode transferir para si mesmo.",
+    ST_DESCONHECIDO: "[IFBANK] Comando desconhecido.",
+    ST_ERRO: "[FALHA] Erro inesperado no servidor: {erro}",
+    ST_LIMITE_PEDIDOS: "[IFBANK] Muitas operações em pouco tempo, aguarde um instante e tente de novo.",
+    ST_OCUPADO: "[IFBANK] Servidor ocupado, tente de novo em instantes.",
+    ST_SESSAO_ATIVA: "[IFBANK] Essa conta já foi acessada em outra sessão.",
+}
+
+def formatar_resposta(operacao, status, dados):
+    campos = {chave: formatar_centavos(valor) if chave in ("valor", "saldo") else valor for chave, valor in dados.items()}
+    modelo = MENSAGENS_TELNET.get((operacao, status)) or MENSAGENS_GERAIS[status]
+    return modelo.format(**campos)
+
+#Função que recebe o comando do menu, executa e só responde depois da operação estar gravada no diário
+#Se o diário falhar antes de gravar a operação, a resposta vira ST_ERRO: nada que não está no disco é confirmado
+#Também mede a latência de cada operação (da execução até a gravação no diário)
+def processar_comando(comando, num_conta_logada):
+    inicio = time.perf_counter()
+    resultado = executar_comando(comando, num_conta_logada)
+    try:
+        diario.confirmar()
+    except DiarioIndisponivel as e:
+        print(f"[IFBANK] {e}")
+        return (MENSAGENS_GERAIS[ST_ERRO].format(erro="diário indisponível"), ("NO_CHANGE", None, None), [])
+    operacao = comando.split('|', 1)[0].strip().upper()
+    tempo_comando("LOGOUT" if operacao == "SAIR" else operacao, "telnet").observar(time.perf_counter() - inicio)
+    return resultado
+
+#Comando recusado na admissão (veja admissao.py): nada foi executado
+def recusar_comando(comando, status):
+    return (MENSAGENS_GERAIS[status], ("NO_CHANGE", None, None), [])
+
+#Converte o comando montado pelo menu ("OPERACAO|campo|...") nos argumentos da operação do banco. Devolve a tupla de
+#argumentos ou a mensagem de erro para o cliente.
+def argumentos_telnet(operacao, partes):
+    if operacao == "CRIAR":
+        if len(partes) != 4:
+            return "[IFBANK] Formato incorreto. Use: CRIAR|Nome Completo|CPF|Senha"
+        nome, cpf, senha = partes[1], partes[2], partes[3]
+        #Validações - Adicionar mais até o final do projeto
+        #Coloquei apenas 3 números para facilitar os testes, mas o numero original é 11
+        if not cpf.isdigit() or len(cpf) != 3:
+            return "[IFBANK] CPF inválido. Deve conter 11 números."
+        if not nome or '|' in nome:
+            return "[IFBANK] Nome inválido. Não pode estar vazio ou conter '|'."
+        if not senha or '|' in senha:
+            return "[IFBANK] Senha inválida. Não pode estar vazia ou conter '|'."
+        return (nome, cpf, senha)
+    if operacao == "LOGIN":
+        if len(partes) != 3:
+            return "[IFBANK] Formato: LOGIN|CPF|Senha"
+        #Faz uma verificação para passar apenas numeros
+        if not partes[1].isdigit():
+            return "[IFBANK] Formato de CPF inválido. Use apenas números."
+        return (partes[1], partes[2])
+    if operacao == "DEPOSITAR":
+        try:
+            return (para_centavos(partes[1]),)
+        except (ValueError, IndexError):
+            return "[IFBANK] Valor inválido. Formato: DEPOSITAR|Valor"
+    if operacao == "SACAR":
+        if len(partes) < 3:
+            return "[IFBANK] Formato incorreto. Use: SACAR|Valor|Senha"
+        try:
+            return (para_centavos(partes[1]), partes[2])
+        except ValueError:
+            return "[IFBANK] Valor inválido. Use apenas números para o valor."
+    if operacao == "TRANSFERIR":
+        if len(partes) < 4:
+            return "[IFBANK] Formato incorreto. Use: TRANSFERIR|ContaDestino|Valor|Senha"
+        try:
+            valor = para_centavos(partes[2])
+        except ValueError:
+            return "[IFBANK] Valor inválido. Use apenas números para o valor."
+        if not partes[1].isdigit():
+            return "[IFBANK] Número da conta de destino deve ser numérico."
+        return (partes[1], valor, partes[3])
+    if operacao == "EXTRATO":
+        #EXTRATO|Página (1 = movimentos mais recentes)
+        try:
+            pagina = int(partes[1]) if len(partes) > 1 else 1
+        except ValueError:
+            return "[IFBANK] Página inválida."
+        if pagina < 1:
+            return "[IFBANK] Página inválida."
+        return (ITENS_EXTRATO, pagina)
+    return ()
+
+#Faz o tratamento do comando para a opção correta: devolve (resposta, estado_retorno, [(conta, alerta), ...])
+def executar_comando(comando, num_conta_logada):
+    partes = comando.strip().split('|')
+    operacao = partes[0].upper()
+    if operacao == "SAIR":
+        operacao = "LOGOUT"
+    estado_retorno = ("NO_CHANGE", None, None)
+
+    if operacao not in ("CRIAR", "LOGIN") and num_conta_logada is None:
+        return (MENSAGENS_GERAIS[ST_NAO_LOGADO], estado_retorno, [])
+    argumentos = argumentos_telnet(operacao, partes)
+    if isinstance(argumentos, str):
+        return (argumentos, estado_retorno, [])
+
+    status, dados, estado_retorno = executar_operacao(operacao, argumentos, num_conta_logada)
+    #O menu não mostra nem usa o token da sessão (não existe RETOMAR no telnet), então ele não fica valendo
+    if "token" in dados:
+        revogar_sessao(dados["token"])
+    if operacao == "EXTRATO" and status == ST_OK:
+        return (formatar_extrato_telnet(dados), estado_retorno, [])
+    return (formatar_resposta(operacao, status, dados), estado_retorno, dados.get("alertas", []))
+
+#Funcao de comunicação do telnet - Modificado para utilizar outro sistema telnet (PuTTY)
+#Manda o prompt e devolve a próxima linha não vazia digitada. As linhas vêm do LeitorTelnet da conexão: se o cliente
+#colou várias de uma vez, as seguintes já estão lá e os próximos prompts nem esperam o recv.
+#oculto=True é para senhas: o cliente para de mostrar o que é digitado (IAC WILL ECHO) até o próximo prompt normal.
+#"antes" são as respostas que ficaram esperando o prompt: tudo sai em um único envio.
+def receber_input(conn, leitor, prompt, oculto=False, antes=b""):
+    eco = leitor.ocultar_eco() if oculto else leitor.mostrar_eco()
+    try:
+        conn.sendall(antes + eco + prompt)
+        while True:
+            while leitor.linhas:
+                linha = leitor.linhas.popleft().strip()
+                if linha:
+                    return linha
+                conn.sendall(prompt)
+
+            raw_data = conn.recv(TAMANHO_LEITURA)
+            if not raw_data:
+                return None
+            resposta = leitor.alimentar(raw_data)
+            if resposta:
+                conn.sendall(resposta)
+
+    except ValueError as e:
+        print(f"[IFBANK] Entrada recusada: {e}.")
+        return None
+    except (ConnectionResetError, BrokenPipeError, TimeoutError): # TimeoutError: o keepalive deu a conexão como perdida
+        return None
+
+#Versão do receber_input para o modo asyncio
+async def receber_input_async(reader, writer, leitor, prompt, oculto=False, antes=b""):
+    eco = leitor.ocultar_eco() if oculto else leitor.mostrar_eco()
+    try:
+        writer.write(antes + eco + prompt)
+        await writer.drain()
+        while True:
+            while leitor.linhas:
+                linha = leitor.linhas.popleft().strip()
+                if linha:
+                    return linha
+                writer.write(prompt)
+
+            raw_data = await reader.read(TAMANHO_LEITURA)
+            if not raw_data:
+                return None
+            resposta = leitor.alimentar(raw_data)
+            if resposta:
+                writer.write(resposta)
+            await writer.drain()
+
+    except ValueError as e:
+        print(f"[IFBANK] Entrada recusada: {e}.")
+        return None
+    except (ConnectionResetError, BrokenPipeError, TimeoutError): # TimeoutError: o keepalive deu a conexão como perdida
+        return None
+
+#Pedidos que o fluxo dos menus faz para quem está atendendo a conexão (thread ou asyncio)
+LER = "LER"             #(LER, prompt em bytes) -> devolve o texto digitado ou None se o cliente saiu
+LER_SENHA = "LER_SENHA" #(LER_SENHA, prompt em bytes) -> igual ao LER, sem o cliente mostrar o que é digitado
+ESCREVER = "ESCREVER"   #(ESCREVER, bytes) -> sai junto com o próximo prompt
+EXECUTAR = "EXECUTAR"   #(EXECUTAR, comando, num_conta_logada) -> devolve o resultado de processar_comando
+
+#Prompt do telnet: começa em uma linha nova e deixa um espaço antes do cursor
+def prompt(texto):
+    return f"\r\n{texto} ".encode('utf-8')
+
+#Linha de resposta entre os prompts
+def linha_resposta(texto):
+    return f"\r\n{texto}\r\n".encode('utf-8')
+
+#Menus, prompts e mensagens fixas já em bytes: são codificados uma vez, não a cada volta do menu
+MENU_PRINCIPAL = prompt(
+    "\r\n" + "="*40 +
+    "\r\n--- Bem-vindo ao IFBank ---" +
+    "\r\n Transferências rápidas e sem taxas." +
+    "\r\n Crie sua conta e aproveite!" +
+    "\r\n" + "="*40 +
+    "\r\n1. Acessar minha Conta" +
+    "\r\n2. Criar nova Conta" +
+    "\r\n3. Sair do Aplicativo"
+    #Adicionar opção ADM: Ver contas conectadas, contas criadas, transações, deletar/criar, etc
+)
+OPCOES_MENU_LOGADO = (
+    "\r\n1. Ver Saldo" +
+    "\r\n2. Depositar" +
+    "\r\n3. Sacar" +
+    "\r\n4. Transferir" +
+    "\r\n5. Extrato" +
+    "\r\n6. Sair da Conta"
+)
+PROMPT_CPF = prompt("Digite seu CPF: ")
+PROMPT_SENHA = prompt("Digite sua senha: ")
+PROMPT_NOME = prompt("Digite seu nome completo: ")
+PROMPT_NOVA_SENHA = prompt("Crie uma senha: ")
+PROMPT_CONFIRMAR_NOVA_SENHA = prompt("Confirme sua senha: ")
+PROMPT_DEPOSITAR = prompt("Digite o valor para depositar: R$ ")
+PROMPT_SACAR = prompt("Digite o valor para sacar: R$ ")
+PROMPT_CONFIRMAR_SENHA = prompt("Digite sua senha para confirmar: ")
+PROMPT_CONTA_DESTINO = prompt("Digite o número da conta de destino: ")
+PROMPT_TRANSFERIR = prompt("Digite o valor para transferir: R$ ")
+PROMPT_PAGINA = prompt("Digite a página do extrato (1 = mais recente): ")
+SENHAS_DIFERENTES = linha_resposta("[ERRO] As senhas não coincidem.")
+DESPEDIDA = linha_resposta("Obrigado por usar o IFBank!")
+OPCAO_INVALIDA = linha_resposta("[IFBANK] Opção inválida.")
+OPCAO_INVALIDA_LOGADO = linha_resposta("[IFBANK] Opção inválida, tente novamente.")
+LOTADO = linha_resposta("[IFBANK] Servidor lotado, tente novamente mais tarde.")
+OCIOSA = linha_resposta("[IFBANK] Conexão encerrada por inatividade.")
+SEM_LOGIN = linha_resposta("[IFBANK] Tempo para entrar na conta esgotado, conexão encerrada.")
+
+#Fluxo dos menus de um cliente, escrito como gerador: ele só diz o que precisa (ler, escrever, executar comando)
+#e quem atende a conexão faz a entrada/saída. Assim o mesmo fluxo serve para o modo com threads e para o asyncio.
+def sessao_cliente(fila, addr):
+    num_conta_logada = None
+    nome_logado = None
+
+    try:
+        while True:
+            escolha = yield (LER, MENU_PRINCIPAL)
+
+            if escolha is None: break
+
+            if escolha == '1':
+                cpf = yield (LER, PROMPT_CPF)
+                if cpf is None: break
+                senha = yield (LER_SENHA, PROMPT_SENHA)
+                if senha is None: break
+
+                comando = f"LOGIN|{cpf}|{senha}"
+                resposta, novo_estado, _ = yield (EXECUTAR, comando, None)
+                #A conta já logada em outra conexão (de qualquer protocolo) é recusada aqui, junto com o registro desta
+                if novo_estado[0] == "LOGIN" and atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila) is None:
+                    resposta, novo_estado = MENSAGENS_GERAIS[ST_SESSAO_ATIVA], ("NO_CHANGE", None, None)
+                yield (ESCREVER, linha_resposta(resposta))
+
+                if novo_estado[0] == "LOGIN":
+                    num_conta_logada, nome_logado = novo_estado[1], novo_estado[2]
+                    #O menu da conta só muda no login
+                    menu_logado = prompt(f"\r\n--- IFBank | Olá, {nome_logado} (N. Conta: {num_conta_logada}) ---" + OPCOES_MENU_LOGADO)
+
+                    while True:
+                        escolha_logado = yield (LER, menu_logado)
+
+                        if escolha_logado is None: break
+
+                        if escolha_logado == '1':
+                            comando_logado = "SALDO"
+                            resposta, _, _ = yield (EXECUTAR, comando_logado, num_conta_logada)
+
+                        elif escolha_logado == '2':
+                            valor_str = yield (LER, PROMPT_DEPOSITAR)
+                            if valor_str is None: break
+                            comando_logado = f"DEPOSITAR|{valor_str}"
+                            resposta, _, _ = yield (EXECUTAR, comando_logado, num_conta_logada)
+
+                        elif escolha_logado == '3':
+                            valor_str = yield (LER, PROMPT_SACAR)
+                            if valor_str is None: break
+                            senha_saque = yield (LER_SENHA, PROMPT_CONFIRMAR_SENHA)
+                            if senha_saque is None: break
+                            comando_logado = f"SACAR|{valor_str}|{senha_saque}"
+                            resposta, _, _ = yield (EXECUTAR, comando_logado, num_conta_logada)
+
+                        elif escolha_logado == '4':
+                            c_destino = yield (LER, PROMPT_CONTA_DESTINO)
+                            if c_destino is None: break
+                            valor_str = yield (LER, PROMPT_TRANSFERIR)
+                            if valor_str is None: break
+                            senha_transf = yield (LER_SENHA, PROMPT_CONFIRMAR_SENHA)
+                            if senha_transf is None: break
+                            comando_logado = f"TRANSFERIR|{c_destino}|{valor_str}|{senha_transf}"
+                            resposta, _, alertas = yield (EXECUTAR, comando_logado, num_conta_logada)
+                            if alertas:
+                                enviar_notificacoes(alertas)
+
+                        elif escolha_logado == '5':
+                            pagina = yield (LER, PROMPT_PAGINA)
+                            if pagina is None: break
+                            comando_logado = f"EXTRATO|{pagina}"
+                            resposta, _, _ = yield (EXECUTAR, comando_logado, num_conta_logada)
+
+                        elif escolha_logado == '6':
+                            comando_logado = "SAIR"
+                            resposta, novo_estado, _ = yield (EXECUTAR, comando_logado, num_conta_logada)
+                            num_conta_logada, nome_logado = atualizar_sessao(novo_estado, num_conta_logada, nome_logado, fila)
+                            yield (ESCREVER, linha_resposta(resposta))
+                            break
+
+                        else:
+                            yield (ESCREVER, OPCAO_INVALIDA_LOGADO)
+                            continue
+
+                        yield (ESCREVER, linha_resposta(resposta))
+
+                    #Cliente saiu do menu sem escolher "Sair da Conta"
+                    if num_conta_logada:
+                        num_conta_logada, nome_logado = atualizar_sessao(("LOGOUT", None, None), num_conta_logada, nome_logado, fila)
+
+            elif escolha == '2':
+                nome = yield (LER, PROMPT_NOME)
+                if nome is None: break
+                cpf = yield (LER, PROMPT_CPF)
+                if cpf is None: break
+                senha = yield (LER_SENHA, PROMPT_NOVA_SENHA)
+                if senha is None: break
+                senha_conf = yield (LER_SENHA, PROMPT_CONFIRMAR_NOVA_SENHA)
+                if senha_conf is None: break
+
+                if senha != senha_conf:
+                    yield (ESCREVER, SENHAS_DIFERENTES)
+                    continue
+
+                comando = f"CRIAR|{nome}|{cpf}|{senha}"
+                resposta, _, _ = yield (EXECUTAR, comando, None)
+                yield (ESCREVER, linha_resposta(resposta))
+
+            elif escolha == '3':
+                yield (ESCREVER, DESPEDIDA)
+                break
+
+            else:
+                yield (ESCREVER, OPCAO_INVALIDA)
+
+    finally:
+        remover_sessao(num_conta_logada, nome_logado, fila)
+
+#Funcao para lidar com o cliente já conectado (modo com uma thread por conexão)
+def handle_client(conn, addr):
+    print(f"[NOVA CONEXAO] {addr} conectado.")
+    conexoes_abertas_metrica.incrementar()
+    #Prompts e respostas saem por esta thread e alertas pelo escritor da fila, cada sendall inteiro
+    conn = SocketTravado(conn)
+    fila = nova_fila(codificar_alerta_telnet)
+    fila.usar_thread(conn, derrubar=lambda: derrubar_conexao(conn))
+    sessao = sessao_cliente(fila, addr)
+    leitor = LeitorTelnet() #Estado do protocolo telnet e linhas já recebidas desta conexão
+    saida = bytearray() #Respostas esperando o próximo prompt: cada passo do menu é um único sendall
+    balde = novo_balde()
+    vigia = ociosas.vigiar(lambda forcar: encerrar_parada(conn, forcar))
+
+    try:
+        pedido = next(sessao)
+        while True:
+            if pedido[0] in (LER, LER_SENHA):
+                resultado = receber_input(conn, leitor, pedido[1], pedido[0] == LER_SENHA, bytes(saida))
+                saida.clear()
+            elif pedido[0] == ESCREVER:
+                saida += pedido[1]
+                resultado = None
+            else:
+                resultado = comando_admitido(processar_comando, recusar_comando, balde, pedido[2], pedido[1])
+            registrar_atividade(vigia, pedido, resultado)
+            pedido = sessao.send(resultado)
+
+    except StopIteration:
+        #A despedida não tem prompt depois dela
+        if vigia.expirou:
+            saida += aviso_parada(vigia, addr)
+        try:
+            conn.sendall(saida)
+        except OSError:
+            pass
+    except (ConnectionResetError, BrokenPipeError, EOFError):
+        print(f"[IFBANK] {addr} desconectou.")
+    finally:
+        ociosas.remover(vigia)
+        conexoes_abertas_metrica.decrementar()
+        sessao.close()
+        fila.fechar()
+        conn.close()
+        print(f"Encerrando {addr}.")
+
+#Depois de cada passo do menu: o que o cliente digitou conta como atividade (e o prazo de ociosidade depende de ele
+#estar numa conta, o que muda com LOGIN e SAIR)
+def registrar_atividade(vigia, pedido, resultado):
+    if resultado is None:
+        return
+    if pedido[0] == EXECUTAR:
+        estado = resultado[1][0]
+        vigia.atividade(estado == "LOGIN" or (pedido[2] is not None and estado != "LOGOUT"))
+    else:
+        vigia.atividade(vigia.logado)
+
+#Chamado pela roda de ociosas (veja ociosidade.py): o recv volta vazio e a sessão termina como se o cliente tivesse saído
+def encerrar_parada(conn, forcar):
+    try:
+        conn.shutdown(socket.SHUT_RDWR if forcar else socket.SHUT_RD)
+    except OSError:
+        pass
+
+def aviso_parada(vigia, addr):
+    print(f"[IFBANK] {addr} encerrada: " + ("inatividade." if vigia.logado else "sem login no prazo."))
+    return OCIOSA if vigia.logado else SEM_LOGIN
+
+#Política "desconectar": o recv da sessão volta vazio e ela termina como se o cliente tivesse saído
+def derrubar_conexao(conn):
+    print("[IFBANK] Cliente não está lendo os alertas, derrubando a conexão.")
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+#Mesma sessão do handle_client, mas sem thread própria: a conexão fica parada no event loop esperando dados
+#e os comandos (que podem esperar travas e o disco) rodam num pool pequeno de threads
+async def handle_client_async(reader, writer):
+    addr = writer.get_extra_info("peername")
+    if conexoes_abertas_metrica.valor >= banco.MAX_CONEXOES:
+        print(f"[IFBANK] Limite de {banco.MAX_CONEXOES} conexões atingido, recusando {addr}.")
+        conexoes_recusadas.incrementar()
+        writer.write(LOTADO)
+        writer.close()
+        return
+
+    conexoes_abertas_metrica.incrementar()
+    print(f"[NOVA CONEXAO] {addr} conectado.")
+    loop = asyncio.get_running_loop()
+    fila = nova_fila(codificar_alerta_telnet)
+    escritor_alertas = fila.usar_loop(loop, writer, derrubar=lambda: loop.call_soon_threadsafe(writer.transport.abort))
+    sessao = sessao_cliente(fila, addr)
+    leitor = LeitorTelnet() #Estado do protocolo telnet e linhas já recebidas desta conexão
+    saida = bytearray() #Respostas esperando o próximo prompt: cada passo do menu é uma única escrita
+    balde = novo_balde()
+    vigia = ociosas.vigiar(lambda forcar: loop.call_soon_threadsafe(writer.transport.abort if forcar else reader.feed_eof))
+
+    try:
+        pedido = next(sessao)
+        while True:
+            if pedido[0] in (LER, LER_SENHA):
+                resultado = await receber_input_async(reader, writer, leitor, pedido[1], pedido[0] == LER_SENHA, bytes(saida))
+                saida.clear()
+            elif pedido[0] == ESCREVER:
+                saida += pedido[1]
+                resultado = None
+            else:
+                resultado = await comando_admitido_async(loop, processar_comando, recusar_comando, balde, pedido[2], pedido[1])
+            registrar_atividade(vigia, pedido, resultado)
+            pedido = sessao.send(resultado)
+
+    except StopIteration:
+        if vigia.expirou:
+            saida += aviso_parada(vigia, addr)
+        writer.write(saida)
+    except (ConnectionResetError, BrokenPipeError, EOFError):
+        print(f"[IFBANK] {addr} desconectou.")
+    finally:
+        ociosas.remover(vigia)
+        conexoes_abertas_metrica.decrementar()
+        sessao.close()
+        fila.fechar()
+        escritor_alertas.cancel()
+        writer.close()
+        print(f"Encerrando {addr}.")
@@ -0,0 +1,180 @@
+# conftest.py / O servidor.py de verdade para os testes: cada teste sobe o servidor num subprocesso, com dados e logs
+# numa pasta temporária, e fala com ele pelo protocolo em texto (ConexaoBanco do cliente.py), como o bench_carga.py.
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from cliente import ConexaoBanco, TempoEsgotado # noqa: E402
+
+RE_CONTA_CRIADA = re.compile(r"Conta (\d+) criada")
+RE_SALDO = re.compile(r"Saldo: R\$ (-?[\d.]+)")
+# Segundos esperando uma resposta ou o servidor subir/descer
+ESPERA = 30
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+#Cliente do protocolo em texto com as poucas operações que os testes usam
+class Cliente:
+    def __init__(self, porta):
+        self.conexao = ConexaoBanco(socket.create_connection(("127.0.0.1", porta), timeout=ESPERA))
+        self.conexao.sock.settimeout(None)
+        self.logado = False
+
+    def comando(self, texto, chave=None):
+        return self.conexao.enviar_comando_e_receber(texto, chave, ESPERA)
+
+    def criar(self, nome, cpf, senha):
+        resposta = self.comando(f"CRIAR|{nome}|{cpf}|{senha}")
+        encontrado = RE_CONTA_CRIADA.search(resposta)
+        assert encontrado, resposta
+        return encontrado.group(1)
+
+    def login(self, cpf, senha):
+        resposta = self.comando(f"LOGIN|{cpf}|{senha}")
+        assert resposta.startswith("[LOGIN]|"), resposta
+        self.logado = True
+        return resposta
+
+    #Saldo em centavos
+    def saldo(self):
+        resposta = self.comando("SALDO")
+        encontrado = RE_SALDO.search(resposta)
+        assert encontrado, resposta
+        reais, _, centavos = encontrado.group(1).partition(".")
+        return int(reais) * 100 + int(centavos or 0)
+
+    #Sai da conta antes de fechar: com a resposta do LOGOUT a conta já está livre para o LOGIN de outra conexão (só
+    #fechando, o servidor percebe a queda um pouco depois e o LOGIN seguinte pode ser recusado)
+    def fechar(self):
+        if self.logado and not self.conexao.fechada:
+            try:
+                self.conexao.enviar_comando_e_receber("LOGOUT", espera=ESPERA)
+            except (OSError, TempoEsgotado):
+                pass
+            self.logado = False
+        self.conexao.fechar()
+
+#Servidor numa pasta: iniciar() pode ser chamado de novo depois de parar()/matar() para testar a recuperação.
+#Cada subida usa uma porta nova, para não esperar o sistema liberar a anterior.
+class Servidor:
+    def __init__(self, pasta, argumentos=()):
+        self.pasta = str(pasta)
+        self.argumentos = list(argumentos)
+        self.processo = None
+        self.porta = None
+        self.clientes = []
+        self.saida = os.path.join(self.pasta, "servidor.out")
+
+    @property
+    def particoes(self):
+        if "--particoes" in self.argumentos:
+            return int(self.argumentos[self.argumentos.index("--particoes") + 1])
+        return 1
+
+    def iniciar(self):
+        self.porta = porta_livre()
+        with open(self.saida, "a") as saida:
+            self.processo = subprocess.Popen([sys.executable, "-u", os.path.join(RAIZ, "servidor.py"), *self.argumentos,
+                                              "--host", "127.0.0.1", "--porta", str(self.porta)],
+                                             cwd=self.pasta, stdin=subprocess.DEVNULL, stdout=saida,
+                                             stderr=subprocess.STDOUT)
+        self.esperar_pronto()
+        return self
+
+    #Espera a porta abrir e, com partições, o socket de cada uma (antes disso um comando repassado volta "ocupado")
+    def esperar_pronto(self):
+        sockets = [os.path.join(self.pasta, "particoes", str(i), "rpc.sock") for i in range(self.particoes)]
+        limite = time.monotonic() + ESPERA
+        while time.monotonic() < limite:
+            try:
+                socket.create_connection(("127.0.0.1", self.porta)).close()
+                if self.particoes == 1 or all(os.path.exists(caminho) for caminho in sockets):
+                    return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"servidor não subiu; veja {self.saida}")
+
+    def cliente(self):
+        cliente = Cliente(self.porta)
+        self.clientes.append(cliente)
+        return cliente
+
+    def _fechar_clientes(self):
+        clientes, self.clientes = self.clientes, []
+        for cliente in clientes:
+            cliente.fechar()
+
+    #Ctrl+C: o servidor grava o checkpoint e fecha o diário
+    def parar(self):
+        self._fechar_clientes()
+        if self.processo is not None and self.processo.poll() is None:
+            self.processo.send_signal(signal.SIGINT)
+            try:
+                self.processo.wait(ESPERA)
+            except subprocess.TimeoutExpired:
+                self.processo.kill()
+                self.processo.wait()
+                raise RuntimeError(f"servidor não encerrou com SIGINT; veja {self.saida}")
+        self.processo = None
+
+    #Queda sem aviso (kill -9): nada além do que já estava no diário sobrevive
+    def matar(self):
+        self._fechar_clientes()
+        if self.processo is not None:
+            for particao in range(self.particoes if self.particoes > 1 else 0):
+                try:
+                    os.kill(self.pid_particao(particao), signal.SIGKILL)
+                except (RuntimeError, OSError):
+                    pass
+            self.processo.kill()
+            self.processo.wait()
+        self.processo = None
+
+    #Pid do processo de uma partição (filho do supervisor)
+    def pid_particao(self, particao):
+        with open(f"/proc/{self.processo.pid}/task/{self.processo.pid}/children") as f:
+            for pid in f.read().split():
+                with open(f"/proc/{pid}/cmdline", "rb") as cmdline:
+                    if cmdline.read().split(b"\0")[-2:-1] == [str(particao).encode()]:
+                        return int(pid)
+        raise RuntimeError(f"partição {particao} não está rodando")
+
+    #Manda um sinal para uma partição e espera o supervisor subir outra no lugar (com o socket dela aceitando conexões)
+    def reiniciar_particao(self, particao, sinal=signal.SIGINT):
+        self._fechar_clientes()
+        caminho = os.path.join(self.pasta, "particoes", str(particao), "rpc.sock")
+        antigo = self.pid_particao(particao)
+        os.kill(antigo, sinal)
+        limite = time.monotonic() + ESPERA
+        while time.monotonic() < limite:
+            try:
+                if self.pid_particao(particao) != antigo:
+                    with socket.socket(socket.AF_UNIX) as s:
+                        s.connect(caminho)
+                    return
+            except (RuntimeError, OSError):
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"partição {particao} não voltou; veja {self.saida}")
+
+@pytest.fixture
+def servidor(tmp_path):
+    criados = []
+    def novo(*argumentos):
+        criado = Servidor(tmp_path, argumentos)
+        criados.append(criado)
+        return criado.iniciar()
+    yield novo
+    for criado in criados:
+        criado.matar()
@@ -0,0 +1,55 @@
+# test_armazem.py / Formato das contas no diário e no contas.json (armazem.py)
+import pytest
+from armazem import ArmazemContas, SALDO_MAXIMO, para_centavos
+
+def test_registro_grava_centavos_inteiros():
+    contas = ArmazemContas()
+    # Acima de 2**53 centavos um float em reais já não representa o valor exato
+    num = contas.adicionar("Ana", "11111111111", "senha", 2 ** 53 + 1)
+    registro = contas.registro(num)
+    assert registro["centavos"] == 2 ** 53 + 1 and "saldo" not in registro
+
+    copia = ArmazemContas()
+    copia.aplicar(num, registro)
+    assert copia.saldo(num) == 2 ** 53 + 1
+    exportadas, _ = contas.exportar(contas.copiar())
+    assert exportadas[num]["centavos"] == 2 ** 53 + 1
+
+def test_aplicar_le_saldo_em_reais_dos_arquivos_antigos():
+    contas = ArmazemContas()
+    contas.carregar({"100": {"nome": "Ana", "cpf": "111", "senha": "s", "saldo": 10.1},
+                     "101": {"nome": "Bia", "cpf": "222", "senha": "s", "centavos": 2050}})
+    assert contas.saldo("100") == 1010
+    assert contas.saldo("101") == 2050
+
+def test_saldo_nao_passa_do_maximo():
+    contas = ArmazemContas()
+    origem = contas.adicionar("Ana", "11111111111", "senha", 100)
+    destino = contas.adicionar("Bia", "22222222222", "senha", SALDO_MAXIMO)
+    assert not contas.mover(origem, destino, 1)
+    assert not contas.ajustar_saldo(destino, 1)
+    assert (contas.saldo(origem), contas.saldo(destino)) == (100, SALDO_MAXIMO)
+    assert contas.mover(destino, origem, 1)
+    assert (contas.saldo(origem), contas.saldo(destino)) == (101, SALDO_MAXIMO - 1)
+
+def test_para_centavos_recusa_valor_acima_do_maximo():
+    assert para_centavos("92233720368547758.07") == SALDO_MAXIMO
+    with pytest.raises(ValueError):
+        para_centavos("92233720368547758.08")
+
+# Crédito que passaria do saldo máximo é recusado antes de mexer em qualquer conta (também no meio de um BATCH)
+def test_servidor_recusa_credito_acima_do_saldo_maximo(servidor):
+    banco = servidor()
+    cliente = banco.cliente()
+    cliente.criar("Ana", "11111111111", "senha")
+    bia = cliente.criar("Bia", "22222222222", "senha")
+    cliente.login("22222222222", "senha")
+    cliente.comando("DEPOSITAR|92233720368547758.07")
+    assert "inválido" in cliente.comando("DEPOSITAR|0.01")
+    cliente.login("11111111111", "senha")
+    cliente.comando("DEPOSITAR|1")
+    assert "inválido" in cliente.comando(f"TRANSFERIR|{bia}|0.01|senha")
+    assert "inválido" in cliente.comando(f"BATCH|senha|DEPOSITAR:1|TRANSFERIR:{bia}:0.01")
+    assert cliente.saldo() == 100
+    cliente.login("22222222222", "senha")
+    assert cliente.saldo() == SALDO_MAXIMO
@@ -0,0 +1,80 @@
+# test_conservacao.py / Transferências simultâneas de várias conexões: nenhum centavo aparece ou some
+import random
+import threading
+import time
+import pytest
+from conftest import ESPERA
+
+CLIENTES = 8
+OPERACOES = 150
+DEPOSITO = 100000 # centavos de cada conta antes das transferências
+
+#Cria uma conta por cliente, com o mesmo depósito, e devolve [(conta, cpf), ...]
+def criar_contas(banco, quantidade):
+    cliente = banco.cliente()
+    contas = []
+    for i in range(quantidade):
+        cpf = f"{i:011d}"
+        contas.append((cliente.criar(f"Cliente{i}", cpf, "senha"), cpf))
+    for conta, cpf in contas:
+        cliente.login(cpf, "senha")
+        assert "Depósito" in cliente.comando(f"DEPOSITAR|{DEPOSITO / 100:.2f}")
+    cliente.fechar()
+    return contas
+
+#Cada cliente manda transferências (e alguns lotes) para contas aleatórias. Com a conexão caindo (partição reiniciando)
+#o cliente conecta de novo e segue; a resposta não importa, só a soma no fim.
+def transferir_ao_mesmo_tempo(banco, contas, durante=None):
+    def cliente(i):
+        conta, cpf = contas[i]
+        sorteio = random.Random(i)
+        conexao = None
+        for _ in range(OPERACOES):
+            destino = sorteio.choice([outra for outra, _ in contas if outra != conta])
+            if sorteio.random() < 0.8:
+                comando = f"TRANSFERIR|{destino}|{sorteio.randint(1, 500) / 100:.2f}|senha"
+            else:
+                comando = f"BATCH|senha|TRANSFERIR:{destino}:0.50|TRANSFERIR:{sorteio.choice(contas)[0]}:0.25"
+            try:
+                if conexao is None:
+                    conexao = banco.cliente()
+                    conexao.login(cpf, "senha")
+                conexao.comando(comando)
+            except Exception:
+                conexao = None
+                time.sleep(0.1)
+        if conexao is not None:
+            conexao.fechar()
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(len(contas))]
+    for thread in threads:
+        thread.start()
+    if durante is not None:
+        durante()
+    for thread in threads:
+        thread.join()
+
+#Soma dos saldos; espera os créditos entre partições que ainda estão sendo reenviados
+def conferir_soma(banco, contas):
+    limite = time.monotonic() + ESPERA
+    while True:
+        cliente = banco.cliente()
+        total = 0
+        for _, cpf in contas:
+            cliente.login(cpf, "senha")
+            total += cliente.saldo()
+        cliente.fechar()
+        if total == DEPOSITO * len(contas) or time.monotonic() > limite:
+            return total
+        time.sleep(0.5)
+
+@pytest.mark.parametrize("argumentos", [(), ("--asyncio",), ("--particoes", "2")], ids=["threads", "asyncio", "particoes"])
+def test_soma_dos_saldos_com_transferencias_simultaneas(servidor, argumentos):
+    banco = servidor(*argumentos)
+    contas = criar_contas(banco, CLIENTES)
+    transferir_ao_mesmo_tempo(banco, contas)
+    assert conferir_soma(banco, contas) == DEPOSITO * CLIENTES
+
+    # E continua igual depois de reiniciar (checkpoint + diário)
+    banco.parar()
+    banco.iniciar()
+    assert conferir_soma(banco, contas) == DEPOSITO * CLIENTES
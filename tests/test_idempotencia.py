@@ -0,0 +1,43 @@
+# test_idempotencia.py / Pedido repetido com a mesma chave de idempotência depois de o servidor reiniciar
+def test_chave_repetida_depois_de_checkpoint_e_reinicio(servidor):
+    banco = servidor()
+    cliente = banco.cliente()
+    cliente.criar("Ana", "11111111111", "senha")
+    cliente.login("11111111111", "senha")
+    primeira = cliente.comando("DEPOSITAR|100", chave="dep-1")
+    assert cliente.saldo() == 10000
+    banco.parar()
+
+    # Outra operação e outro checkpoint: o segmento do diário com o depósito é apagado, a chave só fica no
+    # idempotencia.json
+    banco.iniciar()
+    cliente = banco.cliente()
+    cliente.login("11111111111", "senha")
+    cliente.comando("DEPOSITAR|0.02")
+    banco.parar()
+
+    banco.iniciar()
+    cliente = banco.cliente()
+    cliente.login("11111111111", "senha")
+    assert cliente.comando("DEPOSITAR|100", chave="dep-1") == primeira
+    assert cliente.saldo() == 10002
+    assert "já usada" in cliente.comando("DEPOSITAR|50", chave="dep-1")
+
+# "Ocupado" (a outra partição não respondeu o PREPARAR) não é a resposta do pedido: a mesma chave executa de novo
+def test_chave_nao_guarda_resposta_ocupado(tmp_path, monkeypatch):
+    import banco
+    from armazem import ArmazemContas
+    from idempotencia import CacheIdempotencia
+    from particoes import Particoes
+    from protocolo_binario import ST_OCUPADO
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(banco, "PARTICOES", 2)
+    monkeypatch.setattr(banco, "pares", Particoes(0, 2))
+    monkeypatch.setattr(banco, "contas", ArmazemContas(particao=0, particoes=2))
+    monkeypatch.setattr(banco, "idempotencia", CacheIdempotencia())
+    origem = banco.contas.adicionar("Ana", "11111111111", "senha", 5000)
+
+    status, _, _ = banco.executar_aqui("TRANSFERIR", ("101", 1000), origem, "tr-1")
+    assert status == ST_OCUPADO
+    assert len(banco.idempotencia) == 0
+    assert banco.idempotencia.reservar((origem, "tr-1"), "resumo") is None
@@ -0,0 +1,162 @@
+# test_particoes.py / Transferências entre partições (duas fases) com as partições caindo e voltando
+import signal
+import threading
+import time
+from armazem import SALDO_MAXIMO, formatar_centavos
+from conftest import ESPERA, porta_livre
+from test_conservacao import CLIENTES, DEPOSITO, criar_contas, transferir_ao_mesmo_tempo, conferir_soma
+
+#Cria contas até ter uma em cada partição (a partição sai do CPF) e devolve {partição: (conta, cpf)}
+def contas_por_particao(cliente, particoes):
+    contas = {}
+    i = 0
+    while len(contas) < particoes:
+        cpf = f"{i:011d}"
+        conta = cliente.criar(f"Cliente{i}", cpf, "senha")
+        contas.setdefault((int(conta) - 100) % particoes, (conta, cpf))
+        i += 1
+    return contas
+
+#O crédito na outra partição pode chegar depois da resposta (reenvio das pendentes): espera o saldo esperado
+def esperar_saldo(banco, cpf, esperado):
+    limite = time.monotonic() + ESPERA
+    while True:
+        cliente = banco.cliente()
+        cliente.login(cpf, "senha")
+        saldo = cliente.saldo()
+        cliente.fechar()
+        if saldo == esperado or time.monotonic() > limite:
+            return saldo
+        time.sleep(0.2)
+
+def transferir(banco, cpf, destino, valor):
+    cliente = banco.cliente()
+    cliente.login(cpf, "senha")
+    resposta = cliente.comando(f"TRANSFERIR|{destino}|{valor}|senha")
+    assert "realizada" in resposta, resposta
+    cliente.fechar()
+
+def test_transferencias_entre_particoes_sobrevivem_a_reinicios(servidor):
+    banco = servidor("--particoes", "2")
+    cliente = banco.cliente()
+    contas = contas_por_particao(cliente, 2)
+    (_, cpf_origem), (destino, cpf_destino) = contas[0], contas[1]
+    cliente.login(cpf_origem, "senha")
+    cliente.comando("DEPOSITAR|100")
+    cliente.fechar()
+
+    transferir(banco, cpf_origem, destino, 10)
+    assert esperar_saldo(banco, cpf_destino, 1000) == 1000
+
+    # Coordenadora reinicia com checkpoint: o número da próxima transação tem que continuar de onde parou, senão a
+    # destinatária acha que o crédito novo já foi aplicado e o dinheiro some
+    banco.reiniciar_particao(0)
+    transferir(banco, cpf_origem, destino, 10)
+    assert esperar_saldo(banco, cpf_destino, 2000) == 2000
+
+    # Destinatária reinicia (checkpoint e depois queda sem aviso): os créditos já aplicados não podem ser
+    # aplicados de novo nem os novos ignorados
+    banco.reiniciar_particao(1)
+    transferir(banco, cpf_origem, destino, 10)
+    banco.reiniciar_particao(1, signal.SIGKILL)
+    transferir(banco, cpf_origem, destino, 10)
+    banco.reiniciar_particao(0, signal.SIGKILL)
+    transferir(banco, cpf_origem, destino, 10)
+    assert esperar_saldo(banco, cpf_destino, 5000) == 5000
+    assert esperar_saldo(banco, cpf_origem, 5000) == 5000
+
+# Transferências simultâneas entre as partições com cada uma caindo sem aviso no meio: os débitos já decididos são
+# creditados quando a outra volta, e nenhum crédito é aplicado duas vezes
+def test_soma_dos_saldos_com_particoes_caindo(servidor):
+    banco = servidor("--particoes", "2")
+    contas = criar_contas(banco, CLIENTES)
+    def derrubar():
+        for particao in (1, 0):
+            time.sleep(1)
+            banco.reiniciar_particao(particao, signal.SIGKILL)
+    transferir_ao_mesmo_tempo(banco, contas, derrubar)
+    assert conferir_soma(banco, contas) == DEPOSITO * CLIENTES
+
+# A conta logada pelo protocolo em linhas numa partição não entra pelo telnet em nenhuma outra (cada conexão cai na
+# partição que o sistema escolher, por isso várias tentativas)
+def test_telnet_recusa_conta_logada_em_outra_particao(servidor):
+    from bench_carga import ClienteTelnet
+    porta_telnet = porta_livre()
+    banco = servidor("--particoes", "2", "--porta-telnet", str(porta_telnet))
+    cliente = banco.cliente()
+    cliente.criar("Ana", "11111111111", "senha")
+    cliente.login("11111111111", "senha")
+    for _ in range(8):
+        telnet = ClienteTelnet("127.0.0.1", porta_telnet)
+        try:
+            assert "outra sessão" in telnet.login("11111111111", "senha")
+        finally:
+            telnet.fechar()
+
+# Destino quase no saldo máximo: o PREPARAR recusa o crédito que não cabe antes de a origem ser debitada
+def test_credito_que_passaria_do_maximo_e_recusado_antes_do_debito(servidor):
+    banco = servidor("--particoes", "2")
+    cliente = banco.cliente()
+    contas = contas_por_particao(cliente, 2)
+    (_, cpf_origem), (destino, cpf_destino) = contas[0], contas[1]
+    cliente.login(cpf_destino, "senha")
+    assert "Depósito" in cliente.comando(f"DEPOSITAR|{formatar_centavos(SALDO_MAXIMO - 5)}")
+    cliente.login(cpf_origem, "senha")
+    cliente.comando("DEPOSITAR|1")
+    assert "Valor inválido" in cliente.comando(f"TRANSFERIR|{destino}|0.06|senha")
+    assert cliente.saldo() == 100
+    assert "realizada" in cliente.comando(f"TRANSFERIR|{destino}|0.05|senha")
+    cliente.fechar()
+    assert esperar_saldo(banco, cpf_destino, SALDO_MAXIMO) == SALDO_MAXIMO
+
+# Várias origens mandando ao mesmo tempo para um destino com pouco espaço: o PREPARAR de cada uma pode ver espaço que
+# outra ocupa antes do CREDITAR. O crédito recusado nessa hora volta para a origem (estorno) e a transação termina -
+# nenhum centavo fica preso em pendente nem passa do máximo
+def test_credito_recusado_no_creditar_volta_para_a_origem(servidor):
+    banco = servidor("--particoes", "2")
+    cliente = banco.cliente()
+    origens = []
+    i = 0
+    destino = None
+    while len(origens) < CLIENTES or destino is None:
+        cpf = f"{i:011d}"
+        conta = cliente.criar(f"Cliente{i}", cpf, "senha")
+        if (int(conta) - 100) % 2 == 0 and len(origens) < CLIENTES:
+            origens.append(cpf)
+        elif (int(conta) - 100) % 2 == 1 and destino is None:
+            destino, cpf_destino = conta, cpf
+        i += 1
+    cliente.login(cpf_destino, "senha")
+    cliente.comando(f"DEPOSITAR|{formatar_centavos(SALDO_MAXIMO - 10)}")
+    for cpf in origens:
+        cliente.login(cpf, "senha")
+        cliente.comando("DEPOSITAR|1")
+    cliente.fechar()
+
+    def mandar(cpf):
+        conexao = banco.cliente()
+        conexao.login(cpf, "senha")
+        for _ in range(10):
+            conexao.comando(f"TRANSFERIR|{destino}|0.01|senha")
+        conexao.fechar()
+    threads = [threading.Thread(target=mandar, args=(cpf,)) for cpf in origens]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    limite = time.monotonic() + ESPERA
+    while True:
+        cliente = banco.cliente()
+        enviados = 0
+        for cpf in origens:
+            cliente.login(cpf, "senha")
+            enviados += 100 - cliente.saldo()
+        cliente.login(cpf_destino, "senha")
+        recebidos = cliente.saldo() - (SALDO_MAXIMO - 10)
+        cliente.fechar()
+        if enviados == recebidos or time.monotonic() > limite:
+            break
+        time.sleep(0.2)
+    assert enviados == recebidos
+    assert 0 < recebidos <= 10
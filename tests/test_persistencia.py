@@ -0,0 +1,146 @@
+# test_persistencia.py / Diário de operações (persistencia.py) e recuperação do servidor depois de uma queda
+import os
+import pytest
+from persistencia import Diario, DiarioIndisponivel
+
+def test_falha_de_gravacao_nao_confirma_e_recusa_registros(tmp_path):
+    diario = Diario(str(tmp_path))
+    diario.abrir()
+    diario.registrar({"op": "DEPOSITAR", "contas": {}})
+    diario.confirmar()
+    assert diario.seq_duravel == 1
+
+    # Arquivo só de leitura no lugar do segmento: a próxima gravação falha
+    diario._arquivo.close()
+    diario._arquivo = open(diario._arquivo.name, 'rb')
+    diario.registrar({"op": "DEPOSITAR", "contas": {}})
+    with pytest.raises(DiarioIndisponivel):
+        diario.confirmar()
+    assert diario.seq_duravel == 1
+    with pytest.raises(DiarioIndisponivel):
+        diario.registrar({"op": "SACAR", "contas": {}})
+    with pytest.raises(DiarioIndisponivel):
+        diario.rotacionar()
+    diario.fechar()
+    assert [registro["seq"] for registro in Diario(str(tmp_path)).ler()] == [1]
+
+def test_recuperacao_le_todos_os_segmentos_em_ordem(tmp_path):
+    diario = Diario(str(tmp_path))
+    diario.abrir()
+    for i in range(3):
+        diario.registrar({"op": "DEPOSITAR", "contas": {}, "i": i})
+    diario.rotacionar()
+    for i in range(3, 5):
+        diario.registrar({"op": "DEPOSITAR", "contas": {}, "i": i})
+    diario.fechar()
+
+    novo = Diario(str(tmp_path))
+    assert len(novo.segmentos()) == 2
+    assert [registro["i"] for registro in novo.ler()] == [0, 1, 2, 3, 4]
+    assert [registro["i"] for registro in novo.ler(3)] == [3, 4]
+    novo.descartar_ate(3)
+    assert len(novo.segmentos()) == 1
+
+def test_recuperacao_para_no_registro_cortado(tmp_path):
+    diario = Diario(str(tmp_path))
+    diario.abrir()
+    for i in range(3):
+        diario.registrar({"op": "DEPOSITAR", "contas": {}, "i": i})
+    diario.fechar()
+    # Queda no meio da gravação do próximo lote: sobra meia linha no fim do segmento
+    _, caminho = diario.segmentos()[-1]
+    with open(caminho, 'ab') as f:
+        f.write(b'{"op": "SACAR", "contas": {"100": {"sal')
+
+    novo = Diario(str(tmp_path))
+    assert [registro["seq"] for registro in novo.ler()] == [1, 2, 3]
+    # O servidor continua num segmento novo, sem escrever depois da linha cortada
+    novo.abrir(3)
+    novo.registrar({"op": "DEPOSITAR", "contas": {}})
+    novo.fechar()
+    assert [registro["seq"] for registro in Diario(str(tmp_path)).ler()] == [1, 2, 3, 4]
+
+# O servidor cai (kill -9) no meio da gravação de um lote: tudo que foi respondido volta do diário
+def test_servidor_recupera_do_diario_depois_de_queda(servidor, tmp_path):
+    banco = servidor()
+    cliente = banco.cliente()
+    cliente.criar("Ana", "11111111111", "senha")
+    bia = cliente.criar("Bia", "22222222222", "senha")
+    cliente.login("11111111111", "senha")
+    cliente.comando("DEPOSITAR|100")
+    cliente.comando(f"TRANSFERIR|{bia}|30.5|senha")
+    banco.matar()
+    _, caminho = Diario(os.path.join(tmp_path, "dados", "diario")).segmentos()[-1]
+    with open(caminho, 'ab') as f:
+        f.write(b'{"op": "DEPOSITAR", "contas": {"1')
+
+    banco.iniciar()
+    cliente = banco.cliente()
+    cliente.login("11111111111", "senha")
+    assert cliente.saldo() == 6950
+    cliente.comando("DEPOSITAR|0.5")
+    cliente = banco.cliente()
+    cliente.login("22222222222", "senha")
+    assert cliente.saldo() == 3050
+    banco.matar()
+
+    banco.iniciar()
+    cliente = banco.cliente()
+    cliente.login("11111111111", "senha")
+    assert cliente.saldo() == 7000
+
+# Com o diário parado depois de uma falha, a operação que não conseguiu se registrar não fica na memória e nenhuma outra
+# (nem SALDO) é atendida até reiniciar
+def test_operacao_recusada_pelo_diario_nao_fica_na_memoria(tmp_path, monkeypatch):
+    import banco
+    from armazem import ArmazemContas
+    from protocolo_binario import ST_ERRO
+    monkeypatch.setattr(banco, "contas", ArmazemContas())
+    monkeypatch.setattr(banco, "diario", Diario(str(tmp_path)))
+    ana = banco.contas.adicionar("Ana", "11111111111", "senha", 5000)
+    bia = banco.contas.adicionar("Bia", "22222222222", "senha")
+    banco.diario.falha = OSError("disco cheio")
+    with pytest.raises(DiarioIndisponivel):
+        banco.operacao_transferir(ana, bia, 1000, "senha")
+    with pytest.raises(DiarioIndisponivel):
+        banco.operacao_depositar(ana, 1000)
+    with pytest.raises(DiarioIndisponivel):
+        banco.operacao_batch(ana, "senha", [("TRANSFERIR", bia, 500), ("DEPOSITAR", ana, 100)])
+    with pytest.raises(DiarioIndisponivel):
+        banco.operacao_criar("Caio", "33333333333", "senha")
+    assert (banco.contas.saldo(ana), banco.contas.saldo(bia), len(banco.contas)) == (5000, 0, 2)
+    assert banco.contas.conta_por_cpf("33333333333") is None
+    assert banco.executar_aqui("SALDO", (), ana)[0] == ST_ERRO
+
+# O checkpoint espera as travas das contas: uma transferência no meio (origem debitada, destino ainda sem o crédito)
+# não vai para o contas.bin
+def test_checkpoint_nao_copia_operacao_pela_metade(tmp_path, monkeypatch):
+    import threading
+    import banco
+    from armazem import ArmazemContas
+    from snapshot_binario import carregar_snapshot_binario
+    monkeypatch.setattr(banco, "contas", ArmazemContas())
+    monkeypatch.setattr(banco, "diario", Diario(str(tmp_path / "diario")))
+    monkeypatch.setattr(banco, "ARQUIVO_CONTAS", str(tmp_path / "contas.bin"))
+    monkeypatch.setattr(banco, "ARQUIVO_IDEMPOTENCIA", str(tmp_path / "idempotencia.json"))
+    monkeypatch.setattr(banco, "seq_checkpoint", 0)
+    banco.diario.abrir()
+    ana = banco.contas.adicionar("Ana", "11111111111", "senha", 5000)
+    bia = banco.contas.adicionar("Bia", "22222222222", "senha")
+    checkpoint = threading.Thread(target=banco.salvar_contas)
+    try:
+        with banco.travar_contas(ana, bia):
+            banco.contas.ajustar_saldo(ana, -1000)
+            checkpoint.start()
+            checkpoint.join(0.2)
+            assert not os.path.exists(banco.ARQUIVO_CONTAS)
+            banco.contas.ajustar_saldo(bia, 1000)
+            banco.registrar_operacao("TRANSFERIR", [ana, bia])
+        checkpoint.join()
+    finally:
+        banco.diario.fechar()
+    _, snapshot = carregar_snapshot_binario(banco.ARQUIVO_CONTAS)
+    try:
+        assert list(snapshot.saldos()) == [4000, 1000]
+    finally:
+        snapshot.fechar()
@@ -0,0 +1,65 @@
+# test_registro_transacoes.py / Log de transações em segundo plano (registro_transacoes.py)
+import os
+from extrato import Extrato, movimento, DEPOSITO
+from registro_transacoes import RegistroTransacoes, ler_registros
+
+def test_fila_cheia_descarta_a_linha_e_guarda_os_movimentos(tmp_path):
+    extrato = Extrato(str(tmp_path / "extrato.jsonl"))
+    caminho = str(tmp_path / "transacoes.log")
+    registro = RegistroTransacoes(caminho, intervalo=0.01, max_fila=2, extrato=extrato)
+    # Sem a thread de gravação (antes de iniciar) a fila não anda
+    registro.registrar_varios(["DEPOSITO: Conta 100", "DEPOSITO: Conta 101", "SAQUE: Conta 102", "CONTA_CRIADA: Conta 103"],
+                              [[movimento("100", DEPOSITO, 1, 1)], [movimento("101", DEPOSITO, 1, 1)],
+                               [movimento("102", DEPOSITO, 1, 1), movimento("102", DEPOSITO, 1, 2)], None])
+    estatisticas = registro.estatisticas()
+    assert estatisticas["descartados"] == 2
+    assert estatisticas["movimentos_fila"] == 4
+
+    registro.iniciar()
+    registro.fechar()
+    assert [r["contas"] for r in ler_registros(caminho)] == [["100"], ["101"]]
+    extrato.abrir()
+    assert extrato.consultar("102", 10)[0] == 2
+    extrato.fechar()
+
+def test_aguardar_vaga_espera_os_movimentos_serem_gravados(tmp_path):
+    extrato = Extrato(str(tmp_path / "extrato.jsonl"))
+    registro = RegistroTransacoes(str(tmp_path / "transacoes.log"), intervalo=5, max_movimentos=3, extrato=extrato)
+    registro.iniciar()
+    for i in range(10):
+        registro.registrar(f"DEPOSITO: Conta {100 + i}", [movimento(str(100 + i), DEPOSITO, 1, 1)])
+    registro.aguardar_vaga()
+    assert registro.estatisticas()["movimentos_fila"] <= 3
+    registro.fechar()
+    assert len(extrato) == 10
+
+def test_erro_de_escrita_fica_contado(tmp_path):
+    caminho = str(tmp_path / "transacoes.log")
+    registro = RegistroTransacoes(caminho, intervalo=0.01)
+    registro.iniciar()
+    # Arquivo só de leitura no lugar do log: a escrita do lote falha
+    registro._arquivo.close()
+    registro._arquivo = open(caminho, 'r')
+    registro.registrar("DEPOSITO: Conta 100")
+    registro.esvaziar()
+    assert registro.estatisticas()["erros_gravacao"] == 1
+    registro._arquivo = open(os.devnull, 'w')
+    registro.fechar()
+
+# A rotação falha ao renomear (EXDEV, EACCES...): o arquivo ativo é reaberto e as linhas seguintes continuam no log
+def test_falha_ao_rotacionar_nao_para_o_log(tmp_path, monkeypatch):
+    import registro_transacoes
+    caminho = str(tmp_path / "transacoes.log")
+    registro = RegistroTransacoes(caminho, intervalo=0.01, tamanho_segmento=1)
+    registro.iniciar()
+    def replace_recusado(origem, destino):
+        raise OSError(18, "Invalid cross-device link")
+    monkeypatch.setattr(registro_transacoes.os, "replace", replace_recusado)
+    registro.registrar("DEPOSITO: Conta 100")
+    registro.esvaziar()
+    monkeypatch.undo()
+    registro.registrar("DEPOSITO: Conta 101")
+    registro.fechar()
+    estatisticas = registro.estatisticas()
+    assert estatisticas["erros_gravacao"] == 0 and estatisticas["rotacoes"] == 1
+    assert [r["contas"] for r in ler_registros(caminho)] == [["100"], ["101"]]
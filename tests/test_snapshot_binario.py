@@ -0,0 +1,36 @@
+# test_snapshot_binario.py / Checkpoint binário das contas (snapshot_binario.py)
+import snapshot_binario
+from armazem import ArmazemContas
+from snapshot_binario import carregar_snapshot_binario, gravar_snapshot_binario
+
+def armazem_de_teste():
+    contas = ArmazemContas()
+    contas.adicionar("Ana", "11111111111", "senha-a", 1050)
+    contas.adicionar("Bia Ção", "22222222222", "senha-b", 2 ** 40)
+    return contas
+
+def conferir(caminho):
+    _, snapshot = carregar_snapshot_binario(caminho)
+    try:
+        contas = ArmazemContas()
+        contas.limpar(snapshot)
+        assert snapshot.seq == 7
+        assert [contas.saldo("100"), contas.saldo("101")] == [1050, 2 ** 40]
+        assert contas.nome("101") == "Bia Ção" and contas.senha("100") == "senha-a"
+        assert contas.conta_por_cpf("22222222222") == "101" and contas.conta_por_cpf("333") is None
+    finally:
+        snapshot.fechar()
+
+def test_grava_e_le_o_snapshot(tmp_path):
+    caminho = str(tmp_path / "contas.bin")
+    gravar_snapshot_binario(caminho, 7, armazem_de_teste().copiar())
+    conferir(caminho)
+
+# Arquivos da versão 1 (posições dos textos em uint32) continuam sendo lidos
+def test_le_snapshot_da_versao_1(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "contas.bin")
+    monkeypatch.setattr(snapshot_binario, "VERSAO", 1)
+    monkeypatch.setattr(snapshot_binario, "REGISTRO", snapshot_binario.REGISTROS[1])
+    gravar_snapshot_binario(caminho, 7, armazem_de_teste().copiar())
+    monkeypatch.undo()
+    conferir(caminho)
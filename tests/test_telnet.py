@@ -0,0 +1,47 @@
+# test_telnet.py / Login com a conta já logada em outra conexão (telnet e protocolo em linhas)
+from conftest import porta_livre
+
+# A conta logada pelo protocolo em linhas é recusada no telnet (a senha errada continua sendo só senha errada),
+# e o login feito antes continua valendo
+def test_telnet_recusa_conta_logada(servidor):
+    from bench_carga import ClienteTelnet
+    porta_telnet = porta_livre()
+    banco = servidor("--porta-telnet", str(porta_telnet))
+    cliente = banco.cliente()
+    cliente.criar("Ana", "11111111111", "senha")
+    cliente.login("11111111111", "senha")
+    telnet = ClienteTelnet("127.0.0.1", porta_telnet)
+    try:
+        assert "outra sessão" in telnet.login("11111111111", "senha")
+        assert "incorretos" in telnet.login("11111111111", "errada")
+    finally:
+        telnet.fechar()
+    assert cliente.saldo() == 0
+
+# No sentido contrário: a conta logada no telnet recusa o LOGIN do protocolo em linhas, e o telnet continua na conta
+def test_linhas_recusa_conta_logada_no_telnet(servidor):
+    from bench_carga import ClienteTelnet
+    porta_telnet = porta_livre()
+    banco = servidor("--porta-telnet", str(porta_telnet))
+    banco.cliente().criar("Ana", "11111111111", "senha")
+    telnet = ClienteTelnet("127.0.0.1", porta_telnet)
+    try:
+        assert "Ana" in telnet.login("11111111111", "senha")
+        assert banco.cliente().comando("LOGIN|11111111111|senha") == "[LOGIN] Essa conta já está logada em outra conexão."
+        assert "Saldo" in telnet.saldo()
+    finally:
+        telnet.fechar()
+
+# Duas conexões do protocolo em linhas: a segunda não entra enquanto a primeira está na conta; RETOMAR com o token
+# da primeira (o cliente voltando numa conexão nova) entra, e depois do LOGOUT a conta fica livre
+def test_linhas_recusa_segundo_login(servidor):
+    banco = servidor()
+    primeiro = banco.cliente()
+    primeiro.criar("Ana", "11111111111", "senha")
+    token = primeiro.login("11111111111", "senha").split("|")[3]
+    segundo = banco.cliente()
+    assert segundo.comando("LOGIN|11111111111|senha") == "[LOGIN] Essa conta já está logada em outra conexão."
+    assert segundo.comando("SALDO").startswith("[LOGIN] Você precisa estar logado")
+    assert segundo.comando(f"RETOMAR|{token}").startswith("[RETOMAR]|")
+    assert segundo.comando("LOGOUT").startswith("[DESLOGAR]")
+    assert banco.cliente().login("11111111111", "senha")